@@ -0,0 +1,16 @@
+"""
+Benchmarks for the ArbitPro bot.
+
+Each ``bench_*`` module can be run as a script, e.g.::
+
+    python -m benchmarks.bench_filter_index --users 10000 --tickers 1000
+
+``benchmarks.suite`` times the filter, formatting and dispatch hot paths at
+several user counts, writes JSON results and fails on regressions against
+``thresholds.json`` or a previous run::
+
+    python -m benchmarks.suite --output bench.json
+
+``benchmarks.data`` contains generators for synthetic filters and tickers in
+the same shape as ``filters.json`` and ``P2PFetcher.fetch_orders``.
+"""
@@ -0,0 +1,54 @@
+"""
+Benchmark: indexed ``FilterIndex`` matching vs the linear users × tickers loop.
+
+Usage::
+
+    python -m benchmarks.bench_filter_index --users 10000 --tickers 1000
+"""
+
+import argparse
+import time
+
+from benchmarks.data import make_filters, make_tickers
+from services.filter_engine import match_linear
+from services.filter_index import FilterIndex
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--users", type=int, default=10_000)
+    parser.add_argument("--tickers", type=int, default=1_000)
+    args = parser.parse_args()
+
+    filters = make_filters(args.users)
+    tickers = make_tickers(args.tickers)
+
+    start = time.perf_counter()
+    index = FilterIndex(filters)
+    build = time.perf_counter() - start
+
+    start = time.perf_counter()
+    pairs = index.match_pairs(tickers)
+    t_pairs = time.perf_counter() - start
+
+    start = time.perf_counter()
+    indexed = index.apply(tickers)
+    t_index = time.perf_counter() - start
+
+    start = time.perf_counter()
+    linear = match_linear(tickers, filters)
+    t_linear = time.perf_counter() - start
+
+    if indexed != linear:
+        raise SystemExit("FilterIndex result differs from the linear reference")
+
+    print(f"users={args.users} tickers={args.tickers} matches={len(indexed)}")
+    print(f"index build: {build * 1000:9.1f} ms (once per filter change)")
+    print(f"index pairs: {t_pairs * 1000:9.1f} ms ({len(pairs)} pairs, no dicts)")
+    print(f"indexed:     {t_index * 1000:9.1f} ms")
+    print(f"linear:      {t_linear * 1000:9.1f} ms")
+    print(f"speedup:     {t_linear / t_index:9.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,92 @@
+"""
+Benchmark: cross‑exchange spread engine vs a naive per‑pair walk.
+
+The naive reference walks both order books advert by advert for every
+(buy venue, sell venue) pair and every notional; the engine builds prefix
+sums once per book and answers each pair with binary searches.  Results are
+compared for parity.
+
+Usage::
+
+    python -m benchmarks.bench_spread_engine --venues 8 --depth 200
+"""
+
+import argparse
+import math
+import time
+
+from benchmarks.data import make_books
+from services.spread_engine import best_spreads
+
+
+def naive_pair(buy, sell, notional):
+    """Profit of spending ``notional`` on ``buy`` and selling on ``sell``,
+    by walking the adverts."""
+    qty = cost = 0.0
+    for price, volume in zip(buy.asks.prices, (l.volume for l in buy.asks.levels)):
+        take = min(volume, (notional - cost) / price)
+        qty += take
+        cost += take * price
+        if cost >= notional - 1e-9:
+            break
+    left, proceeds, sold = qty, 0.0, 0.0
+    for price, volume in zip(sell.bids.prices, (l.volume for l in sell.bids.levels)):
+        take = min(volume, left)
+        proceeds += take * price
+        sold += take
+        left -= take
+        if left <= 1e-12:
+            break
+    if sold < qty:
+        qty, cost, left = sold, 0.0, sold
+        for price, volume in zip(buy.asks.prices, (l.volume for l in buy.asks.levels)):
+            take = min(volume, left)
+            cost += take * price
+            left -= take
+            if left <= 1e-12:
+                break
+    return proceeds - cost
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--venues", type=int, default=8)
+    parser.add_argument("--depth", type=int, default=200, help="adverts per side")
+    parser.add_argument("--notionals", type=int, default=50, help="trade sizes evaluated")
+    args = parser.parse_args()
+
+    books = make_books(args.venues, args.depth)
+    # Geometric trade sizes from 50k to 5M UAH (about 1.2k to 120k USDT).
+    notionals = [50_000 * 100 ** (i / max(1, args.notionals - 1)) for i in range(args.notionals)]
+
+    start = time.perf_counter()
+    engine = {n: {(s.buy_exchange, s.sell_exchange): s.profit for s in best_spreads(books, n, None)}
+              for n in notionals}
+    t_engine = time.perf_counter() - start
+
+    start = time.perf_counter()
+    naive = {n: {(b.market.exchange, s.market.exchange): naive_pair(b, s, n)
+                 for b in books for s in books}
+             for n in notionals}
+    t_naive = time.perf_counter() - start
+
+    for n in notionals:
+        for pair, profit in naive[n].items():
+            if not math.isclose(engine[n][pair], profit, rel_tol=1e-9, abs_tol=1e-6):
+                raise SystemExit(f"Mismatch for {pair} at {n}: {engine[n][pair]} != {profit}")
+
+    best = best_spreads(books)
+    pairs = args.venues ** 2 * args.notionals
+    print(f"venues={args.venues} depth={args.depth} notionals={args.notionals} pairs={pairs}")
+    if best:
+        b = best[0]
+        print(f"best: buy {b.buy_exchange} @ {b.buy_vwap:.3f}, sell {b.sell_exchange} @ "
+              f"{b.sell_vwap:.3f}, profit {b.profit:.2f} ({b.spread_pct:.2f}%), "
+              f"max {b.max_quantity:.0f} coins / {b.max_profit:.2f}")
+    print(f"engine: {t_engine * 1000:9.1f} ms")
+    print(f"naive:  {t_naive * 1000:9.1f} ms")
+    print(f"speedup: {t_naive / t_engine:8.1f}x")
+
+
+if __name__ == "__main__":
+    main()
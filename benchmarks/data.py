@@ -0,0 +1,103 @@
+"""
+Synthetic data generators for the benchmarks.
+
+Filters follow the shape of ``filters.json`` and tickers the shape returned
+by ``P2PFetcher.fetch_orders``.  Values are drawn around realistic USDT/UAH
+P2P prices so that only a small share of (user, ticker) pairs match.
+"""
+
+import json
+import os
+import random
+from typing import Any, Dict, List
+
+EXCHANGES = ["binance", "bybit"]
+BANKS = ["Monobank", "Raiffeisen", "PrivatBank"]
+
+
+def make_filters(n: int, seed: int = 1) -> Dict[str, Dict[str, Any]]:
+    """Return ``n`` random per‑chat filters keyed by chat id."""
+    rnd = random.Random(seed)
+    filters: Dict[str, Dict[str, Any]] = {}
+    for i in range(n):
+        sell_min = round(rnd.uniform(41.0, 44.0), 2)
+        vol_min = rnd.choice([0, 50, 100, 250, 500, 1000])
+        f: Dict[str, Any] = {
+            "buy_price_min": 0,
+            "buy_price_max": round(rnd.uniform(39.0, 42.5), 2),
+            "sell_price_min": sell_min,
+            "sell_price_max": round(sell_min + rnd.uniform(0.5, 3.0), 2),
+            "volume_min": vol_min,
+            "volume_max": vol_min + rnd.choice([1000, 5000, 20000]),
+            "banks": rnd.sample(BANKS, rnd.randint(0, 2)),
+            "exchange": rnd.choice(EXCHANGES),
+        }
+        # Some users leave limits unset, which means "no limit".
+        for key in ("buy_price_min", "sell_price_max", "volume_max"):
+            if rnd.random() < 0.2:
+                del f[key]
+        filters[str(1_000_000 + i)] = f
+    return filters
+
+
+def make_tickers(m: int, seed: int = 2) -> List[Dict[str, Any]]:
+    """Return ``m`` random tickers as produced by ``fetch_orders``."""
+    rnd = random.Random(seed)
+    tickers: List[Dict[str, Any]] = []
+    for i in range(m):
+        buy = round(rnd.uniform(39.5, 43.0), 2)
+        sell = round(buy + rnd.uniform(-0.5, 2.5), 2)
+        exchange = rnd.choice(EXCHANGES)
+        tickers.append({
+            "buy": buy,
+            "sell": sell,
+            "volume": round(rnd.uniform(10, 30000), 2),
+            "url": f"https://example.com/{exchange}/{i}",
+            "symbol": "USDT",
+            "price": buy,
+            "sell_price": sell,
+            "exchange": exchange,
+            "fiat": "UAH",
+        })
+    return tickers
+
+
+def make_books(venues: int, depth: int, seed: int = 3, fee: float = 0.001):
+    """Return one USDT/UAH ``OrderBook`` per synthetic venue, each with
+    ``depth`` adverts per side.
+
+    Prices ladder away from a per‑venue mid in small random steps, and mids
+    differ slightly between venues, so neighbouring venues' books overlap
+    by a few levels as in real P2P markets.
+    """
+    from services.exchanges import Market
+    from services.spread_engine import Level, OrderBook
+
+    rnd = random.Random(seed)
+    books = []
+    for v in range(venues):
+        mid = rnd.uniform(41.15, 41.45)
+        sides = []
+        for direction in (1, -1):
+            price = mid + direction * 0.05
+            levels = []
+            for i in range(depth):
+                price += direction * rnd.expovariate(200.0)
+                levels.append(Level(round(price, 3), round(rnd.uniform(20, 3000), 2), f"{v}-{direction}-{i}"))
+            sides.append(levels)
+        books.append(OrderBook(Market(f"venue{v}", "USDT", "UAH"), sides[0], sides[1], fee))
+    return books
+
+
+def write_filters_json(filters: Dict[str, Dict[str, Any]], path: str) -> None:
+    """Write ``filters`` in the shape of the monolithic ``filters.json``."""
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(filters, f)
+
+
+def write_user_files(filters: Dict[str, Dict[str, Any]], directory: str) -> None:
+    """Write one ``filters_{chat_id}.json`` file per user, as the old wizard
+    did."""
+    for chat_id, f in filters.items():
+        with open(os.path.join(directory, f"filters_{chat_id}.json"), "w", encoding="utf-8") as fh:
+            json.dump(f, fh)
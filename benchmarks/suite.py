@@ -0,0 +1,209 @@
+"""
+Benchmark suite for the filter, formatting and dispatch hot paths.
+
+For every scale (number of users) it generates synthetic filters, writes
+them both as ``filters.json`` and as per‑user ``filters_{id}.json`` files,
+migrates the latter into a ``UserStore`` database and times:
+
+* ``load_json`` / ``load_db`` – a cold repository snapshot (read + compile);
+* ``index_build`` – building the matching index of a snapshot;
+* ``apply_filters`` – steady‑state matching of the tickers (snapshot cached);
+* ``format`` – digest text building for every matched chat;
+* ``dispatch`` – pushing every digest through ``NotificationDispatcher`` to
+  a bot that returns immediately (rate limits lifted).
+
+Results are written as JSON.  A case fails the run (exit status 1) when its
+median exceeds the absolute limit in the thresholds file, or when
+``--baseline`` is given and it is more than ``--tolerance`` slower than the
+same case there.
+
+Usage::
+
+    python -m benchmarks.suite --scales 100,10000,100000 --output bench.json
+    python -m benchmarks.suite --baseline bench.json --tolerance 0.25
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import platform
+import statistics
+import sys
+import tempfile
+import time
+from collections import defaultdict
+from typing import Any, Callable, Dict, List
+
+from benchmarks.data import make_filters, make_tickers, write_filters_json, write_user_files
+from config import FILTER_ENGINE
+from services.dispatcher import NotificationDispatcher
+from services.filter_engine import apply_filters
+from services.filter_repository import FilterRepository
+from services.notifications import format_digest
+from services.user_store import UserStore
+
+DEFAULT_THRESHOLDS = os.path.join(os.path.dirname(__file__), "thresholds.json")
+
+# Rate used to lift the dispatcher's Telegram limits.
+UNLIMITED_RATE = 1e12
+
+
+class _InstantBot:
+    def __init__(self) -> None:
+        self.sent = 0
+
+    async def send_message(self, chat_id: Any, text: str, **kwargs: Any) -> None:
+        self.sent += 1
+
+
+def _measure(fn: Callable[[], Any], repeat: int) -> Dict[str, float]:
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        samples.append(time.perf_counter() - start)
+    return {
+        "min_ms": min(samples) * 1000,
+        "median_ms": statistics.median(samples) * 1000,
+        "repeat": repeat,
+    }
+
+
+async def _dispatch(texts: List[tuple]) -> int:
+    bot = _InstantBot()
+    dispatcher = NotificationDispatcher(
+        bot, global_rate=UNLIMITED_RATE, chat_rate=UNLIMITED_RATE, queue_size=len(texts) + 1
+    )
+    dispatcher.start()
+    for chat_id, text in texts:
+        dispatcher.submit(chat_id, text, parse_mode="HTML")
+    await dispatcher.close(timeout=None)
+    return bot.sent
+
+
+def run_scale(users: int, tickers_count: int, repeat: int, workdir: str) -> Dict[str, Dict[str, Any]]:
+    """Run every case for one number of users."""
+    filters = make_filters(users)
+    tickers = make_tickers(tickers_count)
+    results: Dict[str, Dict[str, Any]] = {}
+
+    json_path = os.path.join(workdir, "filters.json")
+    write_filters_json(filters, json_path)
+    results["load_json"] = _measure(lambda: FilterRepository(json_path).snapshot(), repeat)
+
+    users_dir = os.path.join(workdir, "users")
+    os.makedirs(users_dir)
+    write_user_files(filters, users_dir)
+    db_path = os.path.join(workdir, "filters.db")
+    store = UserStore(db_path)
+    store.migrate_json(os.path.join(workdir, "missing.json"), users_dir)
+    results["load_db"] = _measure(lambda: FilterRepository(db_path).snapshot(), repeat)
+    store.close()
+
+    snapshot = FilterRepository(json_path).snapshot()
+    results["index_build"] = _measure(lambda: snapshot.__class__(0, filters).index, repeat)
+
+    apply_filters(tickers, json_path)  # warm the shared repository
+    results["apply_filters"] = _measure(lambda: apply_filters(tickers, json_path), repeat)
+    matches = apply_filters(tickers, json_path)
+    results["apply_filters"]["matches"] = len(matches)
+
+    by_chat: Dict[Any, List[Dict[str, Any]]] = defaultdict(list)
+    for order in matches:
+        by_chat[order["chat_id"]].append(order)
+    results["format"] = _measure(
+        lambda: [format_digest(batch) for batch in by_chat.values()], repeat
+    )
+    texts = [(chat, text) for chat, batch in by_chat.items() for text in format_digest(batch)]
+
+    loop = asyncio.new_event_loop()
+    try:
+        results["dispatch"] = _measure(lambda: loop.run_until_complete(_dispatch(texts)), repeat)
+    finally:
+        loop.close()
+    results["dispatch"]["messages"] = len(texts)
+    return results
+
+
+def check(
+    results: Dict[str, Dict[str, Dict[str, Any]]],
+    thresholds: Dict[str, Dict[str, float]],
+    baseline: Dict[str, Dict[str, Dict[str, Any]]],
+    tolerance: float,
+) -> List[str]:
+    """Return a message for every case over its limit or slower than the
+    baseline."""
+    failures = []
+    for case, scales in results.items():
+        for scale, result in scales.items():
+            median = result["median_ms"]
+            limit = thresholds.get(case, {}).get(scale)
+            if limit is not None and median > limit:
+                failures.append(f"{case}@{scale}: {median:.1f} ms > limit {limit:.1f} ms")
+            previous = baseline.get(case, {}).get(scale)
+            if previous is not None and median > previous["median_ms"] * (1 + tolerance):
+                failures.append(
+                    f"{case}@{scale}: {median:.1f} ms vs baseline {previous['median_ms']:.1f} ms "
+                    f"(+{(median / previous['median_ms'] - 1) * 100:.0f}%)"
+                )
+    return failures
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--scales", default="100,10000,100000", help="comma-separated user counts")
+    parser.add_argument("--tickers", type=int, default=200)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--output", help="write results JSON here (default: stdout)")
+    parser.add_argument("--thresholds", default=DEFAULT_THRESHOLDS, help="absolute limits JSON")
+    parser.add_argument("--baseline", help="previous results JSON to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.25,
+                        help="allowed slowdown against the baseline (0.25 = 25%%)")
+    args = parser.parse_args()
+
+    results: Dict[str, Dict[str, Dict[str, Any]]] = defaultdict(dict)
+    for users in (int(s) for s in args.scales.split(",") if s.strip()):
+        with tempfile.TemporaryDirectory() as workdir:
+            for case, result in run_scale(users, args.tickers, args.repeat, workdir).items():
+                results[case][str(users)] = result
+            print(f"users={users}: " + ", ".join(
+                f"{case} {results[case][str(users)]['median_ms']:.1f} ms" for case in results
+            ), file=sys.stderr)
+
+    report = {
+        "meta": {
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "engine": FILTER_ENGINE,
+            "tickers": args.tickers,
+            "timestamp": time.time(),
+        },
+        "results": results,
+    }
+    text = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(text)
+    else:
+        print(text)
+
+    thresholds: Dict[str, Dict[str, float]] = {}
+    if args.thresholds and os.path.exists(args.thresholds):
+        with open(args.thresholds, encoding="utf-8") as f:
+            thresholds = json.load(f)
+    baseline: Dict[str, Dict[str, Dict[str, Any]]] = {}
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            baseline = json.load(f)["results"]
+
+    failures = check(results, thresholds, baseline, args.tolerance)
+    if failures:
+        print("PERFORMANCE REGRESSION:", file=sys.stderr)
+        for failure in failures:
+            print(f"  {failure}", file=sys.stderr)
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
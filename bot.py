@@ -1,7 +1,10 @@
-
 from aiogram import Bot, Dispatcher
 from aiogram.client.default import DefaultBotProperties
-from config import API_TOKEN
+import os
+from config import API_TOKEN, FILTERS_DB, FILTERS_FILE, WEBHOOK_URL
+from services.aggregator import setup_aggregator
+from services.filter_drafts import get_filter_drafts
+from services.user_store import get_user_store
 
 # Initialize bot and dispatcher
 bot = Bot(token=API_TOKEN, default=DefaultBotProperties(parse_mode="HTML"))
@@ -11,4 +14,20 @@ dp = Dispatcher()
 import handlers.default
 
 if __name__ == "__main__":
-    dp.run_polling(bot)
+    # One-shot import of filters.json and filters_{id}.json into the database
+    get_user_store(FILTERS_DB).migrate_json(FILTERS_FILE, os.getcwd())
+    # Save filter drafts still waiting for their debounce on shutdown. Must be
+    # registered on this dispatcher: handlers import ``bot`` as a separate
+    # module, whose ``dp`` is not the one that runs.
+    dp.shutdown.register(get_filter_drafts(FILTERS_DB).close)
+    if WEBHOOK_URL:
+        # Webhook mode: updates, /metrics and the aggregator share one server
+        # and event loop on WEBAPP_PORT
+        from services.webhook import run_webhook
+
+        setup_aggregator(dp, serve_metrics=False)
+        run_webhook(dp, bot)
+    else:
+        # Long polling; the aggregator serves /metrics on WEBAPP_PORT itself
+        setup_aggregator(dp)
+        dp.run_polling(bot)
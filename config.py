@@ -16,9 +16,25 @@ from dotenv import load_dotenv
 # доступны даже при запуске локально без явного экспорта переменных.
 load_dotenv()
 
-# Имя файла, в котором хранятся пользовательские фильтры.
+# Имя файла, в котором раньше хранились пользовательские фильтры. Сейчас
+# используется только для однократного переноса в базу FILTERS_DB.
 FILTERS_FILE: str = "filters.json"
 
+# База SQLite с фильтрами всех пользователей (режим WAL).
+FILTERS_DB: str = os.getenv("FILTERS_DB", "filters.db")
+
+# Реферальная программа: журнал приглашений и PRO‑пользователей (дописывается
+# построчно и периодически сжимается), прежние JSON‑файлы, импортируемые при
+# первом запуске, и сколько приглашённых дают бонус PRO.
+REFERRAL_LOG: str = os.getenv("REFERRAL_LOG", "referrals.log")
+REF_FILE: str = "referrals.json"
+PRO_USERS_FILE: str = "pro_users.json"
+REFERRAL_BONUS_INVITES: int = int(os.getenv("REFERRAL_BONUS_INVITES", 2))
+
+# Через сколько секунд без правок черновик фильтра из мастера настройки
+# сохраняется в базу (кнопка «Готово» сохраняет сразу).
+FILTER_DRAFT_DEBOUNCE: float = float(os.getenv("FILTER_DRAFT_DEBOUNCE", 5))
+
 # Токен Telegram‑бота. Для безопасности рекомендуется хранить его в
 # переменной окружения API_TOKEN или в файле .env.
 API_TOKEN: str | None = os.getenv("API_TOKEN")
@@ -28,4 +44,103 @@ API_TOKEN: str | None = os.getenv("API_TOKEN")
 WEBHOOK_URL: str | None = os.getenv("WEBHOOK_URL")
 
 # Порт HTTP‑сервера, на котором запускается веб‑хук. По умолчанию 10000.
-WEBAPP_PORT: int = int(os.getenv("PORT", 10000))
\ No newline at end of file
+WEBAPP_PORT: int = int(os.getenv("PORT", 10000))
+
+# Общий бюджет времени (в секундах) на один цикл опроса всех бирж.
+# Биржи, не успевшие ответить за это время, исключаются из цикла.
+FETCH_CYCLE_TIMEOUT: float = float(os.getenv("FETCH_CYCLE_TIMEOUT", 10))
+
+# Тайм‑аут (в секундах) на опрос одной биржи (покупка + продажа).
+EXCHANGE_TIMEOUT: float = float(os.getenv("EXCHANGE_TIMEOUT", 6))
+
+# Список опрашиваемых рынков в формате "биржа:актив:фиат" через запятую.
+P2P_MARKETS: str = os.getenv("P2P_MARKETS", "binance:USDT:UAH,bybit:USDT:RUB")
+
+# Максимальное число одновременных запросов к биржам за цикл.
+FETCH_CONCURRENCY: int = int(os.getenv("FETCH_CONCURRENCY", 16))
+
+# Движок сопоставления фильтров: "index" (интервальный индекс, по умолчанию)
+# или "numpy" (векторная проверка, требует установленного numpy).
+FILTER_ENGINE: str = os.getenv("FILTER_ENGINE", "index").lower()
+
+# Отправка уведомлений: число воркеров, лимиты Telegram (сообщений в секунду
+# всего и в один чат) и максимальный размер очереди.
+NOTIFY_WORKERS: int = int(os.getenv("NOTIFY_WORKERS", 8))
+NOTIFY_GLOBAL_RATE: float = float(os.getenv("NOTIFY_GLOBAL_RATE", 25))
+NOTIFY_CHAT_RATE: float = float(os.getenv("NOTIFY_CHAT_RATE", 1))
+NOTIFY_QUEUE_SIZE: int = int(os.getenv("NOTIFY_QUEUE_SIZE", 10000))
+
+# Подавление повторных уведомлений об одном и том же объявлении: время жизни
+# записи (сек), максимум записей, шаг округления цены покупки в ключе и
+# относительные изменения цены продажи/объёма, при которых уведомляем снова.
+DEDUP_TTL: float = float(os.getenv("DEDUP_TTL", 1800))
+DEDUP_MAX_ENTRIES: int = int(os.getenv("DEDUP_MAX_ENTRIES", 200000))
+DEDUP_PRICE_STEP: float = float(os.getenv("DEDUP_PRICE_STEP", 0.01))
+DEDUP_PRICE_CHANGE: float = float(os.getenv("DEDUP_PRICE_CHANGE", 0.002))
+DEDUP_VOLUME_CHANGE: float = float(os.getenv("DEDUP_VOLUME_CHANGE", 0.25))
+
+# Окно (сек) для объединения совпадений одного чата в одно сообщение‑дайджест.
+# 0 — объединять в пределах одного цикла агрегатора.
+DIGEST_WINDOW: float = float(os.getenv("DIGEST_WINDOW", 0))
+
+# Опрос рынков: базовый, минимальный и максимальный интервалы (сек), доля
+# случайного разброса и максимальная пауза после ошибок.
+POLL_INTERVAL: float = float(os.getenv("POLL_INTERVAL", 15))
+POLL_MIN_INTERVAL: float = float(os.getenv("POLL_MIN_INTERVAL", 5))
+POLL_MAX_INTERVAL: float = float(os.getenv("POLL_MAX_INTERVAL", 60))
+POLL_JITTER: float = float(os.getenv("POLL_JITTER", 0.1))
+POLL_MAX_BACKOFF: float = float(os.getenv("POLL_MAX_BACKOFF", 300))
+
+# Конвейер агрегатора: число параллельных задач опроса, сопоставления и
+# отправки, а также размер очереди совпадений между ними.
+PIPELINE_FETCH_TASKS: int = int(os.getenv("PIPELINE_FETCH_TASKS", 4))
+PIPELINE_MATCHERS: int = int(os.getenv("PIPELINE_MATCHERS", 1))
+PIPELINE_SENDERS: int = int(os.getenv("PIPELINE_SENDERS", 2))
+PIPELINE_MATCH_QUEUE: int = int(os.getenv("PIPELINE_MATCH_QUEUE", 1000))
+
+# HTTP‑клиент для запросов к биржам: размер пула соединений (всего и на один
+# хост), время кэширования DNS и жизни простаивающего соединения (сек),
+# тайм‑ауты установки соединения и чтения ответа (сек).
+HTTP_POOL_SIZE: int = int(os.getenv("HTTP_POOL_SIZE", 100))
+HTTP_POOL_PER_HOST: int = int(os.getenv("HTTP_POOL_PER_HOST", 16))
+HTTP_DNS_TTL: int = int(os.getenv("HTTP_DNS_TTL", 300))
+HTTP_KEEPALIVE: float = float(os.getenv("HTTP_KEEPALIVE", 60))
+HTTP_CONNECT_TIMEOUT: float = float(os.getenv("HTTP_CONNECT_TIMEOUT", 3))
+HTTP_READ_TIMEOUT: float = float(os.getenv("HTTP_READ_TIMEOUT", 5))
+
+# Глубина стакана для межбиржевого спреда: число страниц и объявлений на
+# странице с каждой стороны, а также сумма сделки (в фиате) для расчёта
+# средневзвешенных цен.
+DEPTH_PAGES: int = int(os.getenv("DEPTH_PAGES", 3))
+DEPTH_ROWS: int = int(os.getenv("DEPTH_ROWS", 20))
+SPREAD_NOTIONAL: float = float(os.getenv("SPREAD_NOTIONAL", 10000))
+
+# Число последних котировок, хранимых в памяти для каждого рынка
+# (2880 при опросе раз в 15 секунд — около 12 часов истории).
+HISTORY_SIZE: int = int(os.getenv("HISTORY_SIZE", 2880))
+
+# Кэш котировок для экрана «Арбитраж»: через сколько секунд котировка
+# считается устаревшей (отдаётся сразу, но обновляется в фоне) и сколько
+# секунд ждать рынок, по которому котировок ещё нет.
+QUOTE_CACHE_TTL: float = float(os.getenv("QUOTE_CACHE_TTL", 30))
+QUOTE_CACHE_WAIT: float = float(os.getenv("QUOTE_CACHE_WAIT", 3))
+
+# Файл (.jsonl.gz) для записи всех ответов бирж для последующего офлайн‑
+# воспроизведения (scripts/replay.py). Пусто — запись выключена.
+RECORD_FILE: str = os.getenv("RECORD_FILE", "")
+
+# Режим веб‑хука: секрет для заголовка X-Telegram-Bot-Api-Secret-Token,
+# число параллельных обработчиков обновлений и размер их очереди.
+WEBHOOK_SECRET: str = os.getenv("WEBHOOK_SECRET", "")
+WEBHOOK_WORKERS: int = int(os.getenv("WEBHOOK_WORKERS", 32))
+WEBHOOK_QUEUE_SIZE: int = int(os.getenv("WEBHOOK_QUEUE_SIZE", 1000))
+
+# Сколько секунд ждать завершения обработки и отправки при остановке.
+SHUTDOWN_TIMEOUT: float = float(os.getenv("SHUTDOWN_TIMEOUT", 15))
+
+# Многопроцессный режим: число процессов‑шардов (0 — всё в одном процессе),
+# сколько секунд без сигнала считать шард зависшим и сколько снимков
+# котировок держать в очереди каждого шарда.
+SHARD_WORKERS: int = int(os.getenv("SHARD_WORKERS", 0))
+SHARD_HEALTH_TIMEOUT: float = float(os.getenv("SHARD_HEALTH_TIMEOUT", 30))
+SHARD_QUEUE_SIZE: int = int(os.getenv("SHARD_QUEUE_SIZE", 4))
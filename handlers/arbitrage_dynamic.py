@@ -9,8 +9,12 @@
 
 from aiogram import Router, F
 from aiogram.types import CallbackQuery
-import json
-from config import FILTERS_FILE
+from config import FILTERS_DB
+from services.filter_engine import match_chat
+from services.filter_repository import get_repository
+from services.notifications import MAX_MESSAGE_LENGTH, format_digest
+from services.quote_cache import get_quote_cache
+from services.subscriptions import filter_markets
 
 
 # Роутер для динамического арбитража.
@@ -23,13 +27,9 @@ async def show_arbitrage_deals(call: CallbackQuery) -> None:
     Отображает список сделок, подходящих под фильтр пользователя. Если
     фильтр не настроен, предлагает воспользоваться командой /filter.
     """
-    user_id = str(call.from_user.id)
-    try:
-        with open(FILTERS_FILE, "r") as f:
-            filters = json.load(f)
-        user_filter = filters.get(user_id)
-    except (FileNotFoundError, json.JSONDecodeError):
-        user_filter = None
+    # Фильтры берутся из общего кэша, файл перечитывается только при изменении.
+    snapshot = await get_repository(FILTERS_DB).asnapshot()
+    user_filter = snapshot.get(call.from_user.id)
 
     if not user_filter:
         await call.message.edit_text(
@@ -40,20 +40,21 @@ async def show_arbitrage_deals(call: CallbackQuery) -> None:
         )
         return
 
-    # Заглушка — пример сделок
-    example_deals = [
-        {"buy": 41.10, "sell": 42.85, "volume": 95, "url": "https://example.com/deal1"},
-        {"buy": 40.90, "sell": 43.00, "volume": 100, "url": "https://example.com/deal2"},
-    ]
+    # Котировки берутся из общего кэша, который наполняет агрегатор; к бирже
+    # обращаемся только за устаревшими рынками (в фоне, одним запросом на всех).
+    # Берём только рынки, на которые подписан фильтр пользователя.
+    cache = get_quote_cache()
+    markets = list(filter_markets(user_filter, cache.markets))
+    tickers = await cache.get(markets)
+    if not tickers:
+        await call.message.edit_text(
+            "📊 Арбитраж \n\n"
+            "⏳ Котировки ещё не загружены, попробуйте через минуту.",
+            parse_mode="HTML",
+        )
+        return
 
-    matched: list[dict] = []
-    for deal in example_deals:
-        if (
-            deal["buy"] <= user_filter["buy_price"]
-            and deal["sell"] >= user_filter["sell_price"]
-            and deal["volume"] <= user_filter["volume"]
-        ):
-            matched.append(deal)
+    matched = match_chat(tickers, FILTERS_DB, call.from_user.id, user_filter)
 
     if not matched:
         await call.message.edit_text(
@@ -63,14 +64,11 @@ async def show_arbitrage_deals(call: CallbackQuery) -> None:
         )
         return
 
-    text = "📊 Найдено сделок: \n\n"
-    for deal in matched:
-        url_text = f"🔗 <a href=\"{deal['url']}\">Открыть ордер</a>" if deal.get("url") else ""
-        text += (
-            f"🟢 Купить по: {deal['buy']} \n"
-            f"🔴 Продать по: {deal['sell']} \n"
-            f"💵 Объём: ${deal['volume']}\n"
-            f"{url_text}\n\n"
-        )
+    text = format_digest(matched)[0]
+    age = cache.age(markets)
+    if age is not None:
+        footer = f"\n\n🕒 Котировки обновлены {age:.0f} с назад"
+        if len(text) + len(footer) <= MAX_MESSAGE_LENGTH:
+            text += footer
 
-    await call.message.edit_text(text, parse_mode="HTML")
\ No newline at end of file
+    await call.message.edit_text(text, parse_mode="HTML")
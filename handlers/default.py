@@ -5,8 +5,8 @@ from aiogram.filters.command import Command
 from aiogram.fsm.context import FSMContext
 from aiogram.fsm.state import StatesGroup, State
 from aiogram.fsm.filters.state import StateFilter
-import json
-import os
+from config import FILTERS_DB
+from services.filter_drafts import get_filter_drafts
 
 # FSM states for interactive filter
 class FilterStates(StatesGroup):
@@ -18,43 +18,19 @@ class FilterStates(StatesGroup):
     waiting_banks = State()
     waiting_exchanges = State()
 
-# Utility: load/save filter
-def filter_file_path(user_id: int) -> str:
-    return os.path.join(os.getcwd(), f"filters_{user_id}.json")
-
-def load_filter(user_id: int) -> dict:
-    path = filter_file_path(user_id)
-    if os.path.exists(path):
-        with open(path, 'r', encoding='utf-8') as f:
-            return json.load(f)
-    return {
-        "buy_price_max": None,
-        "sell_price_min": None,
-        "sell_price_max": None,
-        "volume_min": None,
-        "banks": [],
-        "exchanges": []
-    }
-
-def save_filter(user_id: int, data: dict):
-    path = filter_file_path(user_id)
-    with open(path, 'w', encoding='utf-8') as f:
-        json.dump(data, f, ensure_ascii=False, indent=2)
+# Utility: load/save filter. Edits go to an in-memory draft that is saved to
+# SQLite (off the event loop) after a pause or on "Готово". Pending drafts
+# are saved on shutdown by the hook registered in bot.py.
+drafts = get_filter_drafts(FILTERS_DB)
+
+async def load_filter(user_id: int) -> dict:
+    return await drafts.get(user_id)
 
 async def update_filter(user_id: int, **kwargs):
-    data = load_filter(user_id)
-    data.update(kwargs)
-    save_filter(user_id, data)
+    await drafts.update(user_id, **kwargs)
 
 async def toggle_filter_list_item(user_id: int, key: str, item: str):
-    data = load_filter(user_id)
-    items = data.get(key, [])
-    if item in items:
-        items.remove(item)
-    else:
-        items.append(item)
-    data[key] = items
-    save_filter(user_id, data)
+    await drafts.toggle(user_id, key, item)
 
 # Main menu
 @dp.message(Command("start"))
@@ -71,7 +47,7 @@ async def cmd_start(message: Message):
 # Show filter menu
 @dp.callback_query(lambda c: c.data == "filter_menu")
 async def filter_menu(callback: CallbackQuery, state: FSMContext):
-    current = load_filter(callback.from_user.id)
+    current = await load_filter(callback.from_user.id)
     kb = InlineKeyboardMarkup(inline_keyboard=[
         [InlineKeyboardButton(f"Покупка до ({current['buy_price_max']})", callback_data="set_buy_max")],
         [InlineKeyboardButton(f"Продажа от ({current['sell_price_min']})", callback_data="set_sell_min"),
@@ -196,6 +172,7 @@ async def exchanges_done(callback: CallbackQuery, state: FSMContext):
 # Finish filter
 @dp.callback_query(lambda c: c.data == "finish_filter", StateFilter(FilterStates.waiting_for_choice))
 async def finish_filter(callback: CallbackQuery, state: FSMContext):
+    await drafts.flush(callback.from_user.id)
     await callback.message.edit_text("Фильтр обновлён. Возвращаемся в меню.")
     await state.clear()
     await cmd_start(callback.message)
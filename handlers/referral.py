@@ -1,38 +1,23 @@
 """
 Referral system handlers for the ArbitPro bot.
 
-This module implements the invite/referral logic using plain JSON files to
-record invitations and grant PRO status when enough friends sign up.  It
-fixes a bug in the original implementation where the aiogram handler used
-``regexp_command`` for injection, which is not supported in aiogram v3.
-Instead we annotate the handler with the ``regexp`` parameter typed as
-``re.Match[str]``.
+This module implements the invite/referral logic.  Invitations and PRO
+status are kept in the shared ``ReferralStore`` (see
+``services.referral_store``), which grants PRO status when enough friends
+sign up.  It fixes a bug in the original implementation where the aiogram
+handler used ``regexp_command`` for injection, which is not supported in
+aiogram v3.  Instead we annotate the handler with the ``regexp`` parameter
+typed as ``re.Match[str]``.
 """
 
-import json
 import re
 from aiogram import Router, F
 from aiogram.types import Message
+from services.referral_store import get_referral_store
 
 
 router = Router()
-REF_FILE = "referrals.json"
-PRO_USERS_FILE = "pro_users.json"
-
-
-def load_json(filename: str):
-    """Load a JSON file and return its contents or an empty dict on error."""
-    try:
-        with open(filename, "r") as f:
-            return json.load(f)
-    except (FileNotFoundError, json.JSONDecodeError):
-        return {}
-
-
-def save_json(filename: str, data) -> None:
-    """Serialize ``data`` to ``filename`` with indentation for readability."""
-    with open(filename, "w") as f:
-        json.dump(data, f, indent=2)
+store = get_referral_store()
 
 
 @router.message(F.text == "/refer")
@@ -50,9 +35,8 @@ async def send_ref_link(message: Message) -> None:
 @router.message(F.text == "/myref")
 async def show_ref_stats(message: Message) -> None:
     """Display referral statistics for the current user."""
-    ref_data = load_json(REF_FILE).get(str(message.chat.id), {})
-    count = len(ref_data.get("invited", []))
-    used = ref_data.get("used_bonus", False)
+    count = store.invited_count(message.chat.id)
+    used = store.used_bonus(message.chat.id)
     await message.answer(
         f"👥 Приглашено: {count} пользователей\n"
         f"🎁 Бонус использован: {'✅ Да' if used else '❌ Нет'}"
@@ -81,26 +65,12 @@ async def register_referral(message: Message, regexp: re.Match[str]) -> None:
         await message.answer("❗ Нельзя пригласить самого себя.")
         return
 
-    refs = load_json(REF_FILE)
-    invited_by_inviter = refs.get(inviter_id, {}).get("invited", [])
-    if user_id in invited_by_inviter:
+    # The check and the update happen in one step in memory, so concurrent
+    # registrations cannot overwrite each other; the call returns once the
+    # change is on disk.
+    added, _ = await store.add_referral(inviter_id, user_id)
+    if not added:
         await message.answer("✅ Вы уже были приглашены этим пользователем.")
         return
 
-    # Create record for inviter if necessary
-    if inviter_id not in refs:
-        refs[inviter_id] = {"invited": [], "used_bonus": False}
-    refs[inviter_id]["invited"].append(user_id)
-
-    # Grant bonus if conditions met
-    if len(refs[inviter_id]["invited"]) >= 2 and not refs[inviter_id]["used_bonus"]:
-        pro = load_json(PRO_USERS_FILE)
-        if "users" not in pro:
-            pro["users"] = []
-        if inviter_id not in pro["users"]:
-            pro["users"].append(inviter_id)
-        refs[inviter_id]["used_bonus"] = True
-        save_json(PRO_USERS_FILE, pro)
-
-    save_json(REF_FILE, refs)
-    await message.answer("🎉 Вы были успешно зарегистрированы как приглашённый!")
\ No newline at end of file
+    await message.answer("🎉 Вы были успешно зарегистрированы как приглашённый!")
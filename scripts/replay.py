@@ -0,0 +1,41 @@
+"""
+Replay a recorded exchange log offline (see ``services.recorder``).
+
+Record with ``RECORD_FILE=capture.jsonl.gz`` set while the aggregator runs,
+then feed the log through fetch → filters → de‑dup → formatting → a null
+bot, without network access::
+
+    python -m scripts.replay capture.jsonl.gz
+    python -m scripts.replay capture.jsonl.gz --speed 1 --filters other.db
+"""
+
+import argparse
+import asyncio
+import json
+import logging
+
+from config import FILTERS_DB, P2P_MARKETS
+from services.exchanges import parse_markets
+from services.recorder import read_records, replay
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("log", help="recorded .jsonl.gz file")
+    parser.add_argument("--markets", default=P2P_MARKETS, help="markets used while recording")
+    parser.add_argument("--filters", default=FILTERS_DB, help="filters database or JSON file")
+    parser.add_argument("--speed", type=float, default=0.0,
+                        help="0 = as fast as possible, 1 = recorded pace, 2 = twice as fast")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.ERROR)
+    records = list(read_records(args.log))
+    stats = asyncio.run(replay(records, parse_markets(args.markets), args.filters, args.speed))
+    cycles = stats["cycles"] or 1
+    stats["cycles_per_second"] = stats["cycles"] / stats["elapsed"] if stats["elapsed"] else 0.0
+    stats["match_ms_per_cycle"] = stats.get("match", 0.0) / cycles * 1000
+    print(json.dumps(stats, indent=2, ensure_ascii=False))
+
+
+if __name__ == "__main__":
+    main()
@@ -9,6 +9,29 @@ for other parts of the application.
 # The __all__ list defines the public API of this package.
 __all__ = [
     "aggregator",
+    "dedup",
+    "dispatcher",
+    "exchanges",
+    "filter_drafts",
     "filter_engine",
+    "filter_index",
+    "filter_repository",
+    "filter_vector",
+    "http_transport",
+    "metrics",
+    "notifications",
     "p2p_fetcher",
+    "pipeline",
+    "quote_cache",
+    "quote_history",
+    "rate_limit",
+    "recorder",
+    "referral_store",
+    "resilience",
+    "scheduler",
+    "sharding",
+    "spread_engine",
+    "subscriptions",
+    "user_store",
+    "webhook",
 ]
\ No newline at end of file
@@ -1,97 +1,119 @@
 """
 Aggregator service for the ArbitPro Telegram bot.
 
-This module contains a small loop that periodically fetches P2P order data from
-supported exchanges, applies user‑defined filters and sends notifications
-through the provided bot instance.  It has been slightly refactored to
-include order URLs in the message body using HTML hyperlinks when available.
-
-The original repository omitted the hyperlink text and therefore sent
-messages without a working link.  Additionally, any unhandled exceptions
-during fetching or sending will be logged and the loop will sleep briefly
-before retrying.
+This module is the entry point of the alerting loop.  The work itself is
+done by the staged ``Pipeline`` (see ``services.pipeline``): fetchers poll
+each market on its own adaptive schedule and publish quotes, a matcher
+applies user‑defined filters, drops repeated alerts and groups each chat's
+matches into a digest, and senders hand the notifications to a
+``NotificationDispatcher``, which delivers them through the provided bot
+instance under Telegram's rate limits.  Order URLs are included in the
+message body as HTML hyperlinks when available.  Per‑stage metrics are
+served in Prometheus format on ``WEBAPP_PORT`` (see ``services.metrics``).
 """
 
 import asyncio
 import logging
-from typing import Optional
+from typing import List, Optional
 
+from aiogram import Dispatcher
 from aiohttp import ClientSession
 
-from config import FILTERS_FILE
-from services.filter_engine import apply_filters
+from config import SHARD_WORKERS, WEBAPP_PORT
+from services import metrics
+from services.http_transport import create_session
 from services.p2p_fetcher import P2PFetcher
+from services.pipeline import Pipeline
+from services.sharding import ShardedPipeline
 
 
-async def fetch_p2p_orders(session: ClientSession):
+async def fetch_p2p_orders(session: Optional[ClientSession] = None):
     """Fetch buy/sell orders from supported P2P exchanges.
 
     This helper instantiates a P2PFetcher and delegates to its fetch_orders
     method.  It exists primarily to simplify unit testing.
 
     Args:
-        session: A shared aiohttp client session.
+        session: A shared aiohttp client session; ``None`` uses a temporary
+            tuned session.
 
     Returns:
         A list of ticker dictionaries with order information.
     """
     fetcher = P2PFetcher(session)
-    return await fetcher.fetch_orders()
+    try:
+        return await fetcher.fetch_orders()
+    finally:
+        await fetcher.close()
 
 
-async def start_aggregator(session: ClientSession, bot):
-    """Start the P2P aggregating loop.
+async def start_aggregator(session: Optional[ClientSession], bot, serve_metrics: bool = True):
+    """Start the P2P aggregating pipeline.
 
-    This coroutine runs indefinitely, periodically fetching P2P orders,
-    applying user filters and dispatching notifications via the provided
-    Telegram bot.  It logs useful information for debugging and handles
-    network or API errors gracefully by retrying after a short delay.
+    This coroutine runs until cancelled.  Fetching, matching and sending run
+    as separate stages connected by bounded queues, so slow Telegram calls
+    do not lengthen the polling cycle and failing markets do not delay the
+    others.  With ``SHARD_WORKERS`` > 0 matching and sending are spread
+    over that many worker processes (see ``services.sharding``).  On
+    cancellation already matched alerts are delivered before
+    returning.
 
     Args:
-        session: A shared aiohttp client session used for HTTP requests.
+        session: A shared aiohttp client session used for HTTP requests, or
+            ``None`` to use a tuned session created by the pipeline.
         bot: An aiogram Bot instance used for sending messages.
+        serve_metrics: Serve Prometheus metrics on ``WEBAPP_PORT``.  Pass
+            ``False`` when another server already exposes ``/metrics``.
     """
-    logging.info("🟢 Агрегатор запущен")
-
-    while True:
-        try:
-            tickers = await fetch_p2p_orders(session)
-            logging.info(f"🟢 P2P вернул {len(tickers)} ордеров")
-        except Exception as e:
-            logging.error("💥 Ошибка при получении данных P2P", exc_info=e)
-            # Sleep and retry if fetching fails
-            await asyncio.sleep(15)
-            continue
-
-        # Apply user‑defined filters to the returned tickers
-        orders = apply_filters(tickers, FILTERS_FILE)
-
-        for order in orders:
-            chat_id: int = order["chat_id"]
-            symbol: str = order["symbol"]
-            buy = order["buy"]
-            sell = order["sell"]
-            volume = order["volume"]
-            url: Optional[str] = order.get("url")
-
-            # Build the notification text with a hyperlink when a URL is provided
-            text = (
-                f"📢 Найден арбитраж по {symbol} :\n"
-                f"💰 Покупка: {buy}\n"
-                f"💵 Продажа: {sell}\n"
-                f"📦 Объём: {volume}"
-            )
-            if url:
-                # Append HTML link to the order using AIogram's HTML parse mode
-                text += f"\n🔗 <a href=\"{url}\">Открыть ордер</a>"
-
-            try:
-                await bot.send_message(chat_id, text, parse_mode="HTML")
-            except Exception as e:
-                logging.error(
-                    f"❌ Не удалось отправить сообщение пользователю {chat_id}",
-                    exc_info=e,
-                )
-
-        logging.info("🔁 Цикл агрегатора завершён, спим 15 секунд")
-        await asyncio.sleep(15)
\ No newline at end of file
+    runner = await metrics.start_server(WEBAPP_PORT) if serve_metrics else None
+    if SHARD_WORKERS > 0:
+        # Worker processes create their own bots; ``bot`` is only used in
+        # single‑process mode.
+        pipeline = ShardedPipeline(session, SHARD_WORKERS)
+    else:
+        pipeline = Pipeline(session, bot)
+    try:
+        await pipeline.run()
+    finally:
+        if runner is not None:
+            await runner.cleanup()
+
+
+def setup_aggregator(dispatcher: Dispatcher, serve_metrics: bool = True) -> None:
+    """Run the aggregator alongside ``dispatcher`` in the same event loop.
+
+    The aggregator task is started by the dispatcher's startup hook, with an
+    exchange session from ``http_transport.create_session`` (pool limits,
+    DNS cache, timeouts and request timing), and cancelled by its shutdown
+    hook, which waits until the pipeline has delivered the alerts it already
+    matched and then closes the session.
+
+    Args:
+        dispatcher: The aiogram dispatcher of the bot.
+        serve_metrics: Passed on to ``start_aggregator``.
+    """
+    tasks = []
+    sessions: List[ClientSession] = []
+
+    async def on_startup(bot) -> None:
+        session = create_session()
+        sessions.append(session)
+        task = asyncio.create_task(start_aggregator(session, bot, serve_metrics), name="aggregator")
+        task.add_done_callback(_log_exit)
+        tasks.append(task)
+
+    async def on_shutdown() -> None:
+        while tasks:
+            task = tasks.pop()
+            task.cancel()
+            await asyncio.gather(task, return_exceptions=True)
+        while sessions:
+            await sessions.pop().close()
+
+    dispatcher.startup.register(on_startup)
+    dispatcher.shutdown.register(on_shutdown)
+
+
+def _log_exit(task: asyncio.Task) -> None:
+    if not task.cancelled() and task.exception() is not None:
+        logging.error("💥 Агрегатор остановился с ошибкой", exc_info=task.exception())
@@ -0,0 +1,141 @@
+"""
+Alert de‑duplication for the ArbitPro bot.
+
+As long as the same advert keeps matching a user's filter, every aggregator
+cycle would produce the same alert again.  ``AlertDeduplicator`` sits
+between ``apply_filters`` and the dispatcher and remembers what was sent,
+keyed by (chat_id, exchange, advert id, rounded buy price).  A repeat is
+suppressed unless the sell price or the volume moved by more than the
+configured relative thresholds, or the entry is older than the TTL.
+
+Entries are kept in LRU order and the cache is capped at ``max_entries``,
+which bounds its memory use.  Expired entries are purged by a full scan at
+most every ``ttl / 4`` seconds (``maybe_purge``), not on every cycle.  Hit
+and miss counters show how much send traffic is saved.
+"""
+
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Hashable, Optional, Tuple
+
+from config import (
+    DEDUP_MAX_ENTRIES,
+    DEDUP_PRICE_CHANGE,
+    DEDUP_PRICE_STEP,
+    DEDUP_TTL,
+    DEDUP_VOLUME_CHANGE,
+)
+
+
+def _moved(old: float, new: float, threshold: float) -> bool:
+    if old == new:
+        return False
+    if not old:
+        return True
+    return abs(new - old) / abs(old) > threshold
+
+
+class AlertDeduplicator:
+    """Bounded TTL + LRU cache of alerts already sent.
+
+    Args:
+        ttl: Seconds after which the same alert may be sent again.
+        max_entries: Maximum number of remembered alerts.
+        price_step: Granularity of the buy price in the cache key.
+        price_change: Relative sell price move that triggers a re‑notify.
+        volume_change: Relative volume move that triggers a re‑notify.
+    """
+
+    def __init__(
+        self,
+        ttl: float = DEDUP_TTL,
+        max_entries: int = DEDUP_MAX_ENTRIES,
+        price_step: float = DEDUP_PRICE_STEP,
+        price_change: float = DEDUP_PRICE_CHANGE,
+        volume_change: float = DEDUP_VOLUME_CHANGE,
+    ) -> None:
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.price_step = price_step
+        self.price_change = price_change
+        self.volume_change = volume_change
+        # key -> (sell price, volume, time sent)
+        self._entries: "OrderedDict[Hashable, Tuple[float, float, float]]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.purge_interval = ttl / 4
+        self._purged_at = time.monotonic()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def key(self, order: Dict[str, Any]) -> Hashable:
+        """Return the cache key of a matched order."""
+        advert = order.get("ad_id") or order.get("url")
+        price = float(order.get("price", order.get("buy", 0)))
+        return (
+            str(order["chat_id"]),
+            order.get("exchange"),
+            advert,
+            round(price / self.price_step) if self.price_step else price,
+        )
+
+    def should_notify(self, order: Dict[str, Any], now: Optional[float] = None) -> bool:
+        """Return ``True`` if ``order`` should be sent, and remember it.
+
+        Returns ``False`` (a hit) for a repeat of a recent alert whose sell
+        price and volume have not moved past the thresholds.
+        """
+        now = time.monotonic() if now is None else now
+        key = self.key(order)
+        sell = float(order.get("sell_price", order.get("sell", 0)))
+        volume = float(order.get("volume", 0))
+
+        entry = self._entries.get(key)
+        if entry is not None:
+            old_sell, old_volume, sent_at = entry
+            if (
+                now - sent_at < self.ttl
+                and not _moved(old_sell, sell, self.price_change)
+                and not _moved(old_volume, volume, self.volume_change)
+            ):
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return False
+
+        self.misses += 1
+        self._entries[key] = (sell, volume, now)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+        return True
+
+    def maybe_purge(self, now: Optional[float] = None) -> int:
+        """Run ``purge_expired`` if ``purge_interval`` has passed since the
+        last purge; return how many entries were dropped."""
+        now = time.monotonic() if now is None else now
+        if now - self._purged_at < self.purge_interval:
+            return 0
+        return self.purge_expired(now)
+
+    def purge_expired(self, now: Optional[float] = None) -> int:
+        """Drop entries older than the TTL and return how many were dropped."""
+        now = time.monotonic() if now is None else now
+        self._purged_at = now
+        expired = [k for k, (_, _, sent_at) in self._entries.items() if now - sent_at >= self.ttl]
+        for k in expired:
+            del self._entries[k]
+        return len(expired)
+
+    def stats(self) -> Dict[str, float]:
+        """Return hit/miss counters and the share of suppressed alerts."""
+        total = self.hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_ratio": self.hits / total if total else 0.0,
+        }
@@ -0,0 +1,232 @@
+"""
+Rate‑limited notification dispatcher for the ArbitPro bot.
+
+The aggregator used to ``await bot.send_message`` for every matched order
+inside its loop, so one slow Telegram call delayed every alert after it.
+``NotificationDispatcher`` decouples the two: producers call ``submit``
+(drop when full) or ``put`` (wait for space) which only enqueue, and a pool
+of workers drains the queue.
+
+Workers respect Telegram's limits with token buckets: one global bucket
+(``NOTIFY_GLOBAL_RATE`` messages per second) and one bucket per chat
+(``NOTIFY_CHAT_RATE``).  A message whose chat is over its limit, or which
+Telegram rejects with ``RetryAfter``, is rescheduled after the required
+delay instead of being dropped.  ``stats()`` reports queue depth, send
+latency and delivery counters.
+"""
+
+import asyncio
+import logging
+import time
+from typing import Any, Dict, List, NamedTuple, Optional, Set
+
+from aiogram.exceptions import TelegramRetryAfter
+
+from config import (
+    NOTIFY_CHAT_RATE,
+    NOTIFY_GLOBAL_RATE,
+    NOTIFY_QUEUE_SIZE,
+    NOTIFY_WORKERS,
+)
+from services.metrics import NOTIFY_QUEUE_DEPTH, SEND_LATENCY, SEND_RESULTS
+from services.rate_limit import TokenBucket
+
+# Give up on a message after this many RetryAfter reschedules.
+MAX_RETRIES = 5
+
+# Delay before retrying to requeue a rescheduled message into a full queue.
+REQUEUE_DELAY = 0.5
+
+# Idle per‑chat buckets are pruned once there are more than this many.
+MAX_CHAT_BUCKETS = 10_000
+
+
+class Notification(NamedTuple):
+    chat_id: Any
+    text: str
+    kwargs: Dict[str, Any]
+    attempts: int = 0
+
+
+class NotificationDispatcher:
+    """Queue and worker pool delivering Telegram messages under rate limits.
+
+    Args:
+        bot: An aiogram ``Bot`` (or anything with ``send_message``).
+        workers: Number of concurrent sender tasks.
+        global_rate: Messages per second across all chats.
+        chat_rate: Messages per second to a single chat.
+        queue_size: Maximum number of queued messages; ``submit`` drops
+            messages beyond it.
+    """
+
+    def __init__(
+        self,
+        bot,
+        workers: int = NOTIFY_WORKERS,
+        global_rate: float = NOTIFY_GLOBAL_RATE,
+        chat_rate: float = NOTIFY_CHAT_RATE,
+        queue_size: int = NOTIFY_QUEUE_SIZE,
+    ) -> None:
+        self.bot = bot
+        self.workers = workers
+        self.chat_rate = chat_rate
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=queue_size)
+        self._global = TokenBucket(global_rate)
+        self._chats: Dict[Any, TokenBucket] = {}
+        self._tasks: List[asyncio.Task] = []
+        # Pending re‑enqueues of rate‑limited or ``RetryAfter`` messages.
+        self._timers: Set[asyncio.TimerHandle] = set()
+        self.sent = 0
+        self.failed = 0
+        self.retried = 0
+        self.dropped = 0
+        self.last_latency = 0.0
+        self.avg_latency = 0.0
+
+    # -- lifecycle ---------------------------------------------------------
+
+    def start(self) -> None:
+        """Start the worker tasks (idempotent)."""
+        if not self._tasks:
+            NOTIFY_QUEUE_DEPTH.set_function(self.queue.qsize)
+            self._tasks = [
+                asyncio.create_task(self._worker(), name=f"notify-worker-{i}")
+                for i in range(self.workers)
+            ]
+
+    async def close(self, timeout: Optional[float] = 10.0) -> None:
+        """Wait up to ``timeout`` seconds for queued messages, then stop.
+
+        Messages still waiting for a rate‑limit or ``RetryAfter`` delay are
+        abandoned.
+        """
+        try:
+            await asyncio.wait_for(self.queue.join(), timeout)
+        except asyncio.TimeoutError:
+            logging.warning(f"[dispatcher] Остановка с {self.queue.qsize()} неотправленными сообщениями")
+        if self._timers:
+            logging.warning(f"[dispatcher] Отменено отложенных повторов: {len(self._timers)}")
+        for timer in self._timers:
+            timer.cancel()
+        self._timers.clear()
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    def set_global_rate(self, rate: float) -> None:
+        """Change the global messages‑per‑second limit."""
+        self._global.rate = rate
+        self._global.capacity = max(rate, 1.0)
+
+    # -- producer API ------------------------------------------------------
+
+    def submit(self, chat_id: Any, text: str, **kwargs: Any) -> bool:
+        """Enqueue a message without waiting.
+
+        Returns:
+            ``False`` if the queue is full and the message was dropped.
+        """
+        return self._enqueue(Notification(chat_id, text, kwargs))
+
+    async def put(self, chat_id: Any, text: str, **kwargs: Any) -> None:
+        """Enqueue a message, waiting for queue space (backpressure)."""
+        await self.queue.put(Notification(chat_id, text, kwargs))
+
+    def _enqueue(self, item: Notification) -> bool:
+        try:
+            self.queue.put_nowait(item)
+        except asyncio.QueueFull:
+            self.dropped += 1
+            SEND_RESULTS.inc("dropped")
+            logging.warning(f"[dispatcher] Очередь переполнена, сообщение для {item.chat_id} отброшено")
+            return False
+        return True
+
+    def _schedule(self, item: Notification, delay: float) -> None:
+        """Re‑enqueue ``item`` after ``delay`` seconds (cancelled by ``close``)."""
+
+        def requeue() -> None:
+            self._timers.discard(timer)
+            if self.queue.full():
+                # Producers are blocked in ``put``; retry rather than drop an
+                # already accepted message.
+                self._schedule(item, REQUEUE_DELAY)
+            else:
+                self.queue.put_nowait(item)
+
+        timer = asyncio.get_running_loop().call_later(delay, requeue)
+        self._timers.add(timer)
+
+    # -- workers -----------------------------------------------------------
+
+    def _chat_bucket(self, chat_id: Any) -> TokenBucket:
+        bucket = self._chats.get(chat_id)
+        if bucket is None:
+            if len(self._chats) >= MAX_CHAT_BUCKETS:
+                self._chats = {c: b for c, b in self._chats.items() if not b.is_full()}
+            bucket = self._chats[chat_id] = TokenBucket(self.chat_rate)
+        return bucket
+
+    async def _worker(self) -> None:
+        while True:
+            item: Notification = await self.queue.get()
+            try:
+                wait = self._chat_bucket(item.chat_id).try_acquire()
+                if wait:
+                    self._schedule(item, wait)
+                    continue
+                await self._global.acquire()
+                await self._send(item)
+            except Exception as e:
+                logging.error("[dispatcher] Ошибка обработчика отправки", exc_info=e)
+            finally:
+                self.queue.task_done()
+
+    async def _send(self, item: Notification) -> None:
+        start = time.monotonic()
+        try:
+            await self.bot.send_message(item.chat_id, item.text, **item.kwargs)
+        except TelegramRetryAfter as e:
+            if item.attempts >= MAX_RETRIES:
+                self.failed += 1
+                SEND_RESULTS.inc("failed")
+                logging.error(f"❌ Сообщение пользователю {item.chat_id} отброшено после {item.attempts} повторов")
+                return
+            self.retried += 1
+            SEND_RESULTS.inc("retry_after")
+            logging.warning(f"[dispatcher] RetryAfter {e.retry_after} c для {item.chat_id}")
+            self._schedule(item._replace(attempts=item.attempts + 1), e.retry_after)
+            return
+        except Exception as e:
+            self.failed += 1
+            SEND_RESULTS.inc("failed")
+            logging.error(
+                f"❌ Не удалось отправить сообщение пользователю {item.chat_id}",
+                exc_info=e,
+            )
+            return
+
+        latency = time.monotonic() - start
+        self.sent += 1
+        SEND_RESULTS.inc("sent")
+        SEND_LATENCY.observe(latency)
+        self.last_latency = latency
+        # Exponentially weighted moving average over roughly 100 messages.
+        self.avg_latency += (latency - self.avg_latency) * (0.01 if self.sent > 1 else 1.0)
+
+    # -- telemetry ---------------------------------------------------------
+
+    def stats(self) -> Dict[str, float]:
+        """Return queue depth, latency and delivery counters."""
+        return {
+            "queue_depth": self.queue.qsize(),
+            "delayed": len(self._timers),
+            "sent": self.sent,
+            "failed": self.failed,
+            "retried": self.retried,
+            "dropped": self.dropped,
+            "last_latency": self.last_latency,
+            "avg_latency": self.avg_latency,
+        }
@@ -0,0 +1,198 @@
+"""
+Exchange adapters for the ArbitPro P2P fetcher.
+
+Every supported P2P venue is described by an ``ExchangeAdapter`` which
+declares its endpoint, how to build a search request for one side of the
+book, how to parse the response into normalised adverts and how hard the
+venue may be polled.  Adapters register themselves in ``ADAPTERS`` so the
+fetcher can scan any configured (exchange, asset, fiat) market without
+exchange‑specific code.
+
+Adding a venue means subclassing ``ExchangeAdapter``, implementing its
+abstract methods and calling ``register_adapter`` with an instance; an
+incomplete adapter cannot be instantiated.
+
+Bitget is intentionally absent: its P2P advert list is only available through
+signed, authenticated requests (``/api/p2p/v1/merchant/advList``), so an
+adapter can only be added once API credentials are supported.
+"""
+
+from abc import ABC, abstractmethod
+from typing import Any, Dict, List, NamedTuple, Tuple
+
+# Order book sides from our point of view.
+BUY = "buy"    # we buy crypto, i.e. others' SELL adverts
+SELL = "sell"  # we sell crypto, i.e. others' BUY adverts
+
+
+class Market(NamedTuple):
+    """A single P2P market, e.g. ``Market("binance", "USDT", "UAH")``."""
+
+    exchange: str
+    asset: str
+    fiat: str
+
+    def __str__(self) -> str:
+        return f"{self.exchange}:{self.asset}/{self.fiat}"
+
+
+class ExchangeAdapter(ABC):
+    """Base class describing how to talk to one P2P venue.
+
+    Attributes:
+        name: Registry key, also used in ``Market.exchange``.
+        url: Advert search endpoint.
+        max_concurrency: Maximum number of requests in flight to the venue.
+        requests_per_second: Highest request rate to the advert endpoint;
+            the actual rate adapts below it on rate‑limit answers (see
+            ``services.rate_limit``).
+        host_requests_per_second: Highest request rate to the endpoint's
+            host, shared with other endpoints there; ``0`` for no host
+            limit.
+        rate_burst: Requests that may be sent back to back; ``0`` means
+            ``max(requests_per_second, 1)``.
+        rate_limit_headers: Response headers with the remaining request
+            quota and the seconds (or epoch) until it resets.
+        max_rows: Largest page size the search endpoint accepts.
+        taker_fee: Fee charged to the party taking an advert, as a fraction
+            of the traded amount.
+        hedge_quantile: Latency quantile after which a slow request is
+            duplicated (see ``services.resilience``).
+        hedge_budget: Largest share of requests that may be duplicated;
+            ``0`` disables hedging.
+        breaker_failures: Consecutive failures that open the venue's
+            circuit; ``0`` disables the circuit breaker.
+        breaker_reset: Seconds an open circuit waits before probing with
+            one market's requests.
+    """
+
+    name: str = ""
+    url: str = ""
+    max_concurrency: int = 8
+    requests_per_second: float = 10.0
+    host_requests_per_second: float = 0.0
+    rate_burst: float = 0.0
+    rate_limit_headers: Tuple[str, str] = ("X-RateLimit-Remaining", "X-RateLimit-Reset")
+    max_rows: int = 20
+    taker_fee: float = 0.0
+    hedge_quantile: float = 0.95
+    hedge_budget: float = 0.05
+    breaker_failures: int = 5
+    breaker_reset: float = 30.0
+
+    @abstractmethod
+    def build_payload(
+        self, asset: str, fiat: str, side: str, rows: int, page: int = 1
+    ) -> Dict[str, Any]:
+        """Return the JSON body for an advert search on ``side``."""
+
+    @abstractmethod
+    def parse_ads(self, response: Dict[str, Any]) -> List[Dict[str, Any]]:
+        """Return adverts from ``response`` as dicts with ``id``, ``price``
+        and ``volume`` keys, best price first."""
+
+    @abstractmethod
+    def ad_url(self, ad_id: Any) -> str:
+        """Return a public link to the advert with ``ad_id``."""
+
+
+class BinanceAdapter(ExchangeAdapter):
+    name = "binance"
+    url = "https://p2p.binance.com/bapi/c2c/v2/friendly/c2c/adv/search"
+
+    def build_payload(self, asset, fiat, side, rows, page=1):
+        return {
+            "asset": asset,
+            "fiat": fiat,
+            # others sell when we buy and vice versa
+            "tradeType": "SELL" if side == BUY else "BUY",
+            "page": page,
+            "rows": rows,
+        }
+
+    def parse_ads(self, response):
+        ads = []
+        for item in response.get("data") or []:
+            adv = item.get("adv", {})
+            ads.append({
+                "id": adv.get("advNo"),
+                "price": float(adv.get("price", 0)),
+                "volume": float(adv.get("tradableQuantity", 0)),
+            })
+        return ads
+
+    def ad_url(self, ad_id):
+        return f"https://p2p.binance.com/en/adDetail?advNo={ad_id}"
+
+
+class BybitAdapter(ExchangeAdapter):
+    name = "bybit"
+    url = "https://api2.bybit.com/fiat/otc/item/online"
+
+    def build_payload(self, asset, fiat, side, rows, page=1):
+        return {
+            "tokenId": asset,
+            "currencyId": fiat,
+            "payment": [],
+            "side": 1 if side == BUY else 2,
+            "size": rows,
+            "page": page,
+        }
+
+    def parse_ads(self, response):
+        items = (response.get("result") or {}).get("items") or []
+        return [
+            {
+                "id": item.get("id"),
+                "price": float(item.get("price", 0)),
+                "volume": float(item.get("stock", 0)),
+            }
+            for item in items
+        ]
+
+    def ad_url(self, ad_id):
+        return f"https://www.bybit.com/fiat/trade/otc/detail?id={ad_id}"
+
+
+ADAPTERS: Dict[str, ExchangeAdapter] = {}
+
+
+def register_adapter(adapter: ExchangeAdapter) -> ExchangeAdapter:
+    """Add ``adapter`` to the registry under ``adapter.name``."""
+    ADAPTERS[adapter.name] = adapter
+    return adapter
+
+
+def get_adapter(name: str) -> ExchangeAdapter:
+    """Return the adapter registered as ``name`` (case‑insensitive).
+
+    Raises:
+        KeyError: If no adapter is registered under that name.
+    """
+    return ADAPTERS[name.lower()]
+
+
+def parse_markets(spec: str) -> List[Market]:
+    """Parse a ``"binance:USDT:UAH,bybit:USDT:RUB"`` style market list.
+
+    Entries naming an unknown exchange are rejected with ``ValueError`` so a
+    typo in the configuration fails at startup instead of silently polling
+    nothing.
+    """
+    markets: List[Market] = []
+    for entry in spec.split(","):
+        entry = entry.strip()
+        if not entry:
+            continue
+        try:
+            exchange, asset, fiat = (part.strip() for part in entry.split(":"))
+        except ValueError:
+            raise ValueError(f"Invalid market entry {entry!r}, expected exchange:asset:fiat")
+        if exchange.lower() not in ADAPTERS:
+            raise ValueError(f"Unknown exchange {exchange!r} in market list")
+        markets.append(Market(exchange.lower(), asset.upper(), fiat.upper()))
+    return markets
+
+
+register_adapter(BinanceAdapter())
+register_adapter(BybitAdapter())
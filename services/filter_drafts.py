@@ -0,0 +1,171 @@
+"""
+Write‑behind drafts of filters being edited in the bot.
+
+Every button press of the filter wizard used to read the user's filter from
+the store, change one field and write the whole filter back, and each
+redraw of the menu read it again.  ``FilterDrafts`` keeps the filter of a
+user who is editing it in memory: the first edit loads it from the
+``UserStore``, later reads and edits only touch the draft.
+
+Edits are coalesced: each one (re)starts a ``FILTER_DRAFT_DEBOUNCE`` timer
+and the draft is saved once the user has paused for that long, so a burst
+of toggles becomes one write.  A failed save is retried with exponential
+backoff (up to ``MAX_RETRY_DELAY``).  ``flush`` saves immediately (the wizard calls
+it on "Готово") and ``close`` saves every remaining draft on shutdown.  A
+draft is dropped from memory once it is saved and not edited any further,
+so only filters that are being edited are held.  All saves go through the
+store's ``a*`` methods, i.e. off the event loop.
+"""
+
+import asyncio
+import logging
+from typing import Any, Dict
+
+from config import FILTER_DRAFT_DEBOUNCE
+from services.user_store import UserStore, get_user_store
+
+# Longest delay between retries of a failed save, in seconds.
+MAX_RETRY_DELAY = 300.0
+
+
+class FilterDrafts:
+    """In‑memory drafts of filters with debounced persistence.
+
+    Args:
+        store: Store the drafts are loaded from and saved to.
+        debounce: Seconds without edits after which a draft is saved.
+    """
+
+    def __init__(self, store: UserStore, debounce: float = FILTER_DRAFT_DEBOUNCE) -> None:
+        self.store = store
+        self.debounce = debounce
+        self._drafts: Dict[str, Dict[str, Any]] = {}
+        self._dirty: set = set()
+        self._timers: Dict[str, asyncio.TimerHandle] = {}
+        self._saving: Dict[str, asyncio.Task] = {}
+        # Consecutive failed saves per draft, for the retry backoff.
+        self._failures: Dict[str, int] = {}
+        self.edits = 0
+        self.writes = 0
+
+    def __len__(self) -> int:
+        return len(self._drafts)
+
+    async def get(self, chat_id: Any) -> Dict[str, Any]:
+        """Return the draft of ``chat_id`` or, without one, its stored filter.
+
+        The returned dict must not be modified; use ``update`` or
+        ``toggle``.
+        """
+        draft = self._drafts.get(str(chat_id))
+        if draft is None:
+            return await self.store.aget_filter(chat_id)
+        return draft
+
+    async def _draft(self, key: str) -> Dict[str, Any]:
+        draft = self._drafts.get(key)
+        if draft is None:
+            loaded = await self.store.aget_filter(key)
+            # Another handler may have created the draft while we waited.
+            draft = self._drafts.setdefault(key, loaded)
+        return draft
+
+    async def update(self, chat_id: Any, **fields: Any) -> Dict[str, Any]:
+        """Merge ``fields`` into the draft and schedule a save."""
+        draft = await self._draft(str(chat_id))
+        draft.update(fields)
+        self._touch(str(chat_id))
+        return draft
+
+    async def toggle(self, chat_id: Any, key: str, item: str) -> Dict[str, Any]:
+        """Add ``item`` to the list field ``key`` or remove it if present."""
+        draft = await self._draft(str(chat_id))
+        items = list(draft.get(key) or [])
+        if item in items:
+            items.remove(item)
+        else:
+            items.append(item)
+        draft[key] = items
+        self._touch(str(chat_id))
+        return draft
+
+    def _touch(self, key: str) -> None:
+        self.edits += 1
+        self._dirty.add(key)
+        timer = self._timers.pop(key, None)
+        if timer is not None:
+            timer.cancel()
+        self._timers[key] = asyncio.get_running_loop().call_later(
+            self.debounce, self._start_save, key
+        )
+
+    def _start_save(self, key: str) -> asyncio.Task:
+        self._timers.pop(key, None)
+        task = self._saving.get(key)
+        if task is None or task.done():
+            task = self._saving[key] = asyncio.create_task(self._save(key))
+        return task
+
+    async def _save(self, key: str) -> None:
+        # Edits made while a save is running are picked up by the loop.
+        while key in self._dirty:
+            self._dirty.discard(key)
+            try:
+                await self.store.asave_filter(key, dict(self._drafts[key]))
+                self.writes += 1
+            except Exception as e:
+                self._dirty.add(key)
+                self._saving.pop(key, None)
+                failures = self._failures[key] = self._failures.get(key, 0) + 1
+                delay = min(MAX_RETRY_DELAY, self.debounce * 2 ** failures)
+                logging.error(
+                    f"[filter_drafts] Не удалось сохранить фильтр {key}, повтор через {delay:.0f} с",
+                    exc_info=e,
+                )
+                # A new edit has already scheduled its own save.
+                if key not in self._timers:
+                    self._timers[key] = asyncio.get_running_loop().call_later(
+                        delay, self._start_save, key
+                    )
+                return
+        self._failures.pop(key, None)
+        self._saving.pop(key, None)
+        if key not in self._timers:
+            self._drafts.pop(key, None)
+
+    async def flush(self, chat_id: Any) -> None:
+        """Save the draft of ``chat_id`` now (if it has unsaved edits)."""
+        key = str(chat_id)
+        timer = self._timers.pop(key, None)
+        if timer is not None:
+            timer.cancel()
+        task = self._saving.get(key)
+        if key in self._dirty or task is not None:
+            await self._start_save(key)
+
+    async def close(self) -> None:
+        """Save every pending draft."""
+        await asyncio.gather(
+            *(self.flush(key) for key in list(self._dirty | self._timers.keys())),
+            return_exceptions=True,
+        )
+
+    def stats(self) -> Dict[str, int]:
+        """Return draft, edit and write counters."""
+        return {
+            "drafts": len(self._drafts),
+            "pending": len(self._dirty),
+            "edits": self.edits,
+            "writes": self.writes,
+        }
+
+
+_drafts: Dict[str, FilterDrafts] = {}
+
+
+def get_filter_drafts(path: str) -> FilterDrafts:
+    """Return the shared drafts for the database at ``path``."""
+    drafts = _drafts.get(path)
+    if drafts is None:
+        drafts = _drafts[path] = FilterDrafts(get_user_store(path))
+    return drafts
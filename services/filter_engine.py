@@ -1,97 +1,150 @@
 """
 Filtering engine for the ArbitPro bot.
 
-This module provides a single function, ``apply_filters``, which reads user
-filter configurations from a JSON file and applies them to a list of ticker
-objects returned by the P2P fetcher.  The original implementation from the
-repository is included here without modification to preserve semantics.
+This module provides ``apply_filters``, which reads user filter
+configurations from a JSON file and applies them to a list of ticker objects
+returned by the P2P fetcher.
+
+Filters come from the shared ``FilterRepository`` (see
+``services.filter_repository``), which re‑reads the file only when it
+changes.  Matching is done through a ``FilterIndex`` (see
+``services.filter_index``) or, with ``FILTER_ENGINE=numpy``, a
+``VectorFilterIndex`` (see ``services.filter_vector``); the index belongs to
+the repository snapshot and is therefore rebuilt only when the filters
+change.  ``match_chat`` applies a single chat's filter for on‑demand
+requests.  ``match_linear`` keeps the original users × tickers loop as the
+reference implementation used by the benchmarks.
 """
 
 import json
 import logging
-from typing import Any, Dict, List
-
-
-def apply_filters(tickers: List[Dict[str, Any]], filters_file: str) -> List[Dict[str, Any]]:
-    """Load user filters from ``filters_file`` and apply them to a list of tickers.
+from typing import Any, Dict, List, Optional, Union
 
-    Each user's filter may define minimum and maximum thresholds for the buy
-    (our purchase) and sell (our sale) prices as well as minimum/maximum
-    volumes.  The original implementation used simple upper limits; this version
-    expands the logic to support ranges.  All numeric values are converted to
-    floats to ensure proper comparison.  Unknown values fall back to sensible
-    defaults (e.g. no limit).
+from config import FILTER_ENGINE
+from services import filter_vector
+from services.filter_index import CompiledFilter, FilterIndex, compile_filters, parse_ticker
+from services.filter_repository import get_repository
+from services.filter_vector import VectorFilterIndex
 
-    Args:
-        tickers: A list of ticker dictionaries containing at least the keys
-            ``price`` (buy price), ``sell_price``, and ``volume``.  Additional
-            fields (e.g. ``url`` or ``symbol``) are preserved.
-        filters_file: Path to a JSON file storing per‑chat filter settings.
 
-    Returns:
-        A list of ticker entries that satisfy at least one user's filter
-        criteria.  Each returned dict includes the additional keys
-        ``chat_id`` and ``exchange`` corresponding to the filter that
-        matched.
-    """
+def load_filters(filters_file: str) -> Dict[str, Any]:
+    """Read per‑chat filters from ``filters_file`` or return ``{}`` on error."""
     try:
         with open(filters_file, "r") as f:
-            filters = json.load(f)
+            return json.load(f)
     except Exception:
-        filters = {}
+        return {}
 
-    results: List[Dict[str, Any]] = []
-    for chat_id, f in filters.items():
-        # Extract filter thresholds.  If a field is missing, use a default that
-        # disables the constraint (e.g. -inf for min values, +inf for max).
-        buy_min = float(f.get("buy_price_min", float("-inf")))
-        buy_max = float(f.get("buy_price_max", float("inf")))
-        sell_min = float(f.get("sell_price_min", float("-inf")))
-        sell_max = float(f.get("sell_price_max", float("inf")))
-        vol_min = float(f.get("volume_min", 0))
-        vol_max = float(f.get("volume_max", float("inf")))
-        exchange = f.get("exchange", "binance")
-
-        # Optionally filter by bank/payment method.  The ticker dictionaries
-        # currently do not include bank information, but this hook allows for
-        # future extension.  If the filter specifies banks and the ticker
-        # contains a ``bank`` field, only tickers matching one of the banks
-        # should pass.
-        allowed_banks = f.get("banks", [])
 
+def build_index(
+    filters: Dict[str, Any],
+    engine: str = FILTER_ENGINE,
+    compiled: Optional[List[CompiledFilter]] = None,
+) -> Union[FilterIndex, VectorFilterIndex]:
+    """Build the matching index selected by ``engine``.
+
+    Falls back to ``FilterIndex`` (with a warning) when ``engine`` is
+    ``"numpy"`` but NumPy is not installed.
+
+    Args:
+        compiled: ``filters`` already compiled by the caller, if any.
+    """
+    if engine == "numpy":
+        if filter_vector.available():
+            return VectorFilterIndex(filters, compiled)
+        logging.warning("[filter_engine] numpy не установлен, используется индексный движок")
+    elif engine != "index":
+        logging.warning(f"[filter_engine] Неизвестный FILTER_ENGINE={engine!r}, используется 'index'")
+    return FilterIndex(filters, compiled)
+
+
+def match_linear(tickers: List[Dict[str, Any]], filters: Dict[str, Any]) -> List[Dict[str, Any]]:
+    """Reference implementation: check every filter against every ticker.
+
+    Produces exactly the same result as ``FilterIndex.apply`` and
+    ``VectorFilterIndex.apply`` in ``O(users × tickers)``.
+    """
+    results: List[Dict[str, Any]] = []
+    for f in compile_filters(filters):
         for t in tickers:
-            # Skip malformed ticker objects
-            if "price" not in t:
-                logging.warning(f"[filter_engine] Нет ключа 'price' в: {t}")
+            values = parse_ticker(t)
+            if values is None:
                 continue
+            price, sell_price, volume = values
 
-            price = float(t.get("price", 0))
-            sell_price = float(t.get("sell_price", price))
-            volume = float(t.get("volume", 0))
-
-            # Apply price and volume range filters.  The ticker must satisfy
+            # The ticker must satisfy
             # * buy_min <= price <= buy_max
             # * sell_min <= sell_price <= sell_max
             # * vol_min <= volume <= vol_max
-            if not (buy_min <= price <= buy_max):
+            if not (f.buy_min <= price <= f.buy_max):
                 continue
-            if not (sell_min <= sell_price <= sell_max):
+            if not (f.sell_min <= sell_price <= f.sell_max):
                 continue
-            if not (vol_min <= volume <= vol_max):
+            if not (f.vol_min <= volume <= f.vol_max):
                 continue
 
             # If banks are specified and ticker includes bank info, ensure it
             # matches one of the allowed banks.  Otherwise ignore bank filter.
             bank = t.get("bank")
-            if allowed_banks and bank and bank not in allowed_banks:
+            if f.banks and bank and bank not in f.banks:
                 continue
 
-            # All checks passed; record the match.  Preserve all ticker fields
-            # and annotate with chat_id and exchange.
             results.append({
                 **t,
-                "chat_id": chat_id,
-                "exchange": exchange,
+                "chat_id": f.chat_id,
+                "exchange": t.get("exchange", f.exchange),
             })
 
-    return results
\ No newline at end of file
+    return results
+
+
+def apply_filters(tickers: List[Dict[str, Any]], filters_file: str) -> List[Dict[str, Any]]:
+    """Apply the user filters stored in ``filters_file`` to a list of tickers.
+
+    Each user's filter may define minimum and maximum thresholds for the buy
+    (our purchase) and sell (our sale) prices as well as minimum/maximum
+    volumes.  All numeric values are converted to floats to ensure proper
+    comparison.  Missing values fall back to sensible defaults (e.g. no
+    limit).  A filter may also restrict ``banks``; the constraint only
+    applies to tickers that carry a ``bank`` field.
+
+    Args:
+        tickers: A list of ticker dictionaries containing at least the keys
+            ``price`` (buy price), ``sell_price``, and ``volume``.  Additional
+            fields (e.g. ``url`` or ``symbol``) are preserved.
+        filters_file: Path to the filters database (``FILTERS_DB``) or to a
+            JSON file storing per‑chat filter settings.
+
+    Returns:
+        A list of ticker entries that satisfy at least one user's filter
+        criteria, ordered by filter and then by ticker.  Each returned dict
+        includes the additional keys ``chat_id`` and ``exchange``
+        corresponding to the filter that matched.
+    """
+    return get_repository(filters_file).snapshot().index.apply(tickers)
+
+
+def match_chat(
+    tickers: List[Dict[str, Any]],
+    filters_file: str,
+    chat_id: Union[int, str],
+    user_filter: Optional[Dict[str, Any]] = None,
+) -> List[Dict[str, Any]]:
+    """Apply only the filter of ``chat_id`` to ``tickers``.
+
+    Matches exactly like ``apply_filters`` but builds an index over a single
+    filter, so the cost does not depend on the number of users.
+
+    Args:
+        user_filter: The chat's filter if the caller already has it;
+            otherwise it is read from the repository of ``filters_file``.
+
+    Returns:
+        The matches in ``apply_filters`` format, or ``[]`` if the chat has
+        no filter.
+    """
+    if user_filter is None:
+        user_filter = get_repository(filters_file).snapshot().get(chat_id)
+    if not user_filter:
+        return []
+    return FilterIndex({str(chat_id): user_filter}).apply(tickers)
@@ -0,0 +1,260 @@
+"""
+Precompiled matching index for user filters.
+
+``apply_filters`` used to loop over every chat's filter and, for each one,
+over every ticker, converting thresholds to floats for every pair.  This
+module compiles the filters once into ``CompiledFilter`` tuples and builds a
+static centered interval tree per dimension (buy price, sell price, volume).
+For every ticker the index counts the matching filters in each dimension in
+``O(log² n)``, enumerates the candidate sets of each dimension and
+intersects them starting from the most selective one.  Matching a ticker
+therefore costs roughly ``O(log² n + k)`` where ``k`` is the number of
+filters stabbed by the ticker's values, instead of ``O(n)`` Python‑level
+range checks.
+
+The index is immutable; build a new one when the filters change.
+"""
+
+import logging
+import math
+from bisect import bisect_left, bisect_right
+from typing import Any, Dict, FrozenSet, List, NamedTuple, Optional, Sequence, Tuple
+
+INF = float("inf")
+
+
+class CompiledFilter(NamedTuple):
+    """A user filter with all thresholds converted to floats.
+
+    Missing (or ``None``) limits are replaced by values that disable the
+    constraint: ``-inf`` for price minimums, ``0`` for the volume minimum and
+    ``+inf`` for maximums.
+    """
+
+    chat_id: str
+    buy_min: float
+    buy_max: float
+    sell_min: float
+    sell_max: float
+    vol_min: float
+    vol_max: float
+    exchange: str
+    banks: FrozenSet[str]
+
+
+def _limit(f: Dict[str, Any], key: str, default: float) -> float:
+    value = f.get(key)
+    return default if value is None else float(value)
+
+
+def compile_filter(chat_id: str, f: Dict[str, Any]) -> CompiledFilter:
+    """Convert one raw filter dictionary into a ``CompiledFilter``.
+
+    Raises:
+        TypeError, ValueError: If a threshold is not a number or a minimum
+            is above its maximum.
+    """
+    compiled = CompiledFilter(
+        chat_id=chat_id,
+        buy_min=_limit(f, "buy_price_min", -INF),
+        buy_max=_limit(f, "buy_price_max", INF),
+        sell_min=_limit(f, "sell_price_min", -INF),
+        sell_max=_limit(f, "sell_price_max", INF),
+        vol_min=_limit(f, "volume_min", 0.0),
+        vol_max=_limit(f, "volume_max", INF),
+        exchange=f.get("exchange", "binance"),
+        banks=frozenset(f.get("banks") or ()),
+    )
+    for name, lo, hi in (
+        ("buy_price", compiled.buy_min, compiled.buy_max),
+        ("sell_price", compiled.sell_min, compiled.sell_max),
+        ("volume", compiled.vol_min, compiled.vol_max),
+    ):
+        if lo > hi:
+            raise ValueError(f"{name}_min {lo} > {name}_max {hi}")
+    return compiled
+
+
+def compile_filters(filters: Dict[str, Dict[str, Any]]) -> List[CompiledFilter]:
+    """Compile all filters, skipping (and logging) malformed entries."""
+    compiled: List[CompiledFilter] = []
+    for chat_id, f in filters.items():
+        try:
+            compiled.append(compile_filter(chat_id, f))
+        except (TypeError, ValueError, AttributeError) as e:
+            logging.warning(f"[filter_index] Некорректный фильтр {chat_id}: {e}")
+    return compiled
+
+
+def parse_ticker(t: Dict[str, Any]) -> Optional[Tuple[float, float, float]]:
+    """Return ``(price, sell_price, volume)`` of a ticker or ``None`` if it
+    has no ``price`` key."""
+    if "price" not in t:
+        logging.warning(f"[filter_engine] Нет ключа 'price' в: {t}")
+        return None
+    price = float(t.get("price", 0))
+    return price, float(t.get("sell_price", price)), float(t.get("volume", 0))
+
+
+class _IntervalTree:
+    """Static centered interval tree answering stabbing queries.
+
+    Each node stores the intervals containing its center twice: sorted by
+    lower bound and sorted by upper bound, so the intervals of a node that
+    contain a query point form a prefix or a suffix found with ``bisect``.
+    """
+
+    __slots__ = ("_root",)
+
+    def __init__(self, intervals: Sequence[Tuple[float, float, int]]) -> None:
+        # An empty (inverted) interval contains no point and would never
+        # separate from the centers chosen between its bounds.
+        self._root = self._build([i for i in intervals if i[0] <= i[1]])
+
+    @classmethod
+    def _build(cls, intervals: List[Tuple[float, float, int]]) -> Optional[list]:
+        if not intervals:
+            return None
+        endpoints = sorted(
+            x for lo, hi, _ in intervals for x in (lo, hi) if not math.isinf(x)
+        )
+        center = endpoints[len(endpoints) // 2] if endpoints else 0.0
+
+        left, right, here = [], [], []
+        for interval in intervals:
+            if interval[1] < center:
+                left.append(interval)
+            elif interval[0] > center:
+                right.append(interval)
+            else:
+                here.append(interval)
+
+        by_lo = sorted(here, key=lambda i: i[0])
+        by_hi = sorted(here, key=lambda i: i[1])
+        return [
+            center,
+            [i[0] for i in by_lo], [i[2] for i in by_lo],
+            [i[1] for i in by_hi], [i[2] for i in by_hi],
+            cls._build(left),
+            cls._build(right),
+        ]
+
+    def count(self, x: float) -> int:
+        """Return the number of intervals containing ``x``."""
+        total = 0
+        node = self._root
+        while node is not None:
+            center, lo_keys, _, hi_keys, _, left, right = node
+            if x < center:
+                total += bisect_right(lo_keys, x)
+                node = left
+            elif x > center:
+                total += len(hi_keys) - bisect_left(hi_keys, x)
+                node = right
+            else:
+                total += len(lo_keys)
+                break
+        return total
+
+    def stab(self, x: float) -> List[int]:
+        """Return the ids of all intervals containing ``x``."""
+        found: List[int] = []
+        node = self._root
+        while node is not None:
+            center, lo_keys, lo_ids, hi_keys, hi_ids, left, right = node
+            if x < center:
+                found.extend(lo_ids[:bisect_right(lo_keys, x)])
+                node = left
+            elif x > center:
+                found.extend(hi_ids[bisect_left(hi_keys, x):])
+                node = right
+            else:
+                found.extend(lo_ids)
+                break
+        return found
+
+
+class FilterIndex:
+    """Interval index over all users' buy, sell and volume ranges.
+
+    Args:
+        filters: Raw per‑chat filters as stored in ``filters.json``.
+        compiled: ``filters`` already passed through ``compile_filters``;
+            saves compiling them a second time.
+    """
+
+    def __init__(
+        self,
+        filters: Dict[str, Dict[str, Any]],
+        compiled: Optional[List[CompiledFilter]] = None,
+    ) -> None:
+        self.filters: List[CompiledFilter] = (
+            compiled if compiled is not None else compile_filters(filters)
+        )
+        self._trees = tuple(
+            _IntervalTree([(lo, hi, i) for i, (lo, hi) in enumerate(ranges)])
+            for ranges in (
+                [(f.buy_min, f.buy_max) for f in self.filters],
+                [(f.sell_min, f.sell_max) for f in self.filters],
+                [(f.vol_min, f.vol_max) for f in self.filters],
+            )
+        )
+
+    def __len__(self) -> int:
+        return len(self.filters)
+
+    def match(self, price: float, sell_price: float, volume: float) -> List[int]:
+        """Return positions (in ``self.filters``) of filters whose price and
+        volume ranges all contain the given ticker values, in ascending
+        order."""
+        point = (price, sell_price, volume)
+        counts = [tree.count(x) for tree, x in zip(self._trees, point)]
+        if not min(counts):
+            return []
+        # Intersect the candidate sets starting from the most selective
+        # dimension; set operations run in C, unlike per‑filter checks.
+        order = sorted(range(3), key=counts.__getitem__)
+        matched = set(self._trees[order[0]].stab(point[order[0]]))
+        for dim in order[1:]:
+            matched.intersection_update(self._trees[dim].stab(point[dim]))
+            if not matched:
+                return []
+        return sorted(matched)
+
+    def match_pairs(self, tickers: List[Dict[str, Any]]) -> List[Tuple[int, int]]:
+        """Return ``(filter_pos, ticker_pos)`` pairs for all matches.
+
+        Pairs are ordered by filter and then by ticker, i.e. the order the
+        original nested loop produced.  The bank constraint is applied here.
+        """
+        pairs: List[Tuple[int, int]] = []
+        filters = self.filters
+        for j, t in enumerate(tickers):
+            values = parse_ticker(t)
+            if values is None:
+                continue
+            bank = t.get("bank")
+            matched = self.match(*values)
+            if not bank:
+                pairs.extend((i, j) for i in matched)
+                continue
+            for i in matched:
+                banks = filters[i].banks
+                if banks and bank not in banks:
+                    continue
+                pairs.append((i, j))
+        pairs.sort()
+        return pairs
+
+    def apply(self, tickers: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """Return annotated ticker copies for every (filter, ticker) match,
+        in the same format as ``apply_filters``."""
+        filters = self.filters
+        return [
+            {
+                **tickers[j],
+                "chat_id": filters[i].chat_id,
+                "exchange": tickers[j].get("exchange", filters[i].exchange),
+            }
+            for i, j in self.match_pairs(tickers)
+        ]
@@ -0,0 +1,169 @@
+"""
+In‑memory repository of user filters.
+
+The aggregator and the handlers used to open and ``json.load`` the filters
+file on every cycle and every button press.  ``FilterRepository`` keeps the
+parsed, float‑normalised and validated filters in memory and reloads them
+only when the backing data changes or when the write path calls
+``invalidate()``.  Each reload bumps a version number, so consumers can
+cheaply tell whether anything changed.
+
+The backing data is either a JSON file (changes are detected through its
+mtime and size) or, for paths ending in ``.db``, ``.sqlite`` or
+``.sqlite3``, a ``UserStore`` database (changes are detected through the
+store's change token).  Code running on the event loop uses
+``asnapshot``, which checks and reloads a database on the store's thread,
+so a slow write or WAL checkpoint does not stall the loop.
+
+All callers share one repository per path through ``get_repository``.
+"""
+
+import asyncio
+import json
+import logging
+import os
+from typing import Any, Dict, Optional, Tuple, Union
+
+from services.filter_index import CompiledFilter, FilterIndex, compile_filters
+from services.filter_vector import VectorFilterIndex
+from services.user_store import get_user_store
+
+DATABASE_SUFFIXES = (".db", ".sqlite", ".sqlite3")
+
+
+class FilterSnapshot:
+    """An immutable view of all filters at one version.
+
+    Attributes:
+        version: Incremented on every reload of the repository.
+        filters: Raw per‑chat filters as stored on disk.
+        compiled: Validated filters keyed by chat id.
+    """
+
+    __slots__ = ("version", "filters", "compiled", "_index")
+
+    def __init__(self, version: int, filters: Dict[str, Any]) -> None:
+        self.version = version
+        self.filters = filters
+        self.compiled: Dict[str, CompiledFilter] = {
+            f.chat_id: f for f in compile_filters(filters)
+        }
+        self._index: Optional[Union[FilterIndex, VectorFilterIndex]] = None
+
+    @property
+    def index(self) -> Union[FilterIndex, VectorFilterIndex]:
+        """The matching index for this snapshot, built on first use."""
+        if self._index is None:
+            # Imported lazily: filter_engine depends on this module.
+            from services.filter_engine import build_index
+
+            # Reuses the filters compiled for this snapshot.
+            self._index = build_index(self.filters, compiled=list(self.compiled.values()))
+        return self._index
+
+    def get(self, chat_id: Union[int, str]) -> Optional[Dict[str, Any]]:
+        """Return the raw filter of ``chat_id`` or ``None``."""
+        return self.filters.get(str(chat_id))
+
+
+class FilterRepository:
+    """Change‑driven cache of the filters stored in ``path``.
+
+    Args:
+        path: JSON file mapping chat ids to filter dictionaries, or a
+            ``UserStore`` database (see ``DATABASE_SUFFIXES``).
+    """
+
+    def __init__(self, path: str) -> None:
+        self.path = path
+        self._store = get_user_store(path) if path.endswith(DATABASE_SUFFIXES) else None
+        self._token: Optional[Tuple[int, int]] = None
+        self._stale = True
+        self._snapshot = FilterSnapshot(0, {})
+        # Keeps concurrent ``asnapshot`` calls from reloading twice.
+        self._reloading = asyncio.Lock()
+
+    @property
+    def version(self) -> int:
+        """Version of the currently loaded snapshot."""
+        return self._snapshot.version
+
+    def invalidate(self) -> None:
+        """Force a reload on the next ``snapshot()`` call.
+
+        Call this after writing a JSON file; the mtime check alone may miss
+        writes that happen within the filesystem's timestamp resolution.
+        """
+        self._stale = True
+
+    def _change_token(self) -> Optional[Tuple[int, int]]:
+        if self._store is not None:
+            return self._store.change_token()
+        try:
+            st = os.stat(self.path)
+        except OSError:
+            return None
+        return st.st_mtime_ns, st.st_size
+
+    def snapshot(self) -> FilterSnapshot:
+        """Return the current filters, reloading them if the data changed."""
+        token = self._change_token()
+        if self._stale or token != self._token:
+            self._reload(token)
+        return self._snapshot
+
+    async def asnapshot(self) -> FilterSnapshot:
+        """Like ``snapshot``, but a database is checked and read on the
+        store's thread instead of the event loop."""
+        if self._store is None:
+            return self.snapshot()
+        async with self._reloading:
+            # Taken up front so an ``invalidate`` during the read is kept.
+            stale, self._stale = self._stale, False
+            try:
+                token = await self._store.achange_token()
+                if stale or token != self._token:
+                    self._publish(token, await self._store.aload_all_active())
+            except BaseException:
+                self._stale = self._stale or stale
+                raise
+        return self._snapshot
+
+    def _reload(self, token: Optional[Tuple[int, int]]) -> None:
+        filters: Dict[str, Any] = {}
+        if self._store is not None:
+            filters = self._store.load_all_active()
+        elif token is not None:
+            try:
+                with open(self.path, "r") as f:
+                    filters = json.load(f)
+            except (OSError, ValueError) as e:
+                # Keep serving the last good snapshot (e.g. on a partial
+                # write); the next call retries because nothing is marked
+                # as loaded.
+                logging.warning(f"[filter_repository] Не удалось прочитать {self.path}: {e}")
+                return
+            if not isinstance(filters, dict):
+                logging.error(f"[filter_repository] {self.path}: ожидался объект JSON")
+                return
+        self._stale = False
+        self._publish(token, filters)
+
+    def _publish(self, token: Optional[Tuple[int, int]], filters: Dict[str, Any]) -> None:
+        self._token = token
+        self._snapshot = FilterSnapshot(self._snapshot.version + 1, filters)
+        logging.info(
+            f"[filter_repository] Фильтры загружены: {len(self._snapshot.compiled)} "
+            f"(версия {self._snapshot.version})"
+        )
+
+
+_repositories: Dict[str, FilterRepository] = {}
+
+
+def get_repository(path: str) -> FilterRepository:
+    """Return the shared repository for ``path``."""
+    repo = _repositories.get(path)
+    if repo is None:
+        repo = _repositories[path] = FilterRepository(path)
+    return repo
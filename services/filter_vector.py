@@ -0,0 +1,141 @@
+"""
+NumPy batch evaluation of user filters.
+
+An alternative to ``FilterIndex`` selected with ``FILTER_ENGINE=numpy``.  The
+per‑user thresholds are held as column arrays and every cycle's tickers as
+row arrays; matching is a single broadcasted comparison producing a
+users × tickers boolean mask (evaluated in chunks of users to bound memory).
+``match_pairs`` returns the matching (filter, ticker) positions as two index
+arrays without building any per‑pair objects.
+
+NumPy is an optional dependency; ``available()`` reports whether it can be
+imported.
+"""
+
+from typing import Any, Dict, List, Optional, Tuple
+
+try:
+    import numpy as np
+except ImportError:  # pragma: no cover - depends on the environment
+    np = None
+
+from services.filter_index import CompiledFilter, compile_filters, parse_ticker
+
+# Number of users compared against all tickers at once.  Keeps the
+# temporary boolean masks at a few megabytes for 1k tickers.
+CHUNK_USERS = 4096
+
+
+def available() -> bool:
+    """Return ``True`` if NumPy is installed."""
+    return np is not None
+
+
+class VectorFilterIndex:
+    """Column‑array representation of all users' filters.
+
+    Args:
+        filters: Raw per‑chat filters as stored in ``filters.json``.
+        compiled: ``filters`` already passed through ``compile_filters``;
+            saves compiling them a second time.
+
+    Raises:
+        RuntimeError: If NumPy is not installed.
+    """
+
+    def __init__(
+        self,
+        filters: Dict[str, Dict[str, Any]],
+        compiled: Optional[List[CompiledFilter]] = None,
+    ) -> None:
+        if np is None:
+            raise RuntimeError("FILTER_ENGINE=numpy requires the numpy package")
+        self.filters: List[CompiledFilter] = (
+            compiled if compiled is not None else compile_filters(filters)
+        )
+        self.buy_min = np.array([f.buy_min for f in self.filters], dtype=np.float64)
+        self.buy_max = np.array([f.buy_max for f in self.filters], dtype=np.float64)
+        self.sell_min = np.array([f.sell_min for f in self.filters], dtype=np.float64)
+        self.sell_max = np.array([f.sell_max for f in self.filters], dtype=np.float64)
+        self.vol_min = np.array([f.vol_min for f in self.filters], dtype=np.float64)
+        self.vol_max = np.array([f.vol_max for f in self.filters], dtype=np.float64)
+        self.has_banks = np.array([bool(f.banks) for f in self.filters], dtype=bool)
+        # bank -> users accepting it (no bank restriction or bank listed)
+        self._bank_masks: Dict[str, Any] = {}
+
+    def __len__(self) -> int:
+        return len(self.filters)
+
+    def _bank_mask(self, bank: str):
+        mask = self._bank_masks.get(bank)
+        if mask is None:
+            listed = np.array([bank in f.banks for f in self.filters], dtype=bool)
+            mask = self._bank_masks[bank] = ~self.has_banks | listed
+        return mask
+
+    def match_pairs(self, tickers: List[Dict[str, Any]]) -> Tuple[Any, Any]:
+        """Return ``(filter_pos, ticker_pos)`` index arrays for all matches.
+
+        Pairs are ordered by filter and then by ticker, the same order as
+        ``FilterIndex.match_pairs``.  Tickers without a ``price`` key are
+        skipped.
+        """
+        positions: List[int] = []
+        values: List[Tuple[float, float, float]] = []
+        banks: List[Any] = []
+        for j, t in enumerate(tickers):
+            parsed = parse_ticker(t)
+            if parsed is None:
+                continue
+            positions.append(j)
+            values.append(parsed)
+            banks.append(t.get("bank") or None)
+
+        empty = np.empty(0, dtype=np.intp)
+        if not values or not self.filters:
+            return empty, empty
+
+        columns = np.array(values, dtype=np.float64)
+        price, sell, volume = columns[:, 0], columns[:, 1], columns[:, 2]
+        ticker_pos = np.array(positions, dtype=np.intp)
+
+        # Tickers carrying a bank need a per‑user bank check; group them by
+        # bank so each distinct bank costs one column mask.
+        bank_columns: Dict[str, List[int]] = {}
+        for k, bank in enumerate(banks):
+            if bank is not None:
+                bank_columns.setdefault(bank, []).append(k)
+
+        users: List[Any] = []
+        cols: List[Any] = []
+        for start in range(0, len(self.filters), CHUNK_USERS):
+            rows = slice(start, start + CHUNK_USERS)
+            mask = (
+                (self.buy_min[rows, None] <= price)
+                & (price <= self.buy_max[rows, None])
+                & (self.sell_min[rows, None] <= sell)
+                & (sell <= self.sell_max[rows, None])
+                & (self.vol_min[rows, None] <= volume)
+                & (volume <= self.vol_max[rows, None])
+            )
+            for bank, ks in bank_columns.items():
+                mask[:, ks] &= self._bank_mask(bank)[rows, None]
+            u, c = np.nonzero(mask)
+            users.append(u + start)
+            cols.append(c)
+
+        return np.concatenate(users), ticker_pos[np.concatenate(cols)]
+
+    def apply(self, tickers: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """Return annotated ticker copies for every (filter, ticker) match,
+        in the same format as ``apply_filters``."""
+        filters = self.filters
+        users, cols = self.match_pairs(tickers)
+        return [
+            {
+                **tickers[j],
+                "chat_id": filters[i].chat_id,
+                "exchange": tickers[j].get("exchange", filters[i].exchange),
+            }
+            for i, j in zip(users.tolist(), cols.tolist())
+        ]
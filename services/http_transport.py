@@ -0,0 +1,246 @@
+"""
+Shared HTTP transport for exchange requests.
+
+Every exchange call goes through ``HttpTransport``, which wraps one
+``aiohttp.ClientSession`` built by ``create_session``:
+
+* a pooled ``TCPConnector`` keeps connections to each exchange host alive
+  between polls (``HTTP_POOL_SIZE`` in total, ``HTTP_POOL_PER_HOST`` per
+  host) and caches DNS answers for ``HTTP_DNS_TTL`` seconds;
+* explicit connect and socket‑read timeouts replace aiohttp's 5‑minute
+  default, so a stuck socket fails fast instead of holding a pool slot;
+* compressed responses are negotiated and decoded by aiohttp (gzip and
+  deflate always, brotli when the ``Brotli`` package is installed);
+* JSON bodies are decoded with ``orjson`` when it is installed and with the
+  standard ``json`` module otherwise.
+
+A ``TraceConfig`` attached to the session measures each request: DNS
+lookup, connection set‑up, time to first byte (response headers), body
+download and JSON decode.  The last breakdown per host and a moving average
+are available from ``HttpTransport.stats()``.
+"""
+
+import json
+import logging
+import time
+from types import SimpleNamespace
+from typing import Any, Callable, Dict, Optional
+from urllib.parse import urlsplit
+
+import aiohttp
+
+from config import (
+    HTTP_CONNECT_TIMEOUT,
+    HTTP_DNS_TTL,
+    HTTP_KEEPALIVE,
+    HTTP_POOL_PER_HOST,
+    HTTP_POOL_SIZE,
+    HTTP_READ_TIMEOUT,
+)
+
+try:  # Optional dependency: several times faster than the stdlib decoder.
+    import orjson
+except ImportError:  # pragma: no cover - depends on the environment
+    orjson = None
+
+# Phases of a request reported by ``RequestTiming``, in order.
+PHASES = ("dns", "connect", "ttfb", "download", "decode", "total")
+
+# Weight of the newest sample in the per‑host moving averages.
+EWMA_ALPHA = 0.1
+
+
+def json_loads(data: bytes) -> Any:
+    """Decode a JSON document with the fastest available decoder."""
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)
+
+
+def json_dumps(obj: Any) -> str:
+    """Encode ``obj`` as JSON text (used for request bodies)."""
+    if orjson is not None:
+        return orjson.dumps(obj).decode()
+    return json.dumps(obj, separators=(",", ":"))
+
+
+class RequestTiming:
+    """Per‑request timing breakdown in seconds.
+
+    ``dns`` and ``connect`` stay at ``0.0`` when a pooled connection (and
+    cached DNS answer) was reused.  ``ttfb`` runs from sending the request
+    to receiving the response headers.
+    """
+
+    __slots__ = ("start", "dns", "connect", "ttfb", "download", "decode", "total", "_mark")
+
+    def __init__(self) -> None:
+        self.start = time.perf_counter()
+        self._mark = self.start
+        self.dns = self.connect = self.ttfb = 0.0
+        self.download = self.decode = self.total = 0.0
+
+    def as_dict(self) -> Dict[str, float]:
+        return {phase: getattr(self, phase) for phase in PHASES}
+
+
+def _timing(ctx: SimpleNamespace) -> Optional[RequestTiming]:
+    timing = ctx.trace_request_ctx
+    return timing if isinstance(timing, RequestTiming) else None
+
+
+async def _on_dns_start(session, ctx, params) -> None:
+    timing = _timing(ctx)
+    if timing is not None:
+        timing._mark = time.perf_counter()
+
+
+async def _on_dns_end(session, ctx, params) -> None:
+    timing = _timing(ctx)
+    if timing is not None:
+        timing.dns += time.perf_counter() - timing._mark
+
+
+async def _on_connect_start(session, ctx, params) -> None:
+    timing = _timing(ctx)
+    if timing is not None:
+        timing._mark = time.perf_counter()
+
+
+async def _on_connect_end(session, ctx, params) -> None:
+    timing = _timing(ctx)
+    if timing is not None:
+        # DNS resolution happens inside connection set‑up; report it apart.
+        timing.connect += time.perf_counter() - timing._mark - timing.dns
+
+
+async def _on_request_end(session, ctx, params) -> None:
+    timing = _timing(ctx)
+    if timing is not None:
+        timing.ttfb = time.perf_counter() - timing.start - timing.dns - timing.connect
+
+
+def trace_config() -> aiohttp.TraceConfig:
+    """Return a ``TraceConfig`` filling the ``RequestTiming`` passed as
+    ``trace_request_ctx``."""
+    config = aiohttp.TraceConfig()
+    config.on_dns_resolvehost_start.append(_on_dns_start)
+    config.on_dns_resolvehost_end.append(_on_dns_end)
+    config.on_connection_create_start.append(_on_connect_start)
+    config.on_connection_create_end.append(_on_connect_end)
+    config.on_request_end.append(_on_request_end)
+    return config
+
+
+def create_session(
+    pool_size: int = HTTP_POOL_SIZE,
+    pool_per_host: int = HTTP_POOL_PER_HOST,
+    dns_ttl: int = HTTP_DNS_TTL,
+    keepalive: float = HTTP_KEEPALIVE,
+    connect_timeout: float = HTTP_CONNECT_TIMEOUT,
+    read_timeout: float = HTTP_READ_TIMEOUT,
+) -> aiohttp.ClientSession:
+    """Create a ``ClientSession`` tuned for polling a few hosts often.
+
+    Must be called from a running event loop.  The caller owns the session
+    and has to close it.
+    """
+    connector = aiohttp.TCPConnector(
+        limit=pool_size,
+        limit_per_host=pool_per_host,
+        ttl_dns_cache=dns_ttl,
+        keepalive_timeout=keepalive,
+    )
+    timeout = aiohttp.ClientTimeout(
+        total=None, connect=connect_timeout, sock_connect=connect_timeout, sock_read=read_timeout
+    )
+    return aiohttp.ClientSession(
+        connector=connector,
+        timeout=timeout,
+        json_serialize=json_dumps,
+        trace_configs=[trace_config()],
+    )
+
+
+class HttpTransport:
+    """JSON‑over‑HTTP client used by the exchange fetchers.
+
+    Args:
+        session: Session to use.  When omitted a tuned session is created by
+            ``create_session`` on first use and closed by ``close``.  A
+            session created elsewhere still works, but only reports the
+            ``ttfb``/``download``/``decode`` phases if it was built with
+            ``trace_config()``.
+    """
+
+    def __init__(self, session: Optional[aiohttp.ClientSession] = None) -> None:
+        self._session = session
+        self._owns_session = session is None
+        self.requests = 0
+        # host -> last timing, host -> moving average per phase
+        self.last: Dict[str, Dict[str, float]] = {}
+        self.average: Dict[str, Dict[str, float]] = {}
+
+    @property
+    def session(self) -> aiohttp.ClientSession:
+        if self._session is None or self._session.closed:
+            if not self._owns_session:
+                raise RuntimeError("HttpTransport session is closed")
+            self._session = create_session()
+        return self._session
+
+    async def close(self) -> None:
+        """Close the session if this transport created it."""
+        if self._owns_session and self._session is not None and not self._session.closed:
+            await self._session.close()
+
+    async def post_json(
+        self,
+        url: str,
+        payload: Dict[str, Any],
+        on_headers: Optional[Callable[[Any], None]] = None,
+    ) -> Any:
+        """POST ``payload`` as JSON and return the decoded JSON response.
+
+        Args:
+            on_headers: Called with the headers of a successful response
+                (e.g. to read rate‑limit quotas).
+
+        Raises:
+            aiohttp.ClientResponseError: For HTTP error statuses.
+            aiohttp.ClientError: For connection failures and timeouts.
+        """
+        timing = RequestTiming()
+        async with self.session.post(url, json=payload, trace_request_ctx=timing) as r:
+            if not timing.ttfb:
+                timing.ttfb = time.perf_counter() - timing.start
+            r.raise_for_status()
+            if on_headers is not None:
+                on_headers(r.headers)
+            body = await r.read()
+        received = time.perf_counter()
+        timing.download = received - timing.start - timing.dns - timing.connect - timing.ttfb
+        data = json_loads(body)
+        timing.decode = time.perf_counter() - received
+        timing.total = timing.decode + received - timing.start
+        self._record(urlsplit(url).hostname or url, timing)
+        return data
+
+    def _record(self, host: str, timing: RequestTiming) -> None:
+        self.requests += 1
+        sample = timing.as_dict()
+        self.last[host] = sample
+        avg = self.average.get(host)
+        if avg is None:
+            self.average[host] = dict(sample)
+        else:
+            for phase, value in sample.items():
+                avg[phase] += (value - avg[phase]) * EWMA_ALPHA
+        logging.debug(
+            f"[http] {host}: "
+            + ", ".join(f"{phase} {value * 1000:.1f} мс" for phase, value in sample.items())
+        )
+
+    def stats(self) -> Dict[str, Any]:
+        """Return the request count and the last/average timing per host."""
+        return {"requests": self.requests, "last": self.last, "average": self.average}
@@ -0,0 +1,343 @@
+"""
+Prometheus‑style metrics for the ArbitPro bot.
+
+A deliberately small, dependency‑free implementation of counters, gauges
+and histograms with labels, rendered in the Prometheus text exposition
+format (version 0.0.4).  Recording a value is a dict lookup and an addition;
+all formatting happens only when ``/metrics`` is scraped, so the overhead is
+negligible when nobody is scraping.  Gauges can also be given a callback
+that is evaluated at scrape time (e.g. a queue depth).  Counters and
+histograms recorded in another process (the shard workers) are moved into
+the serving process with ``Registry.drain`` and ``Registry.merge``.
+
+The metrics of the aggregator are defined here as module‑level objects so
+every component records into the same default ``REGISTRY``.  ``setup_routes``
+adds ``GET /metrics`` to an aiohttp application and ``start_server``
+serves it on its own (on ``WEBAPP_PORT`` when the bot runs in polling mode).
+"""
+
+import logging
+import math
+from bisect import bisect_left
+from typing import Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+from aiohttp import web
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+# Default latency buckets in seconds.
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+LabelValues = Tuple[str, ...]
+
+
+def _format_value(value: float) -> str:
+    if value == math.inf:
+        return "+Inf"
+    if value == -math.inf:
+        return "-Inf"
+    if math.isnan(value):
+        return "NaN"
+    return repr(float(value)) if not float(value).is_integer() else str(int(value))
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    parts = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> None:
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+
+    def _key(self, labels: Sequence[str]) -> LabelValues:
+        if len(labels) != len(self.labelnames):
+            raise ValueError(f"{self.name} expects labels {self.labelnames}, got {labels}")
+        return tuple(str(v) for v in labels)
+
+    def samples(self) -> Iterable[str]:
+        raise NotImplementedError
+
+    def render(self) -> str:
+        header = f"# HELP {self.name} {self.documentation}\n# TYPE {self.name} {self.kind}\n"
+        return header + "".join(line + "\n" for line in self.samples())
+
+
+class Counter(_Metric):
+    """Monotonically increasing value per label set."""
+
+    kind = "counter"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> None:
+        super().__init__(name, documentation, labelnames)
+        self._values: Dict[LabelValues, float] = {}
+
+    def inc(self, *labels: str, amount: float = 1.0) -> None:
+        key = self._key(labels)
+        self._values[key] = self._values.get(key, 0.0) + amount
+
+    def value(self, *labels: str) -> float:
+        return self._values.get(self._key(labels), 0.0)
+
+    def drain(self) -> Dict[LabelValues, float]:
+        """Return the values recorded so far and reset them to zero."""
+        values, self._values = self._values, {}
+        return values
+
+    def merge(self, values: Dict[LabelValues, float]) -> None:
+        """Add values returned by ``drain`` (of another process)."""
+        for key, value in values.items():
+            self._values[key] = self._values.get(key, 0.0) + value
+
+    def samples(self) -> Iterable[str]:
+        for key, value in self._values.items():
+            yield f"{self.name}{_labels(self.labelnames, key)} {_format_value(value)}"
+
+
+class Gauge(_Metric):
+    """Value that can go up and down, optionally computed at scrape time.
+
+    Args:
+        callback: Returns the current value (unlabelled gauges only).
+    """
+
+    kind = "gauge"
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: Sequence[str] = (),
+        callback: Optional[Callable[[], float]] = None,
+    ) -> None:
+        super().__init__(name, documentation, labelnames)
+        self._values: Dict[LabelValues, float] = {}
+        self.callback = callback
+
+    def set(self, value: float, *labels: str) -> None:
+        self._values[self._key(labels)] = value
+
+    def set_function(self, callback: Optional[Callable[[], float]]) -> None:
+        self.callback = callback
+
+    def value(self, *labels: str) -> float:
+        if self.callback is not None and not labels:
+            return float(self.callback())
+        return self._values.get(self._key(labels), 0.0)
+
+    def samples(self) -> Iterable[str]:
+        if self.callback is not None:
+            try:
+                yield f"{self.name} {_format_value(float(self.callback()))}"
+            except Exception as e:
+                logging.warning(f"[metrics] Не удалось вычислить {self.name}: {e!r}")
+            return
+        for key, value in self._values.items():
+            yield f"{self.name}{_labels(self.labelnames, key)} {_format_value(value)}"
+
+
+class Histogram(_Metric):
+    """Distribution of observed values in cumulative buckets."""
+
+    kind = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: Sequence[str] = (),
+        buckets: Sequence[float] = DEFAULT_BUCKETS,
+    ) -> None:
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+        # label values -> [per-bucket counts (+Inf last), sum]
+        self._values: Dict[LabelValues, Tuple[List[int], List[float]]] = {}
+
+    def observe(self, value: float, *labels: str) -> None:
+        key = self._key(labels)
+        entry = self._values.get(key)
+        if entry is None:
+            entry = self._values[key] = ([0] * (len(self.buckets) + 1), [0.0])
+        entry[0][bisect_left(self.buckets, value)] += 1
+        entry[1][0] += value
+
+    def count(self, *labels: str) -> int:
+        entry = self._values.get(self._key(labels))
+        return sum(entry[0]) if entry else 0
+
+    def drain(self) -> Dict[LabelValues, Tuple[List[int], List[float]]]:
+        """Return the observations recorded so far and reset them."""
+        values, self._values = self._values, {}
+        return values
+
+    def merge(self, values: Dict[LabelValues, Tuple[List[int], List[float]]]) -> None:
+        """Add observations returned by ``drain`` (same buckets)."""
+        for key, (counts, total) in values.items():
+            entry = self._values.get(key)
+            if entry is None:
+                entry = self._values[key] = ([0] * (len(self.buckets) + 1), [0.0])
+            for i, n in enumerate(counts):
+                entry[0][i] += n
+            entry[1][0] += total[0]
+
+    def samples(self) -> Iterable[str]:
+        for key, (counts, total) in self._values.items():
+            cumulative = 0
+            for bound, n in zip(self.buckets + (math.inf,), counts):
+                cumulative += n
+                le = f'le="{_format_value(bound)}"'
+                yield f"{self.name}_bucket{_labels(self.labelnames, key, le)} {cumulative}"
+            yield f"{self.name}_sum{_labels(self.labelnames, key)} {_format_value(total[0])}"
+            yield f"{self.name}_count{_labels(self.labelnames, key)} {cumulative}"
+
+
+class Registry:
+    """Collection of metrics rendered together."""
+
+    def __init__(self) -> None:
+        self._metrics: Dict[str, _Metric] = {}
+
+    def register(self, metric: _Metric) -> _Metric:
+        if metric.name in self._metrics:
+            raise ValueError(f"Metric {metric.name} is already registered")
+        self._metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> Counter:
+        return self.register(Counter(name, documentation, labelnames))
+
+    def gauge(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> Gauge:
+        return self.register(Gauge(name, documentation, labelnames))
+
+    def histogram(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: Sequence[str] = (),
+        buckets: Sequence[float] = DEFAULT_BUCKETS,
+    ) -> Histogram:
+        return self.register(Histogram(name, documentation, labelnames, buckets))
+
+    def drain(self) -> Dict[str, dict]:
+        """Return and reset the non‑empty counters and histograms.
+
+        Used by processes that do not serve ``/metrics`` themselves; the
+        result is picklable and is added to the serving registry with
+        ``merge``.  Gauges are not included.
+        """
+        drained = {}
+        for name, metric in self._metrics.items():
+            if isinstance(metric, (Counter, Histogram)) and metric._values:
+                drained[name] = metric.drain()
+        return drained
+
+    def merge(self, drained: Dict[str, dict]) -> None:
+        """Add the result of another registry's ``drain``."""
+        for name, values in drained.items():
+            metric = self._metrics.get(name)
+            if isinstance(metric, (Counter, Histogram)):
+                metric.merge(values)
+
+    def render(self) -> str:
+        return "".join(metric.render() for metric in self._metrics.values())
+
+
+REGISTRY = Registry()
+
+# -- exchange polling -------------------------------------------------------
+FETCH_LATENCY = REGISTRY.histogram(
+    "arbitpro_fetch_seconds", "Latency of exchange requests.", ["exchange"]
+)
+FETCH_REQUESTS = REGISTRY.counter(
+    "arbitpro_fetch_requests_total", "Exchange requests sent.", ["exchange"]
+)
+FETCH_ERRORS = REGISTRY.counter(
+    "arbitpro_fetch_errors_total", "Failed exchange requests.", ["exchange", "reason"]
+)
+RATE_LIMIT_RATE = REGISTRY.gauge(
+    "arbitpro_rate_limit_rps", "Current adaptive request rate per exchange endpoint or host.",
+    ["limiter"]
+)
+RATE_LIMIT_THROTTLED = REGISTRY.counter(
+    "arbitpro_rate_limit_throttled_total", "Rate-limit answers (HTTP 429/418) received.",
+    ["limiter", "status"]
+)
+RATE_LIMIT_WAIT = REGISTRY.histogram(
+    "arbitpro_rate_limit_wait_seconds", "Time requests waited in the rate-limit queue.",
+    ["limiter"]
+)
+FETCH_HEDGES = REGISTRY.counter(
+    "arbitpro_fetch_hedges_total", "Hedged duplicate exchange requests by outcome.",
+    ["exchange", "outcome"]
+)
+CIRCUIT_STATE = REGISTRY.gauge(
+    "arbitpro_circuit_state", "Exchange circuit breaker state (0 closed, 1 half-open, 2 open).",
+    ["exchange"]
+)
+CIRCUIT_TRANSITIONS = REGISTRY.counter(
+    "arbitpro_circuit_transitions_total", "Exchange circuit breaker state changes.",
+    ["exchange", "state"]
+)
+
+# -- matching ---------------------------------------------------------------
+MATCH_DURATION = REGISTRY.histogram(
+    "arbitpro_match_seconds", "Duration of one apply_filters round.",
+    buckets=(0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5),
+)
+MATCHES = REGISTRY.counter("arbitpro_matches_total", "Orders matched by user filters.")
+ALERTS_SUPPRESSED = REGISTRY.counter(
+    "arbitpro_alerts_suppressed_total", "Matches dropped as repeats of recent alerts."
+)
+CYCLE_DURATION = REGISTRY.histogram(
+    "arbitpro_cycle_seconds", "Time from starting a poll to its matches being queued for sending."
+)
+
+# -- on-demand quotes ------------------------------------------------------
+QUOTE_CACHE_READS = REGISTRY.counter(
+    "arbitpro_quote_cache_reads_total", "Markets read from the quote cache by freshness.", ["result"]
+)
+QUOTE_CACHE_REFRESHES = REGISTRY.counter(
+    "arbitpro_quote_cache_refreshes_total", "Markets fetched to refresh the quote cache."
+)
+
+# -- notifications ----------------------------------------------------------
+NOTIFY_QUEUE_DEPTH = REGISTRY.gauge(
+    "arbitpro_notify_queue_depth", "Messages waiting in the dispatcher queue."
+)
+SEND_LATENCY = REGISTRY.histogram(
+    "arbitpro_send_seconds", "Latency of Telegram send_message calls."
+)
+SEND_RESULTS = REGISTRY.counter(
+    "arbitpro_send_total", "Telegram sends by outcome.", ["result"]
+)
+
+
+async def metrics_handler(request: web.Request) -> web.Response:
+    """aiohttp handler returning ``REGISTRY`` in Prometheus text format."""
+    return web.Response(body=REGISTRY.render().encode(), headers={"Content-Type": CONTENT_TYPE})
+
+
+def setup_routes(app: web.Application, path: str = "/metrics") -> None:
+    """Expose the metrics on ``path`` of an existing aiohttp application."""
+    app.router.add_get(path, metrics_handler)
+
+
+async def start_server(port: int, host: str = "0.0.0.0") -> web.AppRunner:
+    """Serve ``/metrics`` on ``host:port``; clean up with ``runner.cleanup()``."""
+    app = web.Application()
+    setup_routes(app)
+    runner = web.AppRunner(app, access_log=None)
+    await runner.setup()
+    await web.TCPSite(runner, host, port).start()
+    logging.info(f"📈 Метрики доступны на :{port}/metrics")
+    return runner
@@ -0,0 +1,127 @@
+"""
+Notification texts for the ArbitPro bot.
+
+Builds the Telegram messages sent for matched orders.  The order URL, when
+present, is appended as an HTML hyperlink (the bot uses HTML parse mode).
+
+When a chat matches several orders at once, ``DigestBatcher`` groups them
+into a single digest, sorted by spread and split at Telegram's message
+length limit, instead of sending one message per match.
+"""
+
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+from config import DIGEST_WINDOW
+
+# Telegram rejects messages longer than this many characters.
+MAX_MESSAGE_LENGTH = 4096
+
+
+def spread(order: Dict[str, Any]) -> float:
+    """Return the order's sell price minus its buy price."""
+    price = float(order.get("price", order.get("buy", 0)))
+    return float(order.get("sell_price", order.get("sell", price))) - price
+
+
+def format_order(order: Dict[str, Any]) -> str:
+    """Return the alert text for one matched order."""
+    text = (
+        f"📢 Найден арбитраж по {order['symbol']}:\n"
+        f"💰 Покупка: {order['buy']}\n"
+        f"💵 Продажа: {order['sell']}\n"
+        f"📦 Объём: {order['volume']}"
+    )
+    url = order.get("url")
+    if url:
+        text += f"\n🔗 <a href=\"{url}\">Открыть ордер</a>"
+    return text
+
+
+def _digest_entry(order: Dict[str, Any], limit: int) -> str:
+    """Return the digest entry of one order in at most ``limit`` characters.
+
+    Only the plain text is shortened; the link markup is kept whole or, if
+    it does not fit at all, left out, so the entry is always valid HTML.
+    """
+    exchange = order.get("exchange")
+    title = f"{order['symbol']} ({exchange})" if exchange else order["symbol"]
+    text = (
+        f"🟢 {title}, спред {spread(order):.2f}\n"
+        f"💰 Покупка: {order['buy']} · 💵 Продажа: {order['sell']} · 📦 {order['volume']}"
+    )
+    url = order.get("url")
+    link = f"\n🔗 <a href=\"{url}\">Открыть ордер</a>" if url else ""
+    if len(link) > limit:
+        link = ""
+    return text[: limit - len(link)] + link
+
+
+def format_digest(orders: List[Dict[str, Any]]) -> List[str]:
+    """Return the message(s) for all orders matched by one chat.
+
+    A single order uses the regular alert text.  Several orders are sorted
+    by spread (largest first) and packed into as few messages as possible,
+    each at most ``MAX_MESSAGE_LENGTH`` characters; entries are never split
+    across messages, and an entry too long for one message loses the end of
+    its text but keeps its link markup intact.
+    """
+    if len(orders) == 1:
+        return [format_order(orders[0])]
+
+    ranked = sorted(orders, key=spread, reverse=True)
+    header = f"📢 Найдено арбитражных сделок: {len(ranked)}"
+    messages: List[str] = []
+    current = header
+    for order in ranked:
+        entry = _digest_entry(order, MAX_MESSAGE_LENGTH - 2)
+        if len(current) + 2 + len(entry) > MAX_MESSAGE_LENGTH:
+            messages.append(current)
+            current = entry
+        else:
+            current += "\n\n" + entry
+    messages.append(current)
+    return messages
+
+
+class DigestBatcher:
+    """Collects matched orders per chat until their digest is due.
+
+    The first order for a chat opens a batch that becomes ready ``window``
+    seconds later; with ``window=0`` every batch is ready immediately, so
+    each chat gets one digest per matching round.  The caller drains ready
+    batches with ``pop_ready`` and formats them with ``format_digest``.
+
+    Args:
+        window: Batching window in seconds.
+    """
+
+    def __init__(self, window: float = DIGEST_WINDOW) -> None:
+        self.window = window
+        # chat_id -> (time the batch was opened, orders)
+        self._pending: Dict[Any, Tuple[float, List[Dict[str, Any]]]] = {}
+
+    def __len__(self) -> int:
+        return len(self._pending)
+
+    def add(self, order: Dict[str, Any], now: Optional[float] = None) -> None:
+        """Add a matched order to its chat's batch."""
+        chat_id = order["chat_id"]
+        batch = self._pending.get(chat_id)
+        if batch is None:
+            now = time.monotonic() if now is None else now
+            self._pending[chat_id] = (now, [order])
+        else:
+            batch[1].append(order)
+
+    def pop_ready(self, now: Optional[float] = None) -> List[Tuple[Any, List[Dict[str, Any]]]]:
+        """Remove and return ``(chat_id, orders)`` for every due batch."""
+        now = time.monotonic() if now is None else now
+        ready = [c for c, (opened, _) in self._pending.items() if now - opened >= self.window]
+        return [(c, self._pending.pop(c)[1]) for c in ready]
+
+    def pop_all(self) -> List[Tuple[Any, List[Dict[str, Any]]]]:
+        """Remove and return every pending batch."""
+        batches = [(c, orders) for c, (_, orders) in self._pending.items()]
+        self._pending.clear()
+        return batches
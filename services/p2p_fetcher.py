@@ -2,170 +2,474 @@
 P2P exchange fetcher for the ArbitPro bot.
 
 This helper class encapsulates the logic for retrieving best buy and sell
-orders from supported P2P trading platforms like Binance and Bybit.  It
-matches the original implementation from the upstream repository and
+orders from supported P2P trading platforms like Binance and Bybit and
 provides a unified ``fetch_orders`` method for higher‑level components such
 as the aggregator.
+
+Venue specifics (endpoint, request body, response layout, rate limits) live
+in the adapters of ``services.exchanges``; the fetcher scans any configured
+(exchange, asset, fiat) market matrix through them.  Requests are issued
+concurrently, bounded by a global concurrency limit, by each adapter's own
+concurrency limit and by adaptive token buckets per endpoint and host
+(``services.rate_limit``), which queue requests fairly across markets and
+slow down when a venue answers HTTP 429/418.  Every market gets its own timeout and
+the whole cycle is bounded by a single deadline; a market that is late or
+fails is dropped from the cycle and reported in the ``failures`` of the
+returned ``FetchResult`` instead of stalling or crashing the caller.
+
+``fetch_books`` reads several pages of each book instead of the top advert
+and returns ``OrderBook`` objects for the cross‑exchange spread engine
+(``services.spread_engine``).
+
+Each request goes through the venue's resilience layer
+(``services.resilience``): a request still unanswered after the venue's
+observed p95 latency is hedged with a duplicate, and a circuit breaker per
+venue fails requests fast while the venue keeps failing, probing it again
+after a pause.
+
+HTTP goes through ``services.http_transport.HttpTransport`` (pooled
+keep‑alive connections, DNS cache, explicit timeouts, compression and fast
+JSON decoding); its per‑request timing breakdown is exposed as
+``P2PFetcher.transport.stats()``.
 """
 
+import asyncio
+import logging
+import time
+import warnings
 import aiohttp
-from typing import Dict, List, Optional
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Sequence, Set
 
+from config import (
+    DEPTH_PAGES,
+    DEPTH_ROWS,
+    EXCHANGE_TIMEOUT,
+    FETCH_CONCURRENCY,
+    FETCH_CYCLE_TIMEOUT,
+    P2P_MARKETS,
+)
+from services.exchanges import BUY, SELL, ExchangeAdapter, Market, get_adapter, parse_markets
+from services.http_transport import HttpTransport
+from services.metrics import (
+    CIRCUIT_STATE,
+    CIRCUIT_TRANSITIONS,
+    FETCH_ERRORS,
+    FETCH_HEDGES,
+    FETCH_LATENCY,
+    FETCH_REQUESTS,
+)
+from services.rate_limit import RATE_LIMIT_STATUSES, RateLimitManager
+from services.resilience import (
+    STATE_VALUES,
+    CircuitBreaker,
+    CircuitOpenError,
+    HedgeBudget,
+    LatencyWindow,
+    hedged,
+)
+from services.spread_engine import Level, OrderBook
 
-class P2PFetcher:
-    """Helper for fetching P2P orders from various exchanges."""
+# Times a request answered with HTTP 429 is queued again before it fails.
+RATE_LIMIT_RETRIES = 1
 
-    def __init__(self, session: aiohttp.ClientSession) -> None:
-        self.session = session
 
-    async def _post_json(self, url: str, payload: Dict) -> Dict:
-        async with self.session.post(url, json=payload) as r:
-            return await r.json()
+class FetchResult(list):
+    """Results of one ``fetch_orders``/``fetch_books`` call.
 
-    async def fetch_binance_orders(
-        self, asset: str = "USDT", fiat: str = "UAH", rows: int = 1
-    ) -> Optional[Dict[str, float]]:
-        """Return best buy/sell order info from Binance P2P."""
+    A plain list of the results, plus the markets that were dropped.  Each
+    call returns its own, so concurrent calls (pipeline polls and quote
+    cache refreshes) cannot overwrite each other's failures.
 
-        url = "https://p2p.binance.com/bapi/c2c/v2/friendly/c2c/adv/search"
+    Attributes:
+        failures: Dropped markets (as ``str``) mapped to a short reason
+            ("timeout", "deadline" or the exception repr).
+        rate_limited: Dropped markets that failed with HTTP 429/418.
+    """
 
-        buy_payload = {
-            "asset": asset,
-            "fiat": fiat,
-            "tradeType": "SELL",  # others sell, we buy
-            "page": 1,
-            "rows": rows,
-        }
+    def __init__(self, results: Sequence[Any] = ()) -> None:
+        super().__init__(results)
+        self.failures: Dict[str, str] = {}
+        self.rate_limited: Set[Market] = set()
 
-        sell_payload = {
-            "asset": asset,
-            "fiat": fiat,
-            "tradeType": "BUY",  # others buy, we sell
-            "page": 1,
-            "rows": rows,
-        }
 
-        buy_resp = await self._post_json(url, buy_payload)
-        sell_resp = await self._post_json(url, sell_payload)
+class _VenueHealth:
+    """Latency window, hedge budget and circuit breaker of one adapter."""
 
-        try:
-            buy_adv = buy_resp.get("data", [])[0]["adv"]
-            sell_adv = sell_resp.get("data", [])[0]["adv"]
-        except Exception:
+    def __init__(self, adapter: ExchangeAdapter) -> None:
+        self.quantile = adapter.hedge_quantile
+        self.latency = LatencyWindow()
+        self.budget = HedgeBudget(adapter.hedge_budget)
+        self.breaker = CircuitBreaker(
+            adapter.breaker_failures,
+            adapter.breaker_reset,
+            on_change=lambda state: self._changed(adapter.name, state),
+        )
+        CIRCUIT_STATE.set(STATE_VALUES[self.breaker.state], adapter.name)
+
+    @staticmethod
+    def _changed(name: str, state: str) -> None:
+        CIRCUIT_STATE.set(STATE_VALUES[state], name)
+        CIRCUIT_TRANSITIONS.inc(name, state)
+        log = logging.warning if state != "closed" else logging.info
+        log(f"[p2p_fetcher] Цепь {name}: {state}")
+
+    def hedge_delay(self) -> Optional[float]:
+        if self.budget.ratio <= 0:
             return None
+        return self.latency.quantile(self.quantile)
 
+    def stats(self) -> Dict[str, Any]:
         return {
-            "buy": float(buy_adv.get("price", 0)),
-            "sell": float(sell_adv.get("price", 0)),
-            "volume": float(buy_adv.get("tradableQuantity", 0)),
-            "url": f"https://p2p.binance.com/en/adDetail?advNo={buy_adv.get('advNo')}",
+            "state": self.breaker.state,
+            "failures": self.breaker.failures,
+            "p95": self.latency.quantile(0.95),
+            "requests": self.budget.requests,
+            "hedges": self.budget.hedges,
         }
 
+
+class P2PFetcher:
+    """Helper for fetching P2P orders from various exchanges.
+
+    Args:
+        session: Session for exchange requests.  ``None`` makes the fetcher
+            create (and ``close``) a tuned session of its own.
+        markets: Markets to scan; defaults to ``P2P_MARKETS``.
+        exchange_timeout: Timeout of a single request in seconds.
+        cycle_timeout: Deadline of one ``fetch_orders`` call in seconds.
+        concurrency: Maximum number of requests in flight.
+        recorder: Optional ``services.recorder.ResponseRecorder`` receiving
+            every decoded response.
+    """
+
+    def __init__(
+        self,
+        session: Optional[aiohttp.ClientSession] = None,
+        markets: Optional[Sequence[Market]] = None,
+        exchange_timeout: float = EXCHANGE_TIMEOUT,
+        cycle_timeout: float = FETCH_CYCLE_TIMEOUT,
+        concurrency: int = FETCH_CONCURRENCY,
+        recorder=None,
+    ) -> None:
+        self.transport = HttpTransport(session)
+        self.recorder = recorder
+        self.markets: List[Market] = list(markets) if markets is not None else parse_markets(P2P_MARKETS)
+        self.exchange_timeout = exchange_timeout
+        self.cycle_timeout = cycle_timeout
+        self._semaphore = asyncio.Semaphore(concurrency)
+        self._slots: Dict[str, asyncio.Semaphore] = {}
+        self.rate_limits = RateLimitManager()
+        self._health: Dict[str, _VenueHealth] = {}
+
+    async def close(self) -> None:
+        """Release the HTTP session if the fetcher created it."""
+        await self.transport.close()
+
+    def venue_stats(self) -> Dict[str, Dict[str, Any]]:
+        """Return circuit state, p95 latency and hedge counters per venue."""
+        return {name: health.stats() for name, health in self._health.items()}
+
+    def rate_limit_stats(self) -> Dict[str, Dict[str, Any]]:
+        """Return the current rate and queue of every endpoint and host."""
+        return self.rate_limits.stats()
+
+    async def _post_json(
+        self, url: str, payload: Dict, on_headers: Optional[Callable[[Any], None]] = None
+    ) -> Dict:
+        return await self.transport.post_json(url, payload, on_headers)
+
+    def _venue_slots(self, adapter: ExchangeAdapter) -> asyncio.Semaphore:
+        slots = self._slots.get(adapter.name)
+        if slots is None:
+            slots = self._slots[adapter.name] = asyncio.Semaphore(adapter.max_concurrency)
+        return slots
+
+    def _venue_health(self, adapter: ExchangeAdapter) -> _VenueHealth:
+        health = self._health.get(adapter.name)
+        if health is None:
+            health = self._health[adapter.name] = _VenueHealth(adapter)
+        return health
+
+    async def _request(
+        self, adapter: ExchangeAdapter, payload: Dict, flow: Optional[Market] = None
+    ) -> Dict:
+        """POST ``payload`` to ``adapter`` within the global and venue limits.
+
+        Requests wait for rate‑limit tokens in a queue shared fairly by all
+        ``flow`` values (markets).  A request answered with HTTP 429 is
+        queued again (up to ``RATE_LIMIT_RETRIES`` times) after the limiter
+        has slowed down, instead of failing the market.
+
+        The per‑exchange timeout only covers the request itself (including a
+        hedged duplicate), not the time spent waiting for a concurrency or
+        rate‑limit slot.
+
+        Raises:
+            CircuitOpenError: If the venue's circuit is open.
+        """
+        health = self._venue_health(adapter)
+        if not health.breaker.allow(flow=flow):
+            FETCH_ERRORS.inc(adapter.name, "circuit_open")
+            raise CircuitOpenError(adapter.name)
+
+        try:
+            attempt = 0
+            while True:
+                try:
+                    data = await self._attempt(adapter, payload, flow, health)
+                    break
+                except aiohttp.ClientResponseError as e:
+                    if e.status not in RATE_LIMIT_STATUSES:
+                        raise
+                    self.rate_limits.on_throttled(adapter, adapter.url, e.status, e.headers)
+                    if e.status != 429 or attempt >= RATE_LIMIT_RETRIES:
+                        raise
+                    attempt += 1
+        except asyncio.CancelledError:
+            health.breaker.release()
+            raise
+        except Exception:
+            health.breaker.record_failure()
+            raise
+        health.breaker.record_success()
+
+        # Only the answer actually used is recorded, not a losing duplicate.
+        if self.recorder is not None:
+            self.recorder.record(adapter.url, payload, data)
+        return data
+
+    async def _attempt(
+        self, adapter: ExchangeAdapter, payload: Dict, flow: Optional[Market], health: "_VenueHealth"
+    ) -> Dict:
+        """Send one (possibly hedged) request once a rate‑limit token and
+        concurrency slots are available."""
+
+        def on_headers(headers: Any) -> None:
+            self.rate_limits.on_response(adapter, adapter.url, headers)
+
+        def on_hedge(won: bool) -> None:
+            FETCH_HEDGES.inc(adapter.name, "won" if won else "lost")
+
+        def may_hedge() -> bool:
+            # A duplicate needs a free rate‑limit token; it never waits.
+            if not self.rate_limits.try_acquire(adapter, adapter.url):
+                return False
+            if not health.budget.try_hedge():
+                return False
+            FETCH_REQUESTS.inc(adapter.name)
+            FETCH_HEDGES.inc(adapter.name, "sent")
+            return True
+
+        await self.rate_limits.acquire(adapter, adapter.url, flow)
+        async with self._venue_slots(adapter), self._semaphore:
+            FETCH_REQUESTS.inc(adapter.name)
+            health.budget.request()
+            start = time.monotonic()
+            try:
+                data = await asyncio.wait_for(
+                    hedged(
+                        lambda: self._post_json(adapter.url, payload, on_headers),
+                        health.hedge_delay(),
+                        may_hedge,
+                        on_hedge,
+                    ),
+                    timeout=self.exchange_timeout,
+                )
+            except asyncio.TimeoutError:
+                FETCH_ERRORS.inc(adapter.name, "timeout")
+                raise
+            except aiohttp.ClientResponseError as e:
+                FETCH_ERRORS.inc(adapter.name, f"http_{e.status}")
+                raise
+            except Exception as e:
+                FETCH_ERRORS.inc(adapter.name, type(e).__name__)
+                raise
+            finally:
+                FETCH_LATENCY.observe(time.monotonic() - start, adapter.name)
+            health.latency.record(time.monotonic() - start)
+        return data
+
+    # -- deprecated per‑exchange API -------------------------------------
+
+    async def fetch_binance_orders(
+        self, asset: str = "USDT", fiat: str = "UAH", rows: int = 1
+    ) -> Optional[Dict]:
+        """Deprecated: use ``fetch_market(Market("binance", asset, fiat))``."""
+        warnings.warn(
+            "fetch_binance_orders is deprecated, use fetch_market", DeprecationWarning, stacklevel=2
+        )
+        return await self.fetch_market(Market("binance", asset, fiat), rows)
+
     async def fetch_bybit_orders(
         self, asset: str = "USDT", fiat: str = "RUB", rows: int = 1
-    ) -> Optional[Dict[str, float]]:
-        """Return best buy/sell order info from Bybit P2P."""
-
-        url = "https://api2.bybit.com/fiat/otc/item/online"
-
-        buy_payload = {
-            "tokenId": asset,
-            "currencyId": fiat,
-            "payment": [],
-            "side": 1,  # we buy crypto
-            "size": rows,
-            "page": 1,
-        }
+    ) -> Optional[Dict]:
+        """Deprecated: use ``fetch_market(Market("bybit", asset, fiat))``."""
+        warnings.warn(
+            "fetch_bybit_orders is deprecated, use fetch_market", DeprecationWarning, stacklevel=2
+        )
+        return await self.fetch_market(Market("bybit", asset, fiat), rows)
 
-        sell_payload = {
-            "tokenId": asset,
-            "currencyId": fiat,
-            "payment": [],
-            "side": 2,  # we sell crypto
-            "size": rows,
-            "page": 1,
-        }
+    async def fetch_bitget_orders(
+        self, asset: str = "USDT", fiat: str = "UAH", rows: int = 1
+    ) -> Optional[Dict]:
+        """Deprecated and always ``None``: Bitget's P2P adverts need signed
+        requests, so there is no Bitget adapter (see ``services.exchanges``)."""
+        warnings.warn(
+            "fetch_bitget_orders is deprecated and always returns None",
+            DeprecationWarning,
+            stacklevel=2,
+        )
+        return None
+
+    async def fetch_market(self, market: Market, rows: int = 1) -> Optional[Dict]:
+        """Return best buy/sell order info for a single market.
 
-        buy_resp = await self._post_json(url, buy_payload)
-        sell_resp = await self._post_json(url, sell_payload)
+        Both sides of the book are requested concurrently.
+
+        Args:
+            market: The (exchange, asset, fiat) market to query.
+            rows: Number of adverts to request per side.
+
+        Returns:
+            A ticker dictionary with ``buy``, ``sell``, ``volume``, ``url``,
+            ``ad_id``, ``symbol``, ``price``, ``sell_price``, ``exchange`` and
+            ``fiat`` keys, or ``None`` if either side of the book is empty.
+        """
+        adapter = get_adapter(market.exchange)
+        buy_resp, sell_resp = await asyncio.gather(
+            self._request(adapter, adapter.build_payload(market.asset, market.fiat, BUY, rows), market),
+            self._request(adapter, adapter.build_payload(market.asset, market.fiat, SELL, rows), market),
+        )
 
         try:
-            buy_adv = buy_resp.get("result", {}).get("items", [])[0]
-            sell_adv = sell_resp.get("result", {}).get("items", [])[0]
+            buy_ad = adapter.parse_ads(buy_resp)[0]
+            sell_ad = adapter.parse_ads(sell_resp)[0]
         except Exception:
             return None
 
         return {
-            "buy": float(buy_adv.get("price", 0)),
-            "sell": float(sell_adv.get("price", 0)),
-            "volume": float(buy_adv.get("stock", 0)),
-            "url": f"https://www.bybit.com/fiat/trade/otc/detail?id={buy_adv.get('id')}",
+            "buy": buy_ad["price"],
+            "sell": sell_ad["price"],
+            "volume": buy_ad["volume"],
+            "url": adapter.ad_url(buy_ad["id"]),
+            "ad_id": buy_ad["id"],
+            "symbol": market.asset,
+            "price": buy_ad["price"],
+            "sell_price": sell_ad["price"],
+            "exchange": market.exchange,
+            "fiat": market.fiat,
         }
 
-    async def fetch_bitget_orders(
-        self,
-        asset: str = "USDT",
-        fiat: str = "UAH",
-        rows: int = 1,
-    ) -> Optional[Dict[str, float]]:
-        """
-        Return best buy/sell order info from Bitget P2P.
+    async def fetch_orders(self, markets: Optional[Sequence[Market]] = None) -> FetchResult:
+        """Gather P2P orders from all configured markets.
 
-        Bitget's public API does not currently expose an unauthenticated endpoint
-        for querying real‑time P2P advertisement prices.  Accessing the P2P
-        orderbook requires authenticated REST requests with a valid API key and
-        timestamp parameters (see the Bitget API documentation).  Without
-        credentials, this method returns ``None`` and therefore Bitget orders
-        are not considered in the arbitrage calculations.  To integrate Bitget
-        support, provide API credentials and implement the necessary request
-        signatures.
+        All markets are queried at once, subject to the concurrency and rate
+        limits.  Markets whose requests exceed the per‑exchange timeout, miss
+        the cycle deadline or raise are skipped; the reason is logged and
+        stored in the result's ``failures``.
 
         Args:
-            asset: Trading asset symbol, e.g. "USDT".
-            fiat: Fiat currency code, e.g. "UAH".
-            rows: Number of rows to fetch (not used in this stub).
+            markets: Markets to scan; defaults to ``self.markets``.
 
         Returns:
-            A dictionary with keys ``buy``, ``sell``, ``volume`` and ``url`` or
-            ``None`` if Bitget P2P data could not be retrieved.
+            The ticker dictionaries of the markets that answered in time, as
+            a ``FetchResult``.
         """
-        # NOTE: The Bitget API for P2P requires authentication.  To implement
-        # support, supply API credentials and build a signed request to
-        # /api/p2p/v1/merchant/advList or another appropriate endpoint.  See
-        # https://bitgetlimited.github.io/apidoc/en/spot/ for details.
-        return None
+        return await self._gather(markets, self.fetch_market)
+
+    async def _gather(
+        self, markets: Optional[Sequence[Market]], fetch: Callable[[Market], Awaitable[Any]]
+    ) -> FetchResult:
+        """Run ``fetch`` for every market under the cycle deadline.
 
-    async def fetch_orders(self) -> List[Dict]:
-        """Gather P2P orders from supported exchanges."""
-
-        orders: List[Dict] = []
-
-        binance = await self.fetch_binance_orders()
-        if binance:
-            orders.append({
-                **binance,
-                "symbol": "USDT",
-                "price": binance["buy"],
-                "sell_price": binance["sell"],
-            })
-
-        bybit = await self.fetch_bybit_orders()
-        if bybit:
-            orders.append({
-                **bybit,
-                "symbol": "USDT",
-                "price": bybit["buy"],
-                "sell_price": bybit["sell"],
-            })
-
-        # Fetch from Bitget (will be None until implemented)
-        bitget = await self.fetch_bitget_orders()
-        if bitget:
-            orders.append({
-                **bitget,
-                "symbol": "USDT",
-                "price": bitget["buy"],
-                "sell_price": bitget["sell"],
-            })
-
-        return orders
\ No newline at end of file
+        Failed and late markets are recorded in the result's ``failures``
+        (and ``rate_limited``); ``None`` results are dropped.
+        """
+        markets = self.markets if markets is None else markets
+        results = FetchResult()
+        if not markets:
+            return results
+
+        tasks = {
+            market: asyncio.create_task(fetch(market))
+            for market in markets
+        }
+        _, pending = await asyncio.wait(tasks.values(), timeout=self.cycle_timeout)
+        for task in pending:
+            task.cancel()
+        if pending:
+            await asyncio.gather(*pending, return_exceptions=True)
+
+        for market, task in tasks.items():
+            if task in pending:
+                results.failures[str(market)] = "deadline"
+                continue
+            exc = task.exception()
+            if isinstance(exc, asyncio.TimeoutError):
+                results.failures[str(market)] = "timeout"
+                continue
+            if exc is not None:
+                results.failures[str(market)] = repr(exc)
+                if isinstance(exc, aiohttp.ClientResponseError) and exc.status in RATE_LIMIT_STATUSES:
+                    results.rate_limited.add(market)
+                continue
+
+            result = task.result()
+            if result:
+                results.append(result)
+
+        for market, reason in results.failures.items():
+            logging.warning(f"[p2p_fetcher] {market} пропущен в этом цикле: {reason}")
+
+        return results
+
+    async def fetch_depth(
+        self, market: Market, pages: int = DEPTH_PAGES, rows: int = DEPTH_ROWS
+    ) -> Optional[OrderBook]:
+        """Return up to ``pages`` × ``rows`` adverts per side of ``market``.
+
+        All pages of both sides are requested concurrently (within the venue
+        limits); ``rows`` is capped at the adapter's ``max_rows``.
+
+        Returns:
+            An ``OrderBook`` with the adapter's taker fee, or ``None`` if the
+            market has no adverts at all.
+        """
+        adapter = get_adapter(market.exchange)
+        rows = min(rows, adapter.max_rows)
+        requests = [
+            self._request(adapter, adapter.build_payload(market.asset, market.fiat, side, rows, page), market)
+            for side in (BUY, SELL)
+            for page in range(1, pages + 1)
+        ]
+        responses = await asyncio.gather(*requests)
+
+        def levels(resps):
+            seen = set()
+            for resp in resps:
+                for ad in adapter.parse_ads(resp):
+                    # Adverts can shift between pages while we read them.
+                    if ad["id"] in seen:
+                        continue
+                    seen.add(ad["id"])
+                    yield Level(ad["price"], ad["volume"], ad["id"])
+
+        book = OrderBook(
+            market, levels(responses[:pages]), levels(responses[pages:]), adapter.taker_fee
+        )
+        if not book.asks.levels and not book.bids.levels:
+            return None
+        return book
+
+    async def fetch_books(
+        self,
+        markets: Optional[Sequence[Market]] = None,
+        pages: int = DEPTH_PAGES,
+        rows: int = DEPTH_ROWS,
+    ) -> FetchResult:
+        """Fetch multi‑page order books of all markets, for
+        ``services.spread_engine``.
+
+        Deadline and failure handling are the same as in ``fetch_orders``.
+        """
+        return await self._gather(markets, lambda m: self.fetch_depth(m, pages, rows))
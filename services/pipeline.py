@@ -0,0 +1,335 @@
+"""
+Staged aggregator pipeline for the ArbitPro bot.
+
+The aggregator used to be one ``while True`` coroutine doing fetch →
+``apply_filters`` → format → send in lockstep.  ``Pipeline`` splits it into
+independent stages connected by bounded buffers:
+
+* **fetch** – waits for markets the ``PollScheduler`` marks as due (only
+  markets some filter subscribes to, see ``services.subscriptions``) and polls
+  them (up to ``fetch_tasks`` polls in flight), records them in the
+  ``QuoteHistory`` and the shared ``QuoteCache`` and publishes them into a
+  ``QuoteBuffer``;
+* **match** – takes the latest quotes, applies the filters subscribed to
+  each quote's market, drops
+  repeated alerts and groups each chat's matches into digest batches, which
+  it puts on the bounded ``matches`` queue;
+* **send** – formats digests and hands them to the
+  ``NotificationDispatcher``, whose workers deliver them under Telegram's
+  rate limits.
+
+Backpressure: when Telegram slows down the dispatcher queue fills, senders
+block in ``NotificationDispatcher.put``, the ``matches`` queue fills and the
+matchers block.  Fetchers never block on downstream stages; the
+``QuoteBuffer`` keeps only the newest quote per market, so stale snapshots
+are coalesced instead of growing memory.  ``stats()`` reports the depth of
+every buffer.
+"""
+
+import asyncio
+import logging
+import time
+from typing import Any, Dict, List, Optional, Sequence
+
+from aiohttp import ClientSession
+
+from config import (
+    FILTERS_DB,
+    PIPELINE_FETCH_TASKS,
+    PIPELINE_MATCH_QUEUE,
+    PIPELINE_MATCHERS,
+    PIPELINE_SENDERS,
+    RECORD_FILE,
+)
+from services.dedup import AlertDeduplicator
+from services.dispatcher import NotificationDispatcher
+from services.exchanges import Market
+from services.filter_repository import get_repository
+from services.metrics import ALERTS_SUPPRESSED, CYCLE_DURATION, MATCH_DURATION, MATCHES
+from services.notifications import DigestBatcher, format_digest
+from services.p2p_fetcher import P2PFetcher
+from services.quote_cache import get_quote_cache
+from services.quote_history import QuoteHistory
+from services.recorder import ResponseRecorder
+from services.scheduler import PollScheduler
+from services.subscriptions import SubscriptionIndex
+
+
+def ticker_market(ticker: Dict[str, Any]) -> Market:
+    """Return the market a ticker was fetched from."""
+    return Market(ticker["exchange"], ticker["symbol"], ticker["fiat"])
+
+
+class QuoteBuffer:
+    """Coalescing buffer holding the newest unconsumed quote per market.
+
+    Its size is bounded by the number of markets: publishing a quote for a
+    market that still has an unconsumed one replaces (coalesces) it.
+    """
+
+    def __init__(self) -> None:
+        self._latest: Dict[Market, Dict[str, Any]] = {}
+        self._ready = asyncio.Event()
+        self._since: Optional[float] = None
+        self.published = 0
+        self.coalesced = 0
+        # Monotonic start of the oldest poll behind the last ``take``.
+        self.taken_since: Optional[float] = None
+
+    def __len__(self) -> int:
+        return len(self._latest)
+
+    def publish(self, tickers: Sequence[Dict[str, Any]], started: Optional[float] = None) -> None:
+        """Add freshly fetched tickers.
+
+        Args:
+            tickers: Tickers of one poll.
+            started: ``time.monotonic()`` when that poll started.
+        """
+        if tickers and started is not None:
+            self._since = started if self._since is None else min(self._since, started)
+        for ticker in tickers:
+            market = ticker_market(ticker)
+            if market in self._latest:
+                self.coalesced += 1
+            self._latest[market] = ticker
+            self.published += 1
+        if self._latest:
+            self._ready.set()
+
+    async def take(self, timeout: Optional[float] = None) -> List[Dict[str, Any]]:
+        """Wait for quotes and return all of them, emptying the buffer.
+
+        Returns an empty list if ``timeout`` expires first.
+        """
+        if not self._latest:
+            self._ready.clear()
+            try:
+                await asyncio.wait_for(self._ready.wait(), timeout)
+            except asyncio.TimeoutError:
+                return []
+        tickers = list(self._latest.values())
+        self._latest.clear()
+        self._ready.clear()
+        self.taken_since, self._since = self._since, None
+        return tickers
+
+
+class Pipeline:
+    """fetch → match → send stages of the aggregator.
+
+    Args:
+        session: Shared aiohttp session for exchange requests, or ``None``
+            for a tuned session owned by the pipeline (see
+            ``services.http_transport``).
+        bot: aiogram ``Bot`` used to deliver alerts.
+        filters_path: Filters database (or JSON file) to match against.
+        fetch_tasks: Maximum concurrent market polls.
+        matchers: Number of matcher tasks.
+        senders: Number of sender tasks.
+        match_queue_size: Capacity of the queue between match and send.
+    """
+
+    def __init__(
+        self,
+        session: Optional[ClientSession],
+        bot,
+        filters_path: str = FILTERS_DB,
+        fetch_tasks: int = PIPELINE_FETCH_TASKS,
+        matchers: int = PIPELINE_MATCHERS,
+        senders: int = PIPELINE_SENDERS,
+        match_queue_size: int = PIPELINE_MATCH_QUEUE,
+    ) -> None:
+        self.filters_path = filters_path
+        self.recorder = ResponseRecorder(RECORD_FILE) if RECORD_FILE else None
+        self.fetcher = P2PFetcher(session, recorder=self.recorder)
+        self.repository = get_repository(filters_path)
+        self.subscriptions = SubscriptionIndex(self.fetcher.markets)
+        self.scheduler = PollScheduler([])
+        self.dispatcher = NotificationDispatcher(bot)
+        self.dedup = AlertDeduplicator()
+        self.digest = DigestBatcher()
+        self.quotes = QuoteBuffer()
+        self.history = QuoteHistory()
+        self.cache = get_quote_cache()
+        self.cache.attach(self.fetcher)
+        self.matches: asyncio.Queue = asyncio.Queue(maxsize=match_queue_size)
+        self.fetch_tasks = fetch_tasks
+        self.matchers = matchers
+        self.senders = senders
+        self._fetch_slots = asyncio.Semaphore(fetch_tasks)
+        self._in_flight: set = set()
+        self._producers: List[asyncio.Task] = []
+        self._senders: List[asyncio.Task] = []
+        self._filters_version: Optional[int] = None
+        self.last_match_duration = 0.0
+
+    # -- lifecycle ---------------------------------------------------------
+
+    async def run(self) -> None:
+        """Run all stages until cancelled, then drain pending sends."""
+        logging.info("🟢 Агрегатор запущен")
+        self.dispatcher.start()
+        self._producers = [asyncio.create_task(self._fetch_stage(), name="pipeline-fetch")]
+        self._producers += [
+            asyncio.create_task(self._match_stage(), name=f"pipeline-match-{i}")
+            for i in range(self.matchers)
+        ]
+        self._senders = [
+            asyncio.create_task(self._send_stage(), name=f"pipeline-send-{i}")
+            for i in range(self.senders)
+        ]
+        try:
+            # ``wait`` (unlike ``gather``) leaves the stages running when this
+            # coroutine is cancelled, so ``stop`` can still drain the senders.
+            done, _ = await asyncio.wait(
+                self._producers + self._senders, return_when=asyncio.FIRST_EXCEPTION
+            )
+            for task in done:
+                if not task.cancelled() and task.exception() is not None:
+                    logging.error(f"💥 Стадия {task.get_name()} упала", exc_info=task.exception())
+        finally:
+            await self.stop()
+
+    async def stop(self, timeout: float = 10.0) -> None:
+        """Stop fetching and matching, deliver what is already matched, then
+        stop sending (waiting at most ``timeout`` seconds in total)."""
+        deadline = time.monotonic() + timeout
+        producers = self._producers + list(self._in_flight)
+        for task in producers:
+            task.cancel()
+        await asyncio.gather(*producers, return_exceptions=True)
+        self._producers = []
+
+        # Batches still waiting for their digest window go out now.
+        for batch in self.digest.pop_all():
+            if self.matches.full():
+                break
+            self.matches.put_nowait(batch)
+        try:
+            await asyncio.wait_for(self.matches.join(), max(0.0, deadline - time.monotonic()))
+        except asyncio.TimeoutError:
+            logging.warning(f"[pipeline] Остановка с {self.matches.qsize()} неотправленными дайджестами")
+        for task in self._senders:
+            task.cancel()
+        await asyncio.gather(*self._senders, return_exceptions=True)
+        self._senders = []
+        await self.dispatcher.close(max(0.0, deadline - time.monotonic()))
+        if self.cache.fetcher is self.fetcher:
+            self.cache.attach(None)
+        await self.fetcher.close()
+        if self.recorder is not None:
+            self.recorder.close()
+
+    # -- stages ------------------------------------------------------------
+
+    async def _fetch_stage(self) -> None:
+        while True:
+            await self._refresh_filters()
+            markets = await self.scheduler.wait_due()
+            if not markets:
+                # Nothing is scheduled: look for new subscriptions again.
+                continue
+            self.scheduler.claim(markets)
+            await self._fetch_slots.acquire()
+            task = asyncio.create_task(self._poll(markets))
+            self._in_flight.add(task)
+            task.add_done_callback(self._in_flight.discard)
+
+    async def _poll(self, markets: List[Market]) -> None:
+        started = time.monotonic()
+        try:
+            tickers = await self.fetcher.fetch_orders(markets)
+        except Exception as e:
+            logging.error("💥 Ошибка при получении данных P2P", exc_info=e)
+            for market in markets:
+                self.scheduler.record_error(market)
+            return
+        finally:
+            self._fetch_slots.release()
+
+        by_market = {ticker_market(t): t for t in tickers}
+        for market in markets:
+            if str(market) in tickers.failures:
+                self.scheduler.record_error(market, rate_limited=market in tickers.rate_limited)
+            else:
+                self.scheduler.record_success(market, by_market.get(market))
+        self.history.record(tickers)
+        self.cache.update(tickers)
+        self.quotes.publish(tickers, started)
+
+    async def _refresh_filters(self) -> None:
+        """Follow filter changes: update the subscriptions, the polled
+        markets and the scheduler's thresholds."""
+        snapshot = await self.repository.asnapshot()
+        if snapshot.version != self._filters_version:
+            self._filters_version = snapshot.version
+            if self.subscriptions.update(snapshot):
+                self.scheduler.set_markets(self.subscriptions.markets)
+            self.scheduler.wake()
+            compiled = snapshot.compiled.values()
+            self.scheduler.set_thresholds(
+                (f.buy_max for f in compiled), (f.sell_min for f in compiled)
+            )
+
+    async def _match_stage(self) -> None:
+        window = self.digest.window
+        while True:
+            tickers = await self.quotes.take(timeout=window if window > 0 else None)
+            if tickers:
+                start = time.perf_counter()
+                await self._refresh_filters()
+                orders = self.subscriptions.apply(tickers)
+                MATCH_DURATION.observe(time.perf_counter() - start)
+                MATCHES.inc(amount=len(orders))
+                self.dedup.maybe_purge()
+                suppressed = 0
+                for order in orders:
+                    if self.dedup.should_notify(order):
+                        self.digest.add(order)
+                    else:
+                        suppressed += 1
+                ALERTS_SUPPRESSED.inc(amount=suppressed)
+                self.last_match_duration = time.perf_counter() - start
+                logging.info(
+                    f"🟢 Сопоставлено {len(tickers)} котировок, совпадений: {len(orders)}, "
+                    f"повторов подавлено: {self.dedup.hits}"
+                )
+            for batch in self.digest.pop_ready():
+                await self.matches.put(batch)
+            if tickers and self.quotes.taken_since is not None:
+                CYCLE_DURATION.observe(time.monotonic() - self.quotes.taken_since)
+
+    async def _send_stage(self) -> None:
+        while True:
+            chat_id, orders = await self.matches.get()
+            try:
+                for text in format_digest(orders):
+                    await self.dispatcher.put(chat_id, text, parse_mode="HTML")
+            except Exception as e:
+                logging.error(f"❌ Не удалось подготовить уведомление для {chat_id}", exc_info=e)
+            finally:
+                self.matches.task_done()
+
+    # -- telemetry ---------------------------------------------------------
+
+    def stats(self) -> Dict[str, Any]:
+        """Return per‑stage queue depths and counters."""
+        return {
+            "fetch_in_flight": len(self._in_flight),
+            "quotes_pending": len(self.quotes),
+            "quotes_published": self.quotes.published,
+            "quotes_coalesced": self.quotes.coalesced,
+            "history_markets": len(self.history),
+            "history_bytes": self.history.nbytes,
+            "quote_cache": self.cache.stats(),
+            "subscriptions": self.subscriptions.stats(),
+            "digest_pending": len(self.digest),
+            "matches_queue": self.matches.qsize(),
+            "match_duration": self.last_match_duration,
+            "dedup": self.dedup.stats(),
+            "dispatcher": self.dispatcher.stats(),
+            "http": self.fetcher.transport.stats(),
+            "venues": self.fetcher.venue_stats(),
+            "rate_limits": self.fetcher.rate_limit_stats(),
+        }
@@ -0,0 +1,166 @@
+"""
+Shared in‑process cache of the latest quote per market.
+
+The aggregator's fetch stage writes every poll into the cache, so the
+on‑demand "arbitrage deals" screen can be answered from memory instead of
+querying the exchanges for every button press.
+
+Reads follow stale‑while‑revalidate: a quote older than ``QUOTE_CACHE_TTL``
+is still returned immediately, and a refresh of its market is started in
+the background.  Refreshes are single‑flight: a market has at most one
+refresh in flight, and every reader that needs it joins that request
+instead of starting another one.  Only a market that has never been quoted
+makes the reader wait (at most ``QUOTE_CACHE_WAIT`` seconds) for the shared
+request.  A market is refreshed at most once per ``QUOTE_CACHE_TTL``, even
+when the refresh fails, so readers add at most one request per market and
+period to the exchange load.  Refreshes go through the pipeline's
+``P2PFetcher`` and are therefore subject to the same per‑venue concurrency
+and rate limits as the regular polls; without an attached fetcher (aggregator not running) the
+cache only serves what it has.
+"""
+
+import asyncio
+import logging
+import time
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
+
+from config import QUOTE_CACHE_TTL, QUOTE_CACHE_WAIT
+from services.exchanges import Market
+from services.metrics import QUOTE_CACHE_READS, QUOTE_CACHE_REFRESHES
+
+
+def _market(ticker: Dict[str, Any]) -> Market:
+    return Market(ticker["exchange"], ticker["symbol"], ticker["fiat"])
+
+
+class QuoteCache:
+    """Latest ticker per market with background, single‑flight refreshes.
+
+    Args:
+        ttl: Age in seconds after which a quote is stale and refreshed.
+        wait: Longest time a reader waits for a market with no quote yet.
+    """
+
+    def __init__(self, ttl: float = QUOTE_CACHE_TTL, wait: float = QUOTE_CACHE_WAIT) -> None:
+        self.ttl = ttl
+        self.wait = wait
+        self.fetcher = None
+        self._quotes: Dict[Market, Tuple[float, Dict[str, Any]]] = {}
+        self._in_flight: Dict[Market, asyncio.Task] = {}
+        self._attempted: Dict[Market, float] = {}
+
+    def __len__(self) -> int:
+        return len(self._quotes)
+
+    def attach(self, fetcher) -> None:
+        """Use ``fetcher`` (a ``P2PFetcher`` or ``None``) for refreshes."""
+        self.fetcher = fetcher
+
+    @property
+    def markets(self) -> List[Market]:
+        """Markets polled by the attached fetcher, else the cached ones."""
+        if self.fetcher is not None:
+            return list(self.fetcher.markets)
+        return list(self._quotes)
+
+    def update(self, tickers: Iterable[Dict[str, Any]], now: Optional[float] = None) -> None:
+        """Store freshly fetched tickers."""
+        now = time.monotonic() if now is None else now
+        for ticker in tickers:
+            self._quotes[_market(ticker)] = (now, ticker)
+
+    def age(self, markets: Optional[Sequence[Market]] = None) -> Optional[float]:
+        """Age in seconds of the oldest cached quote of ``markets``, or
+        ``None`` if none of them is cached."""
+        now = time.monotonic()
+        stamps = [
+            self._quotes[m][0] for m in (self.markets if markets is None else markets)
+            if m in self._quotes
+        ]
+        return now - min(stamps) if stamps else None
+
+    async def get(self, markets: Optional[Sequence[Market]] = None) -> List[Dict[str, Any]]:
+        """Return the cached tickers of ``markets`` (default: ``self.markets``).
+
+        Stale markets are refreshed in the background; markets without any
+        quote are waited for, sharing one request per market.
+        """
+        markets = self.markets if markets is None else markets
+        now = time.monotonic()
+        tickers: List[Dict[str, Any]] = []
+        stale: List[Market] = []
+        missing: List[Market] = []
+        for market in markets:
+            entry = self._quotes.get(market)
+            if entry is None:
+                missing.append(market)
+                continue
+            tickers.append(entry[1])
+            if now - entry[0] > self.ttl:
+                stale.append(market)
+        QUOTE_CACHE_READS.inc("fresh", amount=len(tickers) - len(stale))
+        QUOTE_CACHE_READS.inc("stale", amount=len(stale))
+        QUOTE_CACHE_READS.inc("miss", amount=len(missing))
+
+        if stale:
+            self.refresh(stale)
+        if missing:
+            tasks = self.refresh(missing)
+            if tasks:
+                await asyncio.wait(tasks, timeout=self.wait)
+            tickers.extend(self._quotes[m][1] for m in missing if m in self._quotes)
+        return tickers
+
+    def refresh(self, markets: Sequence[Market]) -> List[asyncio.Task]:
+        """Start (or join) refreshes of ``markets``.
+
+        Markets already being refreshed reuse their request; markets whose
+        last refresh started less than ``ttl`` seconds ago are skipped; the
+        others are fetched together in one new task.
+
+        Returns:
+            The tasks covering ``markets`` (empty without a fetcher).
+        """
+        if self.fetcher is None:
+            return []
+        now = time.monotonic()
+        new = [
+            m for m in markets
+            if m not in self._in_flight and now - self._attempted.get(m, -self.ttl) >= self.ttl
+        ]
+        if new:
+            for market in new:
+                self._attempted[market] = now
+            task = asyncio.create_task(self._fetch(new), name="quote-cache-refresh")
+            for market in new:
+                self._in_flight[market] = task
+        return list({self._in_flight[m] for m in markets if m in self._in_flight})
+
+    async def _fetch(self, markets: List[Market]) -> None:
+        QUOTE_CACHE_REFRESHES.inc(amount=len(markets))
+        try:
+            self.update(await self.fetcher.fetch_orders(markets))
+        except Exception as e:
+            logging.warning(f"[quote_cache] Не удалось обновить котировки: {e!r}")
+        finally:
+            for market in markets:
+                self._in_flight.pop(market, None)
+
+    def stats(self) -> Dict[str, Any]:
+        """Return the number of cached markets and refreshes in flight."""
+        return {
+            "markets": len(self._quotes),
+            "refreshing": len(self._in_flight),
+            "oldest_age": self.age(list(self._quotes)),
+        }
+
+
+_cache: Optional[QuoteCache] = None
+
+
+def get_quote_cache() -> QuoteCache:
+    """Return the process‑wide quote cache."""
+    global _cache
+    if _cache is None:
+        _cache = QuoteCache()
+    return _cache
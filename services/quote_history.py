@@ -0,0 +1,190 @@
+"""
+In‑memory quote history for the ArbitPro aggregator.
+
+Every polled ticker is appended to a per‑market ring buffer of
+(timestamp, buy, sell, volume) samples.  The samples live in four
+preallocated ``array('d')`` columns, 32 bytes per sample, instead of a list
+of ticker dicts, so each market has a fixed memory budget of
+``HISTORY_SIZE`` samples and appending is O(1) (the oldest sample is
+overwritten once the buffer is full).
+
+Timestamps are appended in increasing order, which makes the start of a
+time window a binary search; ``MarketHistory.spread_stats`` then scans only
+the samples inside the window.  This answers questions such as "how has the
+spread moved in the last hour?" without a database.
+"""
+
+import operator
+import time
+from array import array
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
+
+from config import HISTORY_SIZE
+from services.exchanges import Market
+
+
+class MarketHistory:
+    """Fixed‑capacity ring buffer of one market's quotes.
+
+    Args:
+        capacity: Maximum number of samples kept.
+    """
+
+    __slots__ = ("capacity", "ts", "buy", "sell", "volume", "_start", "_count")
+
+    def __init__(self, capacity: int = HISTORY_SIZE) -> None:
+        if capacity <= 0:
+            raise ValueError("capacity must be positive")
+        self.capacity = capacity
+        zeros = bytes(8 * capacity)
+        self.ts = array("d", zeros)
+        self.buy = array("d", zeros)
+        self.sell = array("d", zeros)
+        self.volume = array("d", zeros)
+        self._start = 0
+        self._count = 0
+
+    def __len__(self) -> int:
+        return self._count
+
+    @property
+    def nbytes(self) -> int:
+        """Memory used by the sample columns."""
+        return 4 * self.ts.itemsize * self.capacity
+
+    def _pos(self, i: int) -> int:
+        return (self._start + i) % self.capacity
+
+    def append(self, ts: float, buy: float, sell: float, volume: float) -> None:
+        """Add a sample, overwriting the oldest one when full.
+
+        Samples older than the newest one are ignored so the timestamps stay
+        sorted.
+        """
+        if self._count and ts < self.ts[self._pos(self._count - 1)]:
+            return
+        if self._count < self.capacity:
+            pos = self._pos(self._count)
+            self._count += 1
+        else:
+            pos = self._start
+            self._start = (self._start + 1) % self.capacity
+        self.ts[pos] = ts
+        self.buy[pos] = buy
+        self.sell[pos] = sell
+        self.volume[pos] = volume
+
+    def last(self) -> Optional[Tuple[float, float, float, float]]:
+        """Return the newest ``(ts, buy, sell, volume)`` sample."""
+        if not self._count:
+            return None
+        pos = self._pos(self._count - 1)
+        return self.ts[pos], self.buy[pos], self.sell[pos], self.volume[pos]
+
+    def _first_at(self, since: float) -> int:
+        """Logical index of the first sample with ``ts >= since``."""
+        lo, hi = 0, self._count
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if self.ts[self._pos(mid)] < since:
+                lo = mid + 1
+            else:
+                hi = mid
+        return lo
+
+    def _positions(self, since: float) -> Iterator[int]:
+        for i in range(self._first_at(since), self._count):
+            yield self._pos(i)
+
+    def _segments(self, since: float) -> List[slice]:
+        """Physical slices (at most two) covering samples from ``since``."""
+        first = self._first_at(since)
+        if first >= self._count:
+            return []
+        begin = self._pos(first)
+        end = self._pos(self._count - 1) + 1
+        if begin < end:
+            return [slice(begin, end)]
+        return [slice(begin, self.capacity), slice(0, end)]
+
+    def samples(self, since: float = float("-inf")) -> List[Tuple[float, float, float, float]]:
+        """Return ``(ts, buy, sell, volume)`` samples from ``since`` on, oldest
+        first."""
+        return [(self.ts[p], self.buy[p], self.sell[p], self.volume[p]) for p in self._positions(since)]
+
+    def spread_stats(self, seconds: float, now: Optional[float] = None) -> Optional[Dict[str, float]]:
+        """Summarise the sell − buy spread over the last ``seconds``.
+
+        Returns:
+            A dict with ``count``, ``min``, ``max``, ``mean``, ``first``,
+            ``last`` and ``change`` (last − first) of the spread, or ``None``
+            if there are no samples in the window.
+        """
+        now = time.time() if now is None else now
+        spreads: List[float] = []
+        for part in self._segments(now - seconds):
+            spreads.extend(map(operator.sub, self.sell[part], self.buy[part]))
+        if not spreads:
+            return None
+        return {
+            "count": len(spreads),
+            "min": min(spreads),
+            "max": max(spreads),
+            "mean": sum(spreads) / len(spreads),
+            "first": spreads[0],
+            "last": spreads[-1],
+            "change": spreads[-1] - spreads[0],
+        }
+
+
+class QuoteHistory:
+    """Per‑market ``MarketHistory`` buffers, created on first quote.
+
+    Args:
+        capacity: Samples kept per market.
+    """
+
+    def __init__(self, capacity: int = HISTORY_SIZE) -> None:
+        self.capacity = capacity
+        self._markets: Dict[Market, MarketHistory] = {}
+
+    def __len__(self) -> int:
+        return len(self._markets)
+
+    def __contains__(self, market: Market) -> bool:
+        return market in self._markets
+
+    @property
+    def markets(self) -> List[Market]:
+        return list(self._markets)
+
+    @property
+    def nbytes(self) -> int:
+        return sum(h.nbytes for h in self._markets.values())
+
+    def get(self, market: Market) -> Optional[MarketHistory]:
+        return self._markets.get(market)
+
+    def record(self, tickers: Iterable[Dict[str, Any]], now: Optional[float] = None) -> None:
+        """Append one sample per ticker (as returned by ``fetch_orders``)."""
+        now = time.time() if now is None else now
+        for t in tickers:
+            try:
+                market = Market(t["exchange"], t["symbol"], t["fiat"])
+                buy = float(t.get("price", t.get("buy")))
+                sell = float(t.get("sell_price", t.get("sell")))
+                volume = float(t.get("volume", 0))
+            except (KeyError, TypeError, ValueError):
+                continue
+            history = self._markets.get(market)
+            if history is None:
+                history = self._markets[market] = MarketHistory(self.capacity)
+            history.append(now, buy, sell, volume)
+
+    def spread_stats(
+        self, market: Market, seconds: float, now: Optional[float] = None
+    ) -> Optional[Dict[str, float]]:
+        """``MarketHistory.spread_stats`` for ``market`` (``None`` if the
+        market has no history)."""
+        history = self._markets.get(market)
+        return history.spread_stats(seconds, now) if history is not None else None
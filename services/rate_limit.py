@@ -0,0 +1,288 @@
+"""
+Token bucket rate limiting for the ArbitPro bot.
+
+``TokenBucket`` refills continuously at ``rate`` tokens per second up to
+``capacity``.  ``try_acquire`` never waits and instead reports how long the
+caller would have to wait, which lets queue workers reschedule work rather
+than sit idle; ``acquire`` waits until a token is available.
+
+``AdaptiveLimiter`` puts a token bucket in front of an exchange endpoint or
+host.  Waiting requests are queued per flow (one flow per market) and
+served round‑robin, so a market requesting many pages cannot starve the
+others.  The rate adapts AIMD‑style: every HTTP 429/418 answer halves it and
+pauses the limiter (for ``Retry-After`` if given), every success raises it
+by a small step back towards the configured maximum, and
+``X-RateLimit-Remaining``/``X-RateLimit-Reset`` style headers cap it to the
+quota that is left.  ``RateLimitManager`` keeps one limiter per endpoint and
+one per host, configured from the exchange adapters.
+"""
+
+import asyncio
+import logging
+import time
+from collections import OrderedDict, deque
+from typing import Any, Deque, Dict, Hashable, List, Mapping, Optional
+from urllib.parse import urlsplit
+
+from services.metrics import RATE_LIMIT_RATE, RATE_LIMIT_THROTTLED, RATE_LIMIT_WAIT
+
+# HTTP statuses meaning "slow down" (418 is Binance's IP ban).
+RATE_LIMIT_STATUSES = (418, 429)
+
+# Pause after a rate‑limit answer without a ``Retry-After`` header.
+DEFAULT_PAUSE = {429: 1.0, 418: 60.0}
+
+# Rate multiplier applied on a rate‑limit answer.
+DECREASE_FACTOR = 0.5
+
+# Rate increase after each success, as a fraction of the configured rate.
+INCREASE_STEP = 0.01
+
+# The rate never adapts below this fraction of the configured rate.
+MIN_RATE_FRACTION = 0.05
+
+
+class TokenBucket:
+    """A continuously refilling token bucket.
+
+    Args:
+        rate: Tokens added per second.
+        capacity: Maximum number of stored tokens (burst size); defaults to
+            ``max(rate, 1)``.
+    """
+
+    __slots__ = ("rate", "capacity", "tokens", "updated")
+
+    def __init__(self, rate: float, capacity: Optional[float] = None) -> None:
+        self.rate = rate
+        self.capacity = capacity if capacity is not None else max(rate, 1.0)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+
+    def _refill(self, now: float) -> None:
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def try_acquire(self, tokens: float = 1.0) -> float:
+        """Take ``tokens`` if available.
+
+        Returns:
+            ``0.0`` if the tokens were taken, otherwise the number of seconds
+            until they will be available (nothing is taken in that case).
+        """
+        self._refill(time.monotonic())
+        if self.tokens >= tokens:
+            self.tokens -= tokens
+            return 0.0
+        if self.rate <= 0:
+            return float("inf")
+        return (tokens - self.tokens) / self.rate
+
+    async def acquire(self, tokens: float = 1.0) -> None:
+        """Wait until ``tokens`` are available and take them."""
+        while True:
+            wait = self.try_acquire(tokens)
+            if not wait:
+                return
+            await asyncio.sleep(wait)
+
+    def is_full(self) -> bool:
+        """Return ``True`` if the bucket has refilled completely (idle)."""
+        self._refill(time.monotonic())
+        return self.tokens >= self.capacity
+
+
+def _header_float(headers: Optional[Mapping[str, str]], name: str) -> Optional[float]:
+    if not headers or not name:
+        return None
+    value = headers.get(name)
+    if value is None:
+        return None
+    try:
+        return float(value)
+    except ValueError:
+        return None
+
+
+class AdaptiveLimiter:
+    """Token bucket with fair per‑flow queueing and AIMD rate adaptation.
+
+    Args:
+        name: Label used in logs and metrics.
+        rate: Configured (maximum) requests per second.
+        capacity: Burst size; defaults to ``max(rate, 1)``.
+    """
+
+    def __init__(self, name: str, rate: float, capacity: Optional[float] = None) -> None:
+        self.name = name
+        self.max_rate = rate
+        self.min_rate = rate * MIN_RATE_FRACTION
+        self.bucket = TokenBucket(rate, capacity)
+        self.paused_until = 0.0
+        self.throttled = 0
+        self._flows: "OrderedDict[Hashable, Deque[asyncio.Future]]" = OrderedDict()
+        self._pump: Optional[asyncio.Task] = None
+        RATE_LIMIT_RATE.set(rate, name)
+
+    @property
+    def rate(self) -> float:
+        return self.bucket.rate
+
+    @property
+    def waiting(self) -> int:
+        return sum(len(q) for q in self._flows.values())
+
+    def _set_rate(self, rate: float) -> None:
+        self.bucket.rate = rate
+        RATE_LIMIT_RATE.set(rate, self.name)
+
+    def _delay(self) -> float:
+        """Take a token and return ``0.0``, or return the wait for one."""
+        pause = self.paused_until - time.monotonic()
+        if pause > 0:
+            return pause
+        return self.bucket.try_acquire()
+
+    def _refund(self) -> None:
+        self.bucket.tokens = min(self.bucket.capacity, self.bucket.tokens + 1)
+
+    def try_acquire(self) -> bool:
+        """Take a token without waiting; ``False`` if nobody is queued
+        ahead and a token is not available right now."""
+        return not self._flows and not self._delay()
+
+    async def acquire(self, flow: Hashable = None) -> None:
+        """Wait for a token, queued fairly against the other flows."""
+        if self.try_acquire():
+            return
+        start = time.monotonic()
+        future = asyncio.get_running_loop().create_future()
+        self._flows.setdefault(flow, deque()).append(future)
+        if self._pump is None:
+            self._pump = asyncio.create_task(self._serve(), name=f"rate-limit-{self.name}")
+        await future
+        RATE_LIMIT_WAIT.observe(time.monotonic() - start, self.name)
+
+    async def _serve(self) -> None:
+        try:
+            while self._flows:
+                wait = self._delay()
+                if wait:
+                    await asyncio.sleep(wait)
+                    continue
+                flow, queue = next(iter(self._flows.items()))
+                future = queue.popleft()
+                if queue:
+                    self._flows.move_to_end(flow)
+                else:
+                    del self._flows[flow]
+                if future.done():
+                    # The waiter was cancelled; give the token back.
+                    self._refund()
+                    continue
+                future.set_result(None)
+        finally:
+            self._pump = None
+
+    def on_success(self) -> None:
+        """Probe upwards after a successful request."""
+        if self.rate < self.max_rate:
+            self._set_rate(min(self.max_rate, self.rate + self.max_rate * INCREASE_STEP))
+
+    def on_throttled(self, status: int, retry_after: Optional[float] = None) -> None:
+        """Back off after a rate‑limit answer."""
+        self.throttled += 1
+        RATE_LIMIT_THROTTLED.inc(self.name, str(status))
+        self._set_rate(max(self.min_rate, self.rate * DECREASE_FACTOR))
+        pause = retry_after if retry_after is not None else DEFAULT_PAUSE.get(status, 1.0)
+        self.paused_until = max(self.paused_until, time.monotonic() + pause)
+        self.bucket.tokens = 0.0
+        logging.warning(
+            f"[rate_limit] {self.name}: HTTP {status}, пауза {pause:.1f} с, "
+            f"лимит {self.rate:.2f} запр/с"
+        )
+
+    def on_quota(self, remaining: float, reset: float) -> None:
+        """Fit the rate to ``remaining`` requests over ``reset`` seconds."""
+        if reset <= 0:
+            return
+        if remaining <= 0:
+            self.paused_until = max(self.paused_until, time.monotonic() + reset)
+            self.bucket.tokens = 0.0
+        elif remaining / reset < self.rate:
+            self._set_rate(max(self.min_rate, remaining / reset))
+
+    def stats(self) -> Dict[str, float]:
+        return {
+            "rate": self.rate,
+            "max_rate": self.max_rate,
+            "waiting": self.waiting,
+            "throttled": self.throttled,
+            "paused": max(0.0, self.paused_until - time.monotonic()),
+        }
+
+
+class RateLimitManager:
+    """Limiters per exchange endpoint and per host.
+
+    The endpoint limiter runs at the adapter's ``requests_per_second``; the
+    host limiter, shared by all endpoints (and adapters) on the host, at its
+    ``host_requests_per_second`` if that is set.
+    """
+
+    def __init__(self) -> None:
+        self._limiters: Dict[str, AdaptiveLimiter] = {}
+
+    def limiters(self, adapter: Any, url: str) -> List[AdaptiveLimiter]:
+        """Return the endpoint limiter and, if configured, the host limiter."""
+        parts = urlsplit(url)
+        host = parts.hostname or url
+        endpoint = f"{host}{parts.path}"
+        found: List[AdaptiveLimiter] = []
+        for key, rate in ((endpoint, adapter.requests_per_second),
+                          (host, adapter.host_requests_per_second)):
+            if rate <= 0:
+                continue
+            limiter = self._limiters.get(key)
+            if limiter is None:
+                limiter = self._limiters[key] = AdaptiveLimiter(key, rate, adapter.rate_burst or None)
+            if limiter not in found:
+                found.append(limiter)
+        return found
+
+    async def acquire(self, adapter: Any, url: str, flow: Hashable = None) -> None:
+        """Wait for a token of every limiter of ``url``."""
+        for limiter in self.limiters(adapter, url):
+            await limiter.acquire(flow)
+
+    def try_acquire(self, adapter: Any, url: str) -> bool:
+        """Take tokens of every limiter of ``url`` only if all are free."""
+        limiters = self.limiters(adapter, url)
+        taken = []
+        for limiter in limiters:
+            if not limiter.try_acquire():
+                for other in taken:
+                    other._refund()
+                return False
+            taken.append(limiter)
+        return True
+
+    def on_response(self, adapter: Any, url: str, headers: Optional[Mapping[str, str]]) -> None:
+        """Adapt to a successful answer and its quota headers."""
+        remaining, reset = (_header_float(headers, name) for name in adapter.rate_limit_headers)
+        for limiter in self.limiters(adapter, url):
+            limiter.on_success()
+            if remaining is not None and reset is not None:
+                # Some venues send an epoch timestamp instead of seconds.
+                limiter.on_quota(remaining, reset - time.time() if reset > 1e9 else reset)
+
+    def on_throttled(
+        self, adapter: Any, url: str, status: int, headers: Optional[Mapping[str, str]]
+    ) -> None:
+        """Back off after a 429/418 answer."""
+        retry_after = _header_float(headers, "Retry-After")
+        for limiter in self.limiters(adapter, url):
+            limiter.on_throttled(status, retry_after)
+
+    def stats(self) -> Dict[str, Dict[str, float]]:
+        return {key: limiter.stats() for key, limiter in self._limiters.items()}
@@ -0,0 +1,234 @@
+"""
+Recording and offline replay of raw exchange responses.
+
+Capture: with ``RECORD_FILE`` set, ``P2PFetcher`` hands every decoded
+exchange response to a ``ResponseRecorder``, which appends it with its URL,
+request body and a timestamp as one JSON line to a gzip file.  The file is
+append‑only; each run adds a new gzip member, and lines are sync‑flushed
+in batches so a crash loses at most the last few responses.
+
+Replay: ``ReplayFetcher`` is a ``P2PFetcher`` whose ``_post_json`` answers
+from such a log instead of the network: a request gets the next recorded
+response with the same URL and body.  ``replay`` drives it through
+``fetch_orders`` → subscription matching → de‑duplication → digest formatting
+→ a ``NullBot``, either as fast as possible or at the recorded pace, and
+returns throughput and per‑stage timings.  No exchange or Telegram access
+is needed, so the same log can benchmark the matching path, reproduce an
+incident or backtest other filter settings (``scripts/replay.py``).
+"""
+
+import asyncio
+import gzip
+import json
+import logging
+import time
+import zlib
+from collections import defaultdict, deque
+from typing import Any, Deque, Dict, Iterator, List, Optional, Sequence, Tuple
+
+from config import FILTERS_DB
+from services.dedup import AlertDeduplicator
+from services.exchanges import Market
+from services.filter_repository import get_repository
+from services.http_transport import json_dumps, json_loads
+from services.notifications import format_digest
+from services.p2p_fetcher import P2PFetcher
+from services.subscriptions import SubscriptionIndex
+
+# Sync‑flush the log after this many records.
+FLUSH_EVERY = 50
+
+
+class ResponseRecorder:
+    """Append‑only gzip JSON‑lines log of exchange responses.
+
+    Each line is ``{"t": unix time, "url": ..., "payload": ..., "response":
+    ...}``.
+
+    Args:
+        path: Log file; created if missing, appended to otherwise.
+        flush_every: Number of records between sync flushes.
+    """
+
+    def __init__(self, path: str, flush_every: int = FLUSH_EVERY) -> None:
+        self.path = path
+        self.flush_every = flush_every
+        self.records = 0
+        self._file = gzip.open(path, "ab")
+
+    def record(
+        self, url: str, payload: Dict[str, Any], response: Any, ts: Optional[float] = None
+    ) -> None:
+        """Append one response."""
+        line = json_dumps({
+            "t": time.time() if ts is None else ts,
+            "url": url,
+            "payload": payload,
+            "response": response,
+        })
+        self._file.write(line.encode() + b"\n")
+        self.records += 1
+        if self.records % self.flush_every == 0:
+            self.flush()
+
+    def flush(self) -> None:
+        """Make everything recorded so far readable by ``read_records``."""
+        self._file.flush(zlib.Z_SYNC_FLUSH)
+
+    def close(self) -> None:
+        if not self._file.closed:
+            self._file.close()
+            logging.info(f"[recorder] Записано ответов бирж: {self.records} → {self.path}")
+
+
+def read_records(path: str) -> Iterator[Dict[str, Any]]:
+    """Yield the records of a log in order.
+
+    A log cut off by a crash is read up to its last complete line.
+    """
+    with gzip.open(path, "rb") as f:
+        try:
+            for line in f:
+                try:
+                    yield json_loads(line)
+                except ValueError:
+                    logging.warning(f"[recorder] Повреждённая запись в {path} пропущена")
+        except (EOFError, zlib.error):
+            logging.warning(f"[recorder] Журнал {path} обрывается, остаток пропущен")
+
+
+def _request_key(url: str, payload: Dict[str, Any]) -> Tuple[str, str]:
+    return url, json.dumps(payload, sort_keys=True)
+
+
+class ReplayExhausted(Exception):
+    """No recorded response is left for a request."""
+
+
+class ReplayFetcher(P2PFetcher):
+    """``P2PFetcher`` serving recorded responses instead of HTTP.
+
+    Args:
+        records: Records as yielded by ``read_records``.
+        markets: Markets to request; they must match the recording.
+        speed: ``0`` replays as fast as possible; otherwise responses are
+            released at ``speed`` times the recorded pace.
+    """
+
+    def __init__(
+        self,
+        records: Sequence[Dict[str, Any]],
+        markets: Optional[Sequence[Market]] = None,
+        speed: float = 0.0,
+        **kwargs: Any,
+    ) -> None:
+        super().__init__(session=None, markets=markets, **kwargs)
+        self.speed = speed
+        self._responses: Dict[Tuple[str, str], Deque[Tuple[float, Any]]] = defaultdict(deque)
+        for rec in records:
+            self._responses[_request_key(rec["url"], rec["payload"])].append((rec["t"], rec["response"]))
+        self.remaining = sum(len(q) for q in self._responses.values())
+        self.served = 0
+        self._first_ts = min((q[0][0] for q in self._responses.values() if q), default=0.0)
+        self._started: Optional[float] = None
+        # Recorded time of the last served response.
+        self.clock = self._first_ts
+
+    @property
+    def exhausted(self) -> bool:
+        return self.remaining == 0
+
+    async def _request(self, adapter, payload: Dict, flow=None) -> Dict:
+        # No venue rate limits or timeouts: the "venue" is a file.
+        return await self._post_json(adapter.url, payload)
+
+    async def _post_json(self, url: str, payload: Dict, on_headers=None) -> Dict:
+        queue = self._responses.get(_request_key(url, payload))
+        if not queue:
+            raise ReplayExhausted(url)
+        ts, response = queue.popleft()
+        self.remaining -= 1
+        self.served += 1
+        if self.speed > 0:
+            now = time.monotonic()
+            if self._started is None:
+                self._started = now
+            delay = self._started + (ts - self._first_ts) / self.speed - now
+            if delay > 0:
+                await asyncio.sleep(delay)
+        self.clock = max(self.clock, ts)
+        return response
+
+
+class NullBot:
+    """Stand‑in for ``aiogram.Bot`` that only counts messages."""
+
+    def __init__(self) -> None:
+        self.sent = 0
+        self.chars = 0
+
+    async def send_message(self, chat_id: Any, text: str, **kwargs: Any) -> None:
+        self.sent += 1
+        self.chars += len(text)
+
+
+async def replay(
+    records: Sequence[Dict[str, Any]],
+    markets: Optional[Sequence[Market]] = None,
+    filters_path: str = FILTERS_DB,
+    speed: float = 0.0,
+    bot: Any = None,
+) -> Dict[str, Any]:
+    """Run a recording through fetch → match → de‑dup → format → send.
+
+    Every ``fetch_orders`` call consumes one recorded response per request;
+    the replay ends when the log is exhausted or a cycle is served nothing.
+
+    Returns:
+        Counters and the total time spent in each stage (seconds).
+    """
+    fetcher = ReplayFetcher(records, markets, speed)
+    bot = bot or NullBot()
+    dedup = AlertDeduplicator()
+    repository = get_repository(filters_path)
+    # Route tickers like ``Pipeline``: only to filters subscribed to their market.
+    subscriptions = SubscriptionIndex(fetcher.markets)
+    stats: Dict[str, Any] = defaultdict(float)
+    stats.update(cycles=0, tickers=0, matches=0, suppressed=0, messages=0)
+    start = time.perf_counter()
+
+    while not fetcher.exhausted:
+        served = fetcher.served
+        t0 = time.perf_counter()
+        tickers = await fetcher.fetch_orders()
+        t1 = time.perf_counter()
+        if fetcher.served == served:
+            break
+        subscriptions.update(await repository.asnapshot())
+        orders = subscriptions.apply(tickers)
+        t2 = time.perf_counter()
+        by_chat: Dict[Any, List[Dict[str, Any]]] = defaultdict(list)
+        for order in orders:
+            if dedup.should_notify(order, now=fetcher.clock):
+                by_chat[order["chat_id"]].append(order)
+        texts = [(chat, text) for chat, batch in by_chat.items() for text in format_digest(batch)]
+        t3 = time.perf_counter()
+        for chat, text in texts:
+            await bot.send_message(chat, text, parse_mode="HTML")
+        t4 = time.perf_counter()
+
+        stats["cycles"] += 1
+        stats["tickers"] += len(tickers)
+        stats["matches"] += len(orders)
+        stats["messages"] += len(texts)
+        stats["fetch"] += t1 - t0
+        stats["match"] += t2 - t1
+        stats["format"] += t3 - t2
+        stats["send"] += t4 - t3
+
+    await fetcher.close()
+    stats["suppressed"] = dedup.hits
+    stats["responses"] = fetcher.served
+    stats["unused"] = fetcher.remaining
+    stats["elapsed"] = time.perf_counter() - start
+    return dict(stats)
@@ -0,0 +1,265 @@
+"""
+Indexed, append‑only store of referrals and PRO users.
+
+The referral handlers used to load and rewrite the whole ``referrals.json``
+and ``pro_users.json`` files on the event loop for every ``/start ref…`` and
+``/myref``, searched lists for membership and had no locking, so concurrent
+registrations could overwrite each other.
+
+``ReferralStore`` keeps everything in memory: a set of invited users per
+inviter, the set of inviters who already received their bonus and the set
+of PRO users, so membership checks, invite counts and PRO lookups are
+``O(1)``.  A change is applied to memory first, in one step without
+yielding to the event loop, so concurrent registrations cannot lose each
+other's updates.  It is then appended as one JSON line to a log file.  A
+single writer thread appends all lines pending at that moment with one
+``write`` and one ``fsync`` (group commit), so a burst of registrations
+costs a handful of disk syncs, not one per user.  Callers wait until their
+change is on disk.
+
+The log is compacted (rewritten as one record per inviter plus the PRO
+users, then atomically swapped in with ``os.replace``) once it holds more
+than ``COMPACT_MIN_RECORDS`` lines and over twice as many lines as live
+entries.  A torn last line left by a crash is skipped when loading and
+removed by compacting.  On first start the legacy JSON files are imported.
+"""
+
+import asyncio
+import json
+import logging
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List, Optional, Set, Tuple
+
+from config import PRO_USERS_FILE, REF_FILE, REFERRAL_BONUS_INVITES, REFERRAL_LOG
+
+# Compact the log only once it has at least this many lines.
+COMPACT_MIN_RECORDS = 1000
+
+
+def _read_json(path: str) -> Any:
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+class ReferralStore:
+    """Referrals and PRO users indexed in memory, persisted to an
+    append‑only log.
+
+    Args:
+        path: Log file; created on first use.
+        legacy_refs: ``referrals.json`` imported when the log does not exist.
+        legacy_pro: ``pro_users.json`` imported when the log does not exist.
+    """
+
+    def __init__(
+        self,
+        path: str,
+        legacy_refs: Optional[str] = None,
+        legacy_pro: Optional[str] = None,
+    ) -> None:
+        self.path = path
+        self._invited: Dict[str, Set[str]] = {}
+        self._bonus: Set[str] = set()
+        self._pro: Set[str] = set()
+        self._pending: List[str] = []
+        # Guards the in‑memory state and ``_pending`` against the writer
+        # thread taking a compaction snapshot.
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="referral-store")
+        self._records = 0
+
+        if os.path.exists(path):
+            damaged = self._load()
+            if damaged:
+                logging.warning(f"[referral_store] {path}: пропущено повреждённых строк: {damaged}")
+                self._compact()
+        else:
+            self._import_legacy(legacy_refs, legacy_pro)
+            self._compact()
+        self._fd = os.open(path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+
+    def close(self) -> None:
+        self._executor.shutdown(wait=True)
+        self._write()
+        os.close(self._fd)
+
+    # -- loading -----------------------------------------------------------
+
+    def _apply(self, record: Dict[str, Any]) -> None:
+        op = record["op"]
+        if op == "invite":
+            self._invited.setdefault(record["inviter"], set()).update(record["users"])
+            if record.get("bonus"):
+                self._bonus.add(record["inviter"])
+        elif op == "bonus":
+            self._bonus.add(record["inviter"])
+        elif op == "pro":
+            self._pro.add(record["user"])
+        else:
+            raise ValueError(f"unknown op {op!r}")
+
+    def _load(self) -> int:
+        """Replay the log into memory; return the number of skipped lines."""
+        damaged = 0
+        with open(self.path, "rb") as f:
+            for line in f:
+                try:
+                    self._apply(json.loads(line))
+                except (ValueError, KeyError, TypeError):
+                    damaged += 1
+                    continue
+                self._records += 1
+        return damaged
+
+    def _import_legacy(self, refs_path: Optional[str], pro_path: Optional[str]) -> None:
+        refs = _read_json(refs_path) if refs_path else None
+        pro = _read_json(pro_path) if pro_path else None
+        for inviter, data in (refs if isinstance(refs, dict) else {}).items():
+            self._invited[str(inviter)] = {str(u) for u in data.get("invited", [])}
+            if data.get("used_bonus"):
+                self._bonus.add(str(inviter))
+        if isinstance(pro, dict):
+            self._pro.update(str(u) for u in pro.get("users", []))
+        if self._invited or self._pro:
+            logging.info(
+                f"[referral_store] Импортировано из JSON: пригласивших {len(self._invited)}, "
+                f"PRO {len(self._pro)}"
+            )
+
+    # -- reads -------------------------------------------------------------
+
+    def invited_count(self, inviter: Any) -> int:
+        """Number of users invited by ``inviter``."""
+        return len(self._invited.get(str(inviter), ()))
+
+    def was_invited(self, inviter: Any, user: Any) -> bool:
+        """Whether ``user`` was already invited by ``inviter``."""
+        return str(user) in self._invited.get(str(inviter), ())
+
+    def used_bonus(self, inviter: Any) -> bool:
+        """Whether ``inviter`` already received the referral bonus."""
+        return str(inviter) in self._bonus
+
+    def is_pro(self, user: Any) -> bool:
+        """Whether ``user`` has PRO status."""
+        return str(user) in self._pro
+
+    # -- writes ------------------------------------------------------------
+
+    async def add_referral(
+        self, inviter: Any, user: Any, bonus_after: int = REFERRAL_BONUS_INVITES
+    ) -> Tuple[bool, bool]:
+        """Record that ``inviter`` invited ``user``.
+
+        Once ``inviter`` has invited ``bonus_after`` users they receive PRO
+        status, once.
+
+        Returns:
+            ``(added, bonus)``: ``added`` is ``False`` if ``user`` was
+            already invited by ``inviter``; ``bonus`` is ``True`` if this
+            invitation granted the bonus.
+        """
+        inviter, user = str(inviter), str(user)
+        with self._lock:
+            invited = self._invited.setdefault(inviter, set())
+            if user in invited:
+                return False, False
+            invited.add(user)
+            bonus = len(invited) >= bonus_after and inviter not in self._bonus
+            record: Dict[str, Any] = {"op": "invite", "inviter": inviter, "users": [user]}
+            if bonus:
+                self._bonus.add(inviter)
+                self._pro.add(inviter)
+                record["bonus"] = True
+            self._pending.append(json.dumps(record, ensure_ascii=False))
+            if bonus:
+                self._pending.append(json.dumps({"op": "pro", "user": inviter}))
+        await self._flush()
+        return True, bonus
+
+    async def grant_pro(self, user: Any) -> None:
+        """Give ``user`` PRO status."""
+        user = str(user)
+        with self._lock:
+            if user in self._pro:
+                return
+            self._pro.add(user)
+            self._pending.append(json.dumps({"op": "pro", "user": user}))
+        await self._flush()
+
+    async def _flush(self) -> None:
+        """Wait until everything pending now is on disk."""
+        loop = asyncio.get_running_loop()
+        await loop.run_in_executor(self._executor, self._write)
+
+    def _write(self) -> None:
+        """Append all pending lines with one write and one fsync.
+
+        Runs on the writer thread; a call finding nothing pending returns at
+        once because an earlier call already committed its lines.
+        """
+        with self._lock:
+            lines, self._pending = self._pending, []
+        if not lines:
+            return
+        data = ("\n".join(lines) + "\n").encode("utf-8")
+        os.write(self._fd, data)
+        os.fsync(self._fd)
+        self._records += len(lines)
+        live = len(self._invited) + len(self._pro)
+        if self._records > COMPACT_MIN_RECORDS and self._records > 2 * live:
+            self._compact()
+            os.close(self._fd)
+            self._fd = os.open(self.path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+
+    def _compact(self) -> None:
+        """Rewrite the log as one record per inviter and PRO user.
+
+        Lines still pending are part of the snapshot and dropped from the
+        queue, so the new log is complete without them.
+        """
+        with self._lock:
+            records = [
+                {"op": "invite", "inviter": inviter, "users": sorted(users), "bonus": inviter in self._bonus}
+                for inviter, users in self._invited.items()
+            ]
+            records += [{"op": "bonus", "inviter": i} for i in self._bonus - self._invited.keys()]
+            records += [{"op": "pro", "user": u} for u in sorted(self._pro)]
+            self._pending = []
+        tmp = self.path + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            for record in records:
+                f.write(json.dumps(record, ensure_ascii=False) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, self.path)
+        self._records = len(records)
+        logging.info(f"[referral_store] Журнал сжат до {len(records)} записей")
+
+    # -- telemetry ---------------------------------------------------------
+
+    def stats(self) -> Dict[str, int]:
+        """Return entry counts and the current log length."""
+        return {
+            "inviters": len(self._invited),
+            "invited": sum(len(users) for users in self._invited.values()),
+            "pro": len(self._pro),
+            "log_records": self._records,
+        }
+
+
+_store: Optional[ReferralStore] = None
+
+
+def get_referral_store() -> ReferralStore:
+    """Return the shared store at ``REFERRAL_LOG`` (importing the legacy
+    ``REF_FILE`` and ``PRO_USERS_FILE`` on first use)."""
+    global _store
+    if _store is None:
+        _store = ReferralStore(REFERRAL_LOG, REF_FILE, PRO_USERS_FILE)
+    return _store
@@ -0,0 +1,218 @@
+"""
+Hedged requests and circuit breakers for exchange calls.
+
+Two mechanisms keep a slow or failing venue from dictating the aggregator's
+latency:
+
+* **Hedging** – ``hedged`` starts a duplicate of a request that has not
+  answered after the venue's observed latency quantile (p95 by default, from
+  a ``LatencyWindow`` of recent successful requests) and returns whichever
+  copy answers first, cancelling the other.  The duplicates are capped by a
+  ``HedgeBudget`` to a small fraction of all requests, so the request volume
+  barely grows while the slowest few percent of requests get a second
+  chance.
+* **Circuit breaking** – a ``CircuitBreaker`` per venue opens after
+  ``failure_threshold`` consecutive failures.  While it is open, requests
+  fail immediately with ``CircuitOpenError`` instead of hitting the venue.
+  After ``reset_timeout`` seconds it becomes half‑open and lets the
+  requests of a single probe flow through: one market's buy and sell (or
+  depth page) requests, which are sent together.  If a probe request
+  succeeds the circuit closes; if one fails it opens again.
+
+Both are configured per adapter (see ``services.exchanges.ExchangeAdapter``)
+and used by ``P2PFetcher._request``.
+"""
+
+import asyncio
+import time
+from collections import deque
+from typing import Awaitable, Callable, Deque, Hashable, Optional, TypeVar
+
+T = TypeVar("T")
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+# Numeric circuit states exported as a gauge.
+STATE_VALUES = {CLOSED: 0, HALF_OPEN: 1, OPEN: 2}
+
+
+class CircuitOpenError(Exception):
+    """Raised instead of sending a request to a venue whose circuit is open."""
+
+
+class LatencyWindow:
+    """Latencies of the last ``size`` successful requests.
+
+    Args:
+        size: Number of samples kept.
+        min_samples: Samples needed before ``quantile`` returns a value.
+    """
+
+    def __init__(self, size: int = 200, min_samples: int = 20) -> None:
+        self.min_samples = min_samples
+        self._samples: Deque[float] = deque(maxlen=size)
+        self._sorted: Optional[list] = None
+
+    def __len__(self) -> int:
+        return len(self._samples)
+
+    def record(self, latency: float) -> None:
+        self._samples.append(latency)
+        self._sorted = None
+
+    def quantile(self, q: float) -> Optional[float]:
+        """Return the ``q`` quantile, or ``None`` with too few samples."""
+        if len(self._samples) < self.min_samples:
+            return None
+        if self._sorted is None:
+            self._sorted = sorted(self._samples)
+        return self._sorted[min(len(self._sorted) - 1, int(q * len(self._sorted)))]
+
+
+class HedgeBudget:
+    """Allows hedges for at most ``ratio`` of the requests (plus ``burst``)."""
+
+    def __init__(self, ratio: float, burst: int = 3) -> None:
+        self.ratio = ratio
+        self.burst = burst
+        self.requests = 0
+        self.hedges = 0
+
+    def request(self) -> None:
+        self.requests += 1
+
+    def try_hedge(self) -> bool:
+        if self.ratio <= 0 or self.hedges >= self.requests * self.ratio + self.burst:
+            return False
+        self.hedges += 1
+        return True
+
+
+class CircuitBreaker:
+    """Consecutive‑failure circuit breaker with half‑open probing.
+
+    Args:
+        failure_threshold: Consecutive failures that open the circuit; ``0``
+            disables the breaker.
+        reset_timeout: Seconds the circuit stays open before a probe.
+        on_change: Called with the new state on every transition.
+    """
+
+    def __init__(
+        self,
+        failure_threshold: int,
+        reset_timeout: float,
+        on_change: Optional[Callable[[str], None]] = None,
+    ) -> None:
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.on_change = on_change
+        self.state = CLOSED
+        self.failures = 0
+        self.opened_at = 0.0
+        # Probe requests in flight while half‑open, and the flow they belong to.
+        self._probing = 0
+        self._probe_flow: Optional[Hashable] = None
+
+    def _set(self, state: str) -> None:
+        if state != self.state:
+            self.state = state
+            self._probing = 0
+            self._probe_flow = None
+            if self.on_change is not None:
+                self.on_change(state)
+
+    def allow(self, now: Optional[float] = None, flow: Optional[Hashable] = None) -> bool:
+        """Return ``True`` if a request may be sent now.
+
+        In the half‑open state only one probe flow is admitted: the first
+        request becomes the probe, and further requests are allowed only if
+        they carry the same (not ``None``) ``flow``.  The outcome of every
+        admitted request must be reported with ``record_success``,
+        ``record_failure`` or ``release``.
+        """
+        if self.state == CLOSED:
+            return True
+        now = time.monotonic() if now is None else now
+        if self.state == OPEN and now - self.opened_at >= self.reset_timeout:
+            self._set(HALF_OPEN)
+        if self.state != HALF_OPEN:
+            return False
+        if not self._probing:
+            self._probe_flow = flow
+        elif flow is None or flow != self._probe_flow:
+            return False
+        self._probing += 1
+        return True
+
+    def record_success(self) -> None:
+        self.failures = 0
+        # A request that started before the circuit (re)opened does not
+        # close it; only a probe or a request of a closed circuit does.
+        if self.state != OPEN:
+            self._set(CLOSED)
+
+    def record_failure(self, now: Optional[float] = None) -> None:
+        self.failures += 1
+        if self.state == HALF_OPEN or (
+            self.failure_threshold and self.failures >= self.failure_threshold
+        ):
+            self.opened_at = time.monotonic() if now is None else now
+            self._set(OPEN)
+
+    def release(self) -> None:
+        """Forget a request that ended without an outcome (cancelled)."""
+        if self._probing:
+            self._probing -= 1
+            if not self._probing:
+                self._probe_flow = None
+
+
+async def hedged(
+    call: Callable[[], Awaitable[T]],
+    delay: Optional[float],
+    may_hedge: Callable[[], bool],
+    on_hedge: Optional[Callable[[bool], None]] = None,
+) -> T:
+    """Await ``call()``; if it has not finished after ``delay`` seconds and
+    ``may_hedge()`` agrees, start a second ``call()`` and return the first
+    successful result.
+
+    Args:
+        call: Starts one attempt.
+        delay: Hedge delay; ``None`` disables hedging.
+        may_hedge: Consulted once when the delay expires.
+        on_hedge: Called with ``True`` if the hedge won, ``False`` otherwise,
+            after a hedge was sent.
+
+    Raises:
+        The exception of the last attempt to fail if none succeeded.
+    """
+    first = asyncio.ensure_future(call())
+    if delay is None:
+        return await first
+    second: Optional[asyncio.Future] = None
+    try:
+        done, _ = await asyncio.wait({first}, timeout=delay)
+        if done or not may_hedge():
+            return await first
+        second = asyncio.ensure_future(call())
+        pending = {first, second}
+        error: Optional[BaseException] = None
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                if task.exception() is None:
+                    if on_hedge is not None:
+                        on_hedge(task is second)
+                    return task.result()
+                error = task.exception()
+        if on_hedge is not None:
+            on_hedge(False)
+        raise error
+    finally:
+        for task in (first, second):
+            if task is not None and not task.done():
+                task.cancel()
@@ -0,0 +1,231 @@
+"""
+Adaptive per‑market polling scheduler for the ArbitPro aggregator.
+
+Instead of sleeping a fixed 15 seconds after every cycle, every market gets
+its own polling interval:
+
+* the cadence is drift‑corrected: the next poll is scheduled from the
+  previous *scheduled* time, not from when the work finished, and a small
+  random jitter is added on top so markets do not synchronise;
+* failed polls back off exponentially (faster for HTTP 429/418 answers)
+  and recover the normal cadence after the next success;
+* the interval shrinks towards ``min_interval`` while a market's recent
+  spreads are volatile or its quotes are close to some user's thresholds,
+  and grows towards ``max_interval`` while it is quiet.
+"""
+
+import asyncio
+import random
+import statistics
+import time
+from bisect import bisect_left
+from collections import deque
+from typing import Deque, Dict, Iterable, List, Optional, Sequence
+
+from config import (
+    POLL_INTERVAL,
+    POLL_JITTER,
+    POLL_MAX_BACKOFF,
+    POLL_MAX_INTERVAL,
+    POLL_MIN_INTERVAL,
+)
+from services.exchanges import Market
+
+# Number of recent spreads kept per market for the volatility estimate.
+SPREAD_WINDOW = 10
+
+# Relative spread standard deviation above which a market counts as volatile.
+VOLATILITY_THRESHOLD = 0.002
+
+# Relative distance to a user threshold below which a market counts as "hot".
+NEAR_THRESHOLD = 0.003
+
+# Interval multipliers applied after each successful poll.
+TIGHTEN_FACTOR = 0.5
+RELAX_FACTOR = 1.25
+
+
+class _MarketState:
+    __slots__ = ("interval", "anchor", "due", "errors", "spreads")
+
+    def __init__(self, interval: float, now: float) -> None:
+        self.interval = interval
+        self.anchor = now  # scheduled time without jitter
+        self.due = now
+        self.errors = 0
+        self.spreads: Deque[float] = deque(maxlen=SPREAD_WINDOW)
+
+
+def _nearest_distance(value: float, sorted_limits: Sequence[float]) -> float:
+    """Relative distance from ``value`` to the closest of ``sorted_limits``."""
+    if not sorted_limits or not value:
+        return float("inf")
+    i = bisect_left(sorted_limits, value)
+    best = float("inf")
+    for j in (i - 1, i):
+        if 0 <= j < len(sorted_limits):
+            best = min(best, abs(sorted_limits[j] - value))
+    return best / abs(value)
+
+
+class PollScheduler:
+    """Tracks when each market is due for polling.
+
+    Args:
+        markets: Markets to schedule; all are due immediately.
+        interval: Base polling interval in seconds.
+        min_interval: Shortest interval used for hot markets.
+        max_interval: Longest interval used for quiet markets.
+        jitter: Random jitter as a fraction of the interval.
+        max_backoff: Longest delay after repeated errors.
+    """
+
+    def __init__(
+        self,
+        markets: Iterable[Market],
+        interval: float = POLL_INTERVAL,
+        min_interval: float = POLL_MIN_INTERVAL,
+        max_interval: float = POLL_MAX_INTERVAL,
+        jitter: float = POLL_JITTER,
+        max_backoff: float = POLL_MAX_BACKOFF,
+    ) -> None:
+        self.interval = interval
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.jitter = jitter
+        self.max_backoff = max_backoff
+        self._states: Dict[Market, _MarketState] = {}
+        self._buy_limits: List[float] = []
+        self._sell_limits: List[float] = []
+        # Set whenever a schedule changes so ``wait_due`` re‑evaluates.
+        self._wakeup = asyncio.Event()
+        self._woken = False
+        self.set_markets(markets)
+
+    def set_markets(self, markets: Iterable[Market]) -> None:
+        """Replace the scheduled markets, keeping the state of known ones."""
+        now = time.monotonic()
+        self._states = {
+            m: self._states.get(m) or _MarketState(self.interval, now) for m in markets
+        }
+        self._wakeup.set()
+
+    def set_thresholds(self, buy_limits: Iterable[float], sell_limits: Iterable[float]) -> None:
+        """Set users' buy maximums and sell minimums used to detect markets
+        quoting close to someone's threshold."""
+        self._buy_limits = sorted(x for x in buy_limits if x not in (float("inf"), float("-inf")))
+        self._sell_limits = sorted(x for x in sell_limits if x not in (float("inf"), float("-inf")))
+
+    @property
+    def markets(self) -> List[Market]:
+        return list(self._states)
+
+    def interval_of(self, market: Market) -> float:
+        return self._states[market].interval
+
+    def _jittered(self, at: float, interval: float) -> float:
+        return at + random.uniform(-self.jitter, self.jitter) * interval
+
+    def due(self, now: Optional[float] = None) -> List[Market]:
+        """Return the markets whose poll time has come."""
+        now = time.monotonic() if now is None else now
+        return [m for m, s in self._states.items() if s.due <= now]
+
+    def claim(self, markets: Iterable[Market]) -> None:
+        """Mark ``markets`` as being polled so ``due`` skips them until their
+        outcome is recorded."""
+        for market in markets:
+            state = self._states.get(market)
+            if state is not None:
+                state.due = float("inf")
+
+    def next_due(self) -> Optional[float]:
+        """Return the monotonic time of the earliest scheduled poll."""
+        due = min((s.due for s in self._states.values()), default=None)
+        return None if due == float("inf") else due
+
+    def wake(self) -> None:
+        """Make a pending ``wait_due`` return early (e.g. filters changed)."""
+        self._woken = True
+        self._wakeup.set()
+
+    async def wait_due(self) -> List[Market]:
+        """Sleep until at least one market is due and return the due ones.
+
+        Returns early (possibly with an empty list) after ``wake``, and with
+        an empty list after ``interval`` seconds without any scheduled poll
+        (no markets, or all of them in flight), so the caller can re‑check
+        what to poll.
+        """
+        while True:
+            now = time.monotonic()
+            ready = self.due(now)
+            if ready or self._woken:
+                self._woken = False
+                return ready
+            next_due = self.next_due()
+            timeout = max(0.0, next_due - now) if next_due is not None else self.interval
+            self._wakeup.clear()
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout)
+            except asyncio.TimeoutError:
+                if next_due is None:
+                    return []
+
+    def record_success(
+        self, market: Market, ticker: Optional[Dict] = None, now: Optional[float] = None
+    ) -> None:
+        """Schedule the next poll after a successful fetch.
+
+        Args:
+            market: The polled market.
+            ticker: Its ticker, if the book was not empty; used to adapt the
+                interval to volatility and proximity to user thresholds.
+        """
+        now = time.monotonic() if now is None else now
+        state = self._states.get(market)
+        if state is None:
+            return
+        state.errors = 0
+
+        if ticker is not None:
+            price = float(ticker.get("price", 0))
+            sell = float(ticker.get("sell_price", price))
+            state.spreads.append((sell - price) / price if price else 0.0)
+            volatile = (
+                len(state.spreads) >= 3
+                and statistics.pstdev(state.spreads) > VOLATILITY_THRESHOLD
+            )
+            near = (
+                _nearest_distance(price, self._buy_limits) < NEAR_THRESHOLD
+                or _nearest_distance(sell, self._sell_limits) < NEAR_THRESHOLD
+            )
+            factor = TIGHTEN_FACTOR if volatile or near else RELAX_FACTOR
+            state.interval = min(self.max_interval, max(self.min_interval, state.interval * factor))
+
+        # Drift correction: advance from the previous scheduled time; if the
+        # poll overran, skip the missed slots instead of bursting.
+        state.anchor += state.interval
+        if state.anchor <= now:
+            missed = int((now - state.anchor) // state.interval) + 1
+            state.anchor += missed * state.interval
+        state.due = self._jittered(state.anchor, state.interval)
+        self._wakeup.set()
+
+    def record_error(
+        self, market: Market, rate_limited: bool = False, now: Optional[float] = None
+    ) -> float:
+        """Back off after a failed fetch and return the delay in seconds.
+
+        Rate‑limit answers (HTTP 429/418) back off twice as fast.
+        """
+        now = time.monotonic() if now is None else now
+        state = self._states.get(market)
+        if state is None:
+            return 0.0
+        state.errors += 2 if rate_limited else 1
+        delay = min(self.max_backoff, self.interval * 2 ** (state.errors - 1))
+        state.anchor = now + delay
+        state.due = self._jittered(state.anchor, delay)
+        self._wakeup.set()
+        return delay
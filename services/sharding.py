@@ -0,0 +1,462 @@
+"""
+Multi‑process sharded mode of the aggregator.
+
+Matching and formatting for many users are pure Python and therefore bound
+to one core.  With ``SHARD_WORKERS`` > 0 the aggregator runs as a
+supervisor: it still polls every market exactly once (``ShardedPipeline``
+reuses the pipeline's fetch stage), but instead of matching it sends each
+quote snapshot to N worker processes over local pipes.  Every worker owns
+the chats that hash to it, routes each market's quotes to the filters of
+its own chats subscribed to that market (``SubscriptionIndex``) and
+matches, de‑duplicates, formats and sends their alerts with its own bot
+session and a 1/N share of the global Telegram rate limit.
+
+Chats are assigned with rendezvous hashing (``shard_of``), so changing the
+number of workers only moves about 1/N of the chats.  The supervisor
+restarts workers that die or stop sending heartbeats and, on ``resize``,
+starts or stops workers and tells the survivors their new shard count.
+``ShardedPipeline`` resizes on ``SIGHUP`` after re‑reading ``SHARD_WORKERS``
+from ``.env``.  Joining and spawning processes runs in threads, off the event
+loop.  The alert de‑duplication state of chats that move to another worker
+is lost.
+
+Workers do not serve ``/metrics``: each heartbeat carries the counters and
+histograms the worker recorded since the previous one (``Registry.drain``),
+which the supervisor adds to its own ``REGISTRY``, and the supervisor
+reports the summed queue depth of all workers as the notification queue
+gauge.
+"""
+
+import asyncio
+import logging
+import multiprocessing
+import os
+import queue
+import signal
+import time
+import zlib
+from typing import Any, Callable, Dict, List, Optional, Union
+
+from aiohttp import ClientSession
+from dotenv import load_dotenv
+
+from config import (
+    API_TOKEN,
+    FILTERS_DB,
+    NOTIFY_GLOBAL_RATE,
+    SHARD_HEALTH_TIMEOUT,
+    SHARD_QUEUE_SIZE,
+    SHARD_WORKERS,
+    SHUTDOWN_TIMEOUT,
+)
+from services.metrics import NOTIFY_QUEUE_DEPTH, REGISTRY
+from services.pipeline import Pipeline
+
+# Seconds between worker heartbeats.
+HEARTBEAT_INTERVAL = 2.0
+
+_CONTEXT = multiprocessing.get_context("spawn")
+
+_MASK64 = (1 << 64) - 1
+
+
+def shard_of(chat_id: Union[int, str], count: int) -> int:
+    """Return the worker (``0 … count‑1``) owning ``chat_id``.
+
+    Rendezvous (highest random weight) hashing: a chat only moves when the
+    worker it maps to is added or removed.
+    """
+    h = zlib.crc32(str(chat_id).encode())
+    return max(range(count), key=lambda w: _mix64(h ^ (w * 0x9E3779B97F4A7C15)))
+
+
+def _mix64(x: int) -> int:
+    """SplitMix64 finaliser: spreads similar inputs over 64 bits."""
+    x &= _MASK64
+    x = ((x ^ (x >> 30)) * 0xBF58476D1CE4E5B9) & _MASK64
+    x = ((x ^ (x >> 27)) * 0x94D049BB133111EB) & _MASK64
+    return x ^ (x >> 31)
+
+
+def default_bot():
+    """Create the bot used by a worker process."""
+    from aiogram import Bot
+    from aiogram.client.default import DefaultBotProperties
+
+    return Bot(token=API_TOKEN, default=DefaultBotProperties(parse_mode="HTML"))
+
+
+# -- worker process --------------------------------------------------------
+
+
+def _get(inbox, timeout: float):
+    try:
+        return inbox.get(timeout=timeout)
+    except queue.Empty:
+        return None
+
+
+async def _worker_main(index: int, count: int, inbox, outbox, filters_path: str, bot_factory) -> None:
+    from config import P2P_MARKETS
+    from services.dedup import AlertDeduplicator
+    from services.dispatcher import NotificationDispatcher
+    from services.exchanges import parse_markets
+    from services.filter_repository import get_repository
+    from services.metrics import ALERTS_SUPPRESSED, MATCH_DURATION, MATCHES
+    from services.notifications import format_digest
+    from services.subscriptions import SubscriptionIndex
+
+    bot = bot_factory()
+    dispatcher = NotificationDispatcher(bot, global_rate=NOTIFY_GLOBAL_RATE / count)
+    dispatcher.start()
+    dedup = AlertDeduplicator()
+    repository = get_repository(filters_path)
+    loop = asyncio.get_running_loop()
+    universe = parse_markets(P2P_MARKETS)
+    shard_key = None
+    subscriptions = None
+    stats = {"snapshots": 0, "matches": 0, "messages": 0, "chats": 0}
+
+    def report() -> None:
+        outbox.put(("heartbeat", index, {**stats, **dispatcher.stats()}, REGISTRY.drain()))
+
+    async def heartbeat() -> None:
+        # A separate task, so a worker blocked on a full dispatcher queue
+        # still reports as alive.
+        while True:
+            report()
+            await asyncio.sleep(HEARTBEAT_INTERVAL)
+
+    beat = asyncio.create_task(heartbeat())
+
+    while True:
+        msg = await loop.run_in_executor(None, _get, inbox, HEARTBEAT_INTERVAL)
+        if msg is None:
+            continue
+        kind = msg[0]
+        if kind == "stop":
+            break
+        if kind == "shard":
+            index, count = msg[1], msg[2]
+            dispatcher.set_global_rate(NOTIFY_GLOBAL_RATE / count)
+            continue
+        if kind != "quotes":
+            continue
+
+        # Same routing as the single‑process match stage, over this shard's
+        # chats only; rebuilt from scratch when the shard assignment changes.
+        if shard_key != (index, count):
+            shard_key = (index, count)
+            subscriptions = SubscriptionIndex(
+                universe, lambda chat, i=index, n=count: shard_of(chat, n) == i
+            )
+        start = time.perf_counter()
+        subscriptions.update(await repository.asnapshot())
+        stats["chats"] = len(subscriptions)
+
+        by_chat: Dict[Any, List[Dict[str, Any]]] = {}
+        orders = subscriptions.apply(msg[1])
+        MATCH_DURATION.observe(time.perf_counter() - start)
+        MATCHES.inc(amount=len(orders))
+        dedup.maybe_purge()
+        suppressed = 0
+        for order in orders:
+            if dedup.should_notify(order):
+                by_chat.setdefault(order["chat_id"], []).append(order)
+            else:
+                suppressed += 1
+        ALERTS_SUPPRESSED.inc(amount=suppressed)
+        for chat_id, batch in by_chat.items():
+            for text in format_digest(batch):
+                await dispatcher.put(chat_id, text, parse_mode="HTML")
+                stats["messages"] += 1
+        stats["snapshots"] += 1
+        stats["matches"] += len(orders)
+
+    beat.cancel()
+    await dispatcher.close(SHUTDOWN_TIMEOUT)
+    report()
+    session = getattr(bot, "session", None)
+    if session is not None and hasattr(session, "close"):
+        await session.close()
+
+
+def _worker_entry(index, count, inbox, outbox, filters_path, bot_factory) -> None:
+    logging.basicConfig(level=logging.INFO)
+    try:
+        asyncio.run(_worker_main(index, count, inbox, outbox, filters_path, bot_factory))
+    except KeyboardInterrupt:
+        pass
+
+
+# -- supervisor ------------------------------------------------------------
+
+
+class _Worker:
+    __slots__ = ("process", "inbox", "last_beat", "stats", "restarts")
+
+    def __init__(self) -> None:
+        self.process = None
+        self.inbox = None
+        self.last_beat = 0.0
+        self.stats: Dict[str, Any] = {}
+        self.restarts = 0
+
+
+class ShardSupervisor:
+    """Starts, feeds, health‑checks and resizes the worker processes.
+
+    Args:
+        workers: Number of worker processes.
+        filters_path: Filters database read by the workers.
+        bot_factory: Picklable callable creating a worker's bot.
+        health_timeout: Seconds without heartbeat after which a worker is
+            restarted.
+        queue_size: Snapshots buffered per worker; a worker that falls
+            further behind misses snapshots (the next one supersedes them).
+    """
+
+    def __init__(
+        self,
+        workers: int = SHARD_WORKERS,
+        filters_path: str = FILTERS_DB,
+        bot_factory: Callable[[], Any] = default_bot,
+        health_timeout: float = SHARD_HEALTH_TIMEOUT,
+        queue_size: int = SHARD_QUEUE_SIZE,
+    ) -> None:
+        self.count = max(1, workers)
+        self.filters_path = filters_path
+        self.bot_factory = bot_factory
+        self.health_timeout = health_timeout
+        self.queue_size = queue_size
+        self.outbox = _CONTEXT.Queue()
+        self._workers: List[_Worker] = []
+        # Serialises restarts and resizes, which run partly in threads.
+        self._lock = asyncio.Lock()
+        self.published = 0
+        self.skipped = 0
+
+    def _spawn(self, index: int, worker: Optional[_Worker] = None) -> _Worker:
+        worker = worker or _Worker()
+        worker.inbox = _CONTEXT.Queue(maxsize=self.queue_size)
+        worker.process = _CONTEXT.Process(
+            target=_worker_entry,
+            args=(index, self.count, worker.inbox, self.outbox, self.filters_path, self.bot_factory),
+            name=f"arbitpro-shard-{index}",
+            daemon=True,
+        )
+        worker.process.start()
+        worker.last_beat = time.monotonic()
+        return worker
+
+    def start(self) -> None:
+        if not self._workers:
+            self._workers = [self._spawn(i) for i in range(self.count)]
+            logging.info(f"🟢 Запущено процессов‑шардов: {self.count}")
+
+    def publish(self, tickers: List[Dict[str, Any]]) -> None:
+        """Send a quote snapshot to every worker without blocking."""
+        self.published += 1
+        for worker in self._workers:
+            try:
+                worker.inbox.put_nowait(("quotes", tickers))
+            except queue.Full:
+                self.skipped += 1
+
+    def collect(self) -> None:
+        """Read pending heartbeats and merge the workers' metrics."""
+        while True:
+            try:
+                kind, index, stats, metrics = self.outbox.get_nowait()
+            except queue.Empty:
+                return
+            # Merged even from a worker that was stopped or replaced: its
+            # last heartbeat holds what it recorded since the previous one.
+            REGISTRY.merge(metrics)
+            if kind == "heartbeat" and index < len(self._workers):
+                self._workers[index].last_beat = time.monotonic()
+                self._workers[index].stats = stats
+
+    def queue_depth(self) -> int:
+        """Return the notification queue depth summed over all workers."""
+        return sum(w.stats.get("queue_depth", 0) for w in self._workers)
+
+    async def check_health(self) -> List[int]:
+        """Restart dead or silent workers and return their indexes."""
+        self.collect()
+        restarted = []
+        async with self._lock:
+            now = time.monotonic()
+            for i, worker in enumerate(self._workers):
+                dead = not worker.process.is_alive()
+                silent = now - worker.last_beat > self.health_timeout
+                if dead or silent:
+                    logging.error(
+                        f"💥 Шард {i} {'завершился (код ' + str(worker.process.exitcode) + ')' if dead else 'не отвечает'}, перезапуск"
+                    )
+                    await asyncio.to_thread(self._restart, i, worker)
+                    restarted.append(i)
+        return restarted
+
+    def _restart(self, index: int, worker: _Worker) -> None:
+        """Kill ``worker`` if needed and start it again (blocking)."""
+        if worker.process.is_alive():
+            worker.process.kill()
+        worker.process.join(1)
+        worker.restarts += 1
+        self._spawn(index, worker)
+
+    async def resize(self, workers: int) -> None:
+        """Change the number of workers, rebalancing the chats."""
+        workers = max(1, workers)
+        async with self._lock:
+            if workers == self.count:
+                return
+            old = self.count
+            self.count = workers
+            removed, self._workers = self._workers[workers:], self._workers[:workers]
+            await asyncio.gather(*(asyncio.to_thread(self._stop, w) for w in removed))
+            await asyncio.gather(*(
+                asyncio.to_thread(self._set_shard, i, w) for i, w in enumerate(self._workers)
+            ))
+            added = await asyncio.gather(*(
+                asyncio.to_thread(self._spawn, i) for i in range(len(self._workers), workers)
+            ))
+            self._workers = self._workers + list(added)
+        logging.info(f"🔁 Число шардов изменено: {old} → {workers}")
+
+    def _set_shard(self, index: int, worker: _Worker) -> None:
+        """Tell ``worker`` the new shard count (blocking).
+
+        Waits for room in its inbox for up to ``health_timeout``; a worker
+        that is dead or does not drain its inbox by then is restarted, and
+        the new process starts with the new count.
+        """
+        deadline = time.monotonic() + self.health_timeout
+        while worker.process.is_alive() and time.monotonic() < deadline:
+            try:
+                worker.inbox.put(("shard", index, self.count), timeout=1)
+                return
+            except queue.Full:
+                continue
+        logging.error(f"💥 Шард {index} не принял новое число шардов, перезапуск")
+        self._restart(index, worker)
+
+    def _stop(self, worker: _Worker, timeout: float = SHUTDOWN_TIMEOUT) -> None:
+        try:
+            worker.inbox.put(("stop",), timeout=1)
+        except queue.Full:
+            worker.process.terminate()
+        worker.process.join(timeout)
+        if worker.process.is_alive():
+            worker.process.kill()
+            worker.process.join(1)
+
+    def close(self, timeout: float = SHUTDOWN_TIMEOUT) -> None:
+        """Stop all workers, letting them deliver queued alerts (blocking)."""
+        for worker in self._workers:
+            try:
+                worker.inbox.put(("stop",), timeout=1)
+            except queue.Full:
+                worker.process.terminate()
+        deadline = time.monotonic() + timeout
+        for worker in self._workers:
+            worker.process.join(max(0.0, deadline - time.monotonic()))
+            if worker.process.is_alive():
+                worker.process.kill()
+                worker.process.join(1)
+        self.collect()
+
+    def stats(self) -> Dict[str, Any]:
+        """Return per‑worker heartbeat statistics."""
+        self.collect()
+        return {
+            "workers": self.count,
+            "published": self.published,
+            "skipped": self.skipped,
+            "shards": [
+                {
+                    "pid": w.process.pid,
+                    "alive": w.process.is_alive(),
+                    "restarts": w.restarts,
+                    "heartbeat_age": time.monotonic() - w.last_beat,
+                    **w.stats,
+                }
+                for w in self._workers
+            ],
+        }
+
+
+class ShardedPipeline(Pipeline):
+    """Pipeline whose match and send stages run in ``ShardSupervisor``
+    workers.
+
+    Args:
+        session: Shared aiohttp session for exchange requests.
+        workers: Number of worker processes.
+        filters_path: Filters database.
+        bot_factory: Creates each worker's bot.
+    """
+
+    def __init__(
+        self,
+        session: Optional[ClientSession],
+        workers: int = SHARD_WORKERS,
+        filters_path: str = FILTERS_DB,
+        bot_factory: Callable[[], Any] = default_bot,
+        **kwargs: Any,
+    ) -> None:
+        super().__init__(session, None, filters_path, matchers=1, senders=0, **kwargs)
+        self.supervisor = ShardSupervisor(workers, filters_path, bot_factory)
+        self._resizes: set = set()
+
+    async def run(self) -> None:
+        self.supervisor.start()
+        health = asyncio.create_task(self._health_stage(), name="shard-health")
+        loop = asyncio.get_running_loop()
+        try:
+            loop.add_signal_handler(signal.SIGHUP, self._reload)
+        except (AttributeError, NotImplementedError, RuntimeError):
+            # No SIGHUP (Windows) or not the main thread: no live resizing.
+            pass
+        try:
+            await super().run()
+        finally:
+            try:
+                loop.remove_signal_handler(signal.SIGHUP)
+            except (AttributeError, NotImplementedError, RuntimeError):
+                pass
+            health.cancel()
+            await asyncio.gather(health, *self._resizes, return_exceptions=True)
+            await asyncio.get_running_loop().run_in_executor(None, self.supervisor.close)
+
+    def _reload(self) -> None:
+        """Re‑read ``SHARD_WORKERS`` from ``.env`` and resize (on SIGHUP)."""
+        load_dotenv(override=True)
+        try:
+            workers = int(os.getenv("SHARD_WORKERS", self.supervisor.count))
+        except ValueError:
+            logging.error(f"[sharding] Некорректное SHARD_WORKERS: {os.getenv('SHARD_WORKERS')!r}")
+            return
+        task = asyncio.create_task(self.supervisor.resize(workers), name="shard-resize")
+        self._resizes.add(task)
+        task.add_done_callback(self._resizes.discard)
+
+    async def _health_stage(self) -> None:
+        # The pipeline's own dispatcher sends nothing in sharded mode.  This
+        # task first runs after ``Pipeline.run`` has started it, so the gauge
+        # is rebound from its (always empty) queue to the workers' queues.
+        NOTIFY_QUEUE_DEPTH.set_function(self.supervisor.queue_depth)
+        while True:
+            await asyncio.sleep(HEARTBEAT_INTERVAL)
+            await self.supervisor.check_health()
+
+    async def _match_stage(self) -> None:
+        while True:
+            tickers = await self.quotes.take()
+            if tickers:
+                await self._refresh_filters()
+                self.supervisor.publish(tickers)
+
+    def stats(self) -> Dict[str, Any]:
+        return {**super().stats(), "shards": self.supervisor.stats()}
@@ -0,0 +1,242 @@
+"""
+Cross‑exchange spread engine for the ArbitPro bot.
+
+A ticker from ``P2PFetcher.fetch_orders`` only reports one venue's own best
+buy and sell advert, and the top advert is often too small to fill a real
+trade.  This module works on order books several pages deep
+(``P2PFetcher.fetch_books``) and answers: *buying for ``notional`` fiat on
+venue A and selling the coins on venue B, what is the executable profit
+after fees?* – for every pair of venues quoting the same asset and fiat.
+
+``OrderBook`` turns each side into cumulative (quantity, cost) arrays once,
+so filling any notional or quantity is a binary search instead of a walk
+over the adverts; evaluating V venues costs O(V·depth + V²·log depth) rather
+than re‑walking both books for every pair.  ``max_executable`` does a
+single sorted merge of one venue's asks against another's bids to find the
+largest profitable volume.
+
+Advert min/max order limits and payment‑method compatibility are not
+modelled; the figures are an upper bound of what a trader can capture.
+"""
+
+from bisect import bisect_left
+from itertools import accumulate
+from typing import Any, Dict, Iterable, List, NamedTuple, Optional, Sequence, Tuple
+
+from config import SPREAD_NOTIONAL
+from services.exchanges import Market
+
+
+class Level(NamedTuple):
+    """One advert: ``price`` in fiat per coin, ``volume`` in coins."""
+
+    price: float
+    volume: float
+    ad_id: Any = None
+
+
+class Spread(NamedTuple):
+    """Executable result of buying on one venue and selling on another.
+
+    ``buy_vwap``/``sell_vwap`` are volume‑weighted prices including fees;
+    ``quantity`` may be below the notional's worth when the sell book is too
+    thin.  ``max_quantity``/``max_profit`` describe the largest profitable
+    trade between the two books regardless of the notional.
+    """
+
+    asset: str
+    fiat: str
+    buy_exchange: str
+    sell_exchange: str
+    quantity: float
+    cost: float
+    proceeds: float
+    buy_vwap: float
+    sell_vwap: float
+    profit: float
+    spread_pct: float
+    max_quantity: float
+    max_profit: float
+
+
+class _Side:
+    """One side of a book with prefix sums over fee‑adjusted prices."""
+
+    __slots__ = ("levels", "prices", "cum_qty", "cum_cost")
+
+    def __init__(self, levels: List[Level], fee_factor: float) -> None:
+        self.levels = levels
+        self.prices = [lvl.price * fee_factor for lvl in levels]
+        self.cum_qty = list(accumulate(lvl.volume for lvl in levels))
+        self.cum_cost = list(accumulate(p * lvl.volume for p, lvl in zip(self.prices, levels)))
+
+    @property
+    def depth(self) -> float:
+        return self.cum_qty[-1] if self.cum_qty else 0.0
+
+    @property
+    def best(self) -> Optional[float]:
+        return self.prices[0] if self.prices else None
+
+    def value_of(self, qty: float) -> Tuple[float, float]:
+        """Fiat value of the first ``qty`` coins: ``(value, filled qty)``."""
+        if not self.cum_qty:
+            return 0.0, 0.0
+        qty = min(qty, self.cum_qty[-1])
+        i = bisect_left(self.cum_qty, qty)
+        prev_qty = self.cum_qty[i - 1] if i else 0.0
+        prev_cost = self.cum_cost[i - 1] if i else 0.0
+        return prev_cost + (qty - prev_qty) * self.prices[i], qty
+
+    def qty_for(self, value: float) -> Tuple[float, float]:
+        """Coins obtained for ``value`` fiat: ``(qty, value spent)``."""
+        if not self.cum_cost:
+            return 0.0, 0.0
+        value = min(value, self.cum_cost[-1])
+        i = bisect_left(self.cum_cost, value)
+        prev_qty = self.cum_qty[i - 1] if i else 0.0
+        prev_cost = self.cum_cost[i - 1] if i else 0.0
+        return prev_qty + (value - prev_cost) / self.prices[i], value
+
+
+class OrderBook:
+    """Several pages of one market's adverts with the venue's taker fee.
+
+    Args:
+        market: The market the adverts belong to.
+        asks: Adverts we can buy from, in any order.
+        bids: Adverts we can sell to, in any order.
+        fee: Taker fee as a fraction of the traded amount, applied to both
+            sides (buying costs ``price * (1 + fee)``, selling yields
+            ``price * (1 - fee)``).
+    """
+
+    def __init__(
+        self,
+        market: Market,
+        asks: Iterable[Level],
+        bids: Iterable[Level],
+        fee: float = 0.0,
+    ) -> None:
+        self.market = market
+        self.fee = fee
+        valid = lambda lvl: lvl.price > 0 and lvl.volume > 0  # noqa: E731
+        self.asks = _Side(sorted(filter(valid, asks), key=lambda lvl: lvl.price), 1.0 + fee)
+        self.bids = _Side(
+            sorted(filter(valid, bids), key=lambda lvl: lvl.price, reverse=True), 1.0 - fee
+        )
+
+    def __repr__(self) -> str:
+        return (
+            f"OrderBook({self.market}, asks={len(self.asks.levels)}, "
+            f"bids={len(self.bids.levels)}, fee={self.fee})"
+        )
+
+
+def max_executable(buy: OrderBook, sell: OrderBook) -> Tuple[float, float]:
+    """Largest profitable volume buying on ``buy`` and selling on ``sell``.
+
+    Walks ``buy``'s asks upwards and ``sell``'s bids downwards in one merge
+    while the (fee‑adjusted) ask is below the bid.
+
+    Returns:
+        ``(quantity, profit)``; ``(0.0, 0.0)`` if the books do not cross.
+    """
+    asks, bids = buy.asks, sell.bids
+    i = j = 0
+    ask_left = asks.levels[0].volume if asks.levels else 0.0
+    bid_left = bids.levels[0].volume if bids.levels else 0.0
+    qty = profit = 0.0
+    while i < len(asks.prices) and j < len(bids.prices) and asks.prices[i] < bids.prices[j]:
+        take = min(ask_left, bid_left)
+        qty += take
+        profit += take * (bids.prices[j] - asks.prices[i])
+        ask_left -= take
+        bid_left -= take
+        if ask_left <= 0:
+            i += 1
+            ask_left = asks.levels[i].volume if i < len(asks.levels) else 0.0
+        if bid_left <= 0:
+            j += 1
+            bid_left = bids.levels[j].volume if j < len(bids.levels) else 0.0
+    return qty, profit
+
+
+def evaluate(buy: OrderBook, sell: OrderBook, notional: float = SPREAD_NOTIONAL) -> Optional[Spread]:
+    """Return the executable spread of buying for ``notional`` fiat on
+    ``buy`` and selling the coins on ``sell``, or ``None`` if either book is
+    empty."""
+    if not buy.asks.levels or not sell.bids.levels:
+        return None
+    qty, cost = buy.asks.qty_for(notional)
+    proceeds, sold = sell.bids.value_of(qty)
+    if sold < qty:
+        # The sell book is thinner than what we could buy: only buy what
+        # can be sold.
+        qty = sold
+        cost, _ = buy.asks.value_of(qty)
+    if qty <= 0:
+        return None
+    max_qty, max_profit = max_executable(buy, sell)
+    profit = proceeds - cost
+    return Spread(
+        asset=buy.market.asset,
+        fiat=buy.market.fiat,
+        buy_exchange=buy.market.exchange,
+        sell_exchange=sell.market.exchange,
+        quantity=qty,
+        cost=cost,
+        proceeds=proceeds,
+        buy_vwap=cost / qty,
+        sell_vwap=proceeds / qty,
+        profit=profit,
+        spread_pct=profit / cost * 100 if cost else 0.0,
+        max_quantity=max_qty,
+        max_profit=max_profit,
+    )
+
+
+def best_spreads(
+    books: Sequence[OrderBook],
+    notional: float = SPREAD_NOTIONAL,
+    min_profit: Optional[float] = 0.0,
+) -> List[Spread]:
+    """Evaluate every (buy venue, sell venue) pair per asset and fiat.
+
+    Pairs whose best fee‑adjusted ask is not below the best bid cannot be
+    profitable at any size and are skipped without walking the books.  The
+    same venue on both sides is included (buy and resell on one exchange).
+
+    Args:
+        books: Order books of any markets; only books with the same asset
+            and fiat are paired.
+        notional: Fiat amount to spend on the buy side.
+        min_profit: Drop results with a lower profit; ``None`` keeps all
+            evaluated pairs, including losing ones.
+
+    Returns:
+        Spreads sorted by profit, most profitable first.
+    """
+    groups: Dict[Tuple[str, str], List[OrderBook]] = {}
+    for book in books:
+        groups.setdefault((book.market.asset, book.market.fiat), []).append(book)
+
+    results: List[Spread] = []
+    for group in groups.values():
+        for buy in group:
+            best_ask = buy.asks.best
+            if best_ask is None:
+                continue
+            for sell in group:
+                best_bid = sell.bids.best
+                if best_bid is None:
+                    continue
+                if min_profit is not None and best_ask >= best_bid:
+                    continue
+                spread = evaluate(buy, sell, notional)
+                if spread is None:
+                    continue
+                if min_profit is None or spread.profit > min_profit:
+                    results.append(spread)
+    results.sort(key=lambda s: s.profit, reverse=True)
+    return results
@@ -0,0 +1,159 @@
+"""
+Market subscription index for the ArbitPro aggregator.
+
+Every filter implicitly subscribes its chat to a set of markets: the
+exchanges it names (the wizard's ``exchanges`` list, else its ``exchange``)
+and, if given, its ``fiat``/``fiats`` and ``asset``/``assets``.  A filter
+that names none of these watches every configured market.
+
+``SubscriptionIndex`` keeps, for every configured (exchange, asset, fiat)
+market, the set of subscribed chats and a matching index (see
+``services.filter_engine.build_index``) over only their filters.  It is
+updated incrementally from ``FilterRepository`` snapshots: only chats whose
+filter changed are re‑subscribed, and only the indexes of markets whose
+subscribers or subscribers' filters changed are rebuilt (lazily, on the next
+quote of that market).
+
+The pipeline polls only ``markets`` (those with at least one subscriber)
+and ``apply`` routes each ticker only to the filters subscribed to its
+market, instead of checking every filter against every ticker.
+"""
+
+import logging
+from typing import Any, Callable, Dict, FrozenSet, Iterable, List, Optional, Sequence, Set
+
+from services.exchanges import Market
+from services.filter_engine import build_index
+from services.filter_repository import FilterSnapshot
+
+
+def _names(f: Dict[str, Any], many: str, one: str) -> Set[str]:
+    values = f.get(many) or ([f[one]] if f.get(one) else [])
+    return {str(v).upper() for v in values}
+
+
+def filter_markets(f: Dict[str, Any], universe: Iterable[Market]) -> FrozenSet[Market]:
+    """Return the markets of ``universe`` a raw filter subscribes to."""
+    exchanges = {name.lower() for name in _names(f, "exchanges", "exchange")}
+    fiats = _names(f, "fiats", "fiat")
+    assets = _names(f, "assets", "asset")
+    return frozenset(
+        m for m in universe
+        if (not exchanges or m.exchange in exchanges)
+        and (not fiats or m.fiat in fiats)
+        and (not assets or m.asset in assets)
+    )
+
+
+class SubscriptionIndex:
+    """Subscribers and per‑market matching indexes of ``universe``.
+
+    Args:
+        universe: All markets that can be polled (``P2P_MARKETS``).
+        owns: Restricts the index to the chats it accepts (a shard's own
+            chats); ``None`` indexes every chat.
+    """
+
+    def __init__(
+        self, universe: Sequence[Market], owns: Optional[Callable[[str], bool]] = None
+    ) -> None:
+        self.universe: List[Market] = list(universe)
+        self.owns = owns
+        self.version: Optional[int] = None
+        self._filters: Dict[str, Dict[str, Any]] = {}
+        self._markets_of: Dict[str, FrozenSet[Market]] = {}
+        self._subscribers: Dict[Market, Set[str]] = {m: set() for m in self.universe}
+        self._indexes: Dict[Market, Any] = {}
+
+    def __len__(self) -> int:
+        return len(self._filters)
+
+    @property
+    def markets(self) -> List[Market]:
+        """Markets with at least one subscriber, in ``universe`` order."""
+        return [m for m in self.universe if self._subscribers[m]]
+
+    def subscribers(self, market: Market) -> Set[str]:
+        """Chats subscribed to ``market``."""
+        return self._subscribers.get(market, set())
+
+    def markets_of(self, chat_id: Any) -> FrozenSet[Market]:
+        """Markets ``chat_id`` is subscribed to."""
+        return self._markets_of.get(str(chat_id), frozenset())
+
+    def update(self, snapshot: FilterSnapshot) -> bool:
+        """Apply the changes between the last and ``snapshot``.
+
+        Returns:
+            ``True`` if any market gained or lost its last subscriber.
+        """
+        if snapshot.version == self.version:
+            return False
+        self.version = snapshot.version
+        before = set(self.markets)
+        # Only filters that compile can match; the others subscribe nowhere.
+        current = {
+            chat: snapshot.filters[chat] for chat in snapshot.compiled
+            if self.owns is None or self.owns(chat)
+        }
+
+        for chat in self._filters.keys() - current.keys():
+            self._subscribe(chat, None)
+        changed = 0
+        for chat, f in current.items():
+            if self._filters.get(chat) != f:
+                self._subscribe(chat, f)
+                changed += 1
+
+        after = set(self.markets)
+        if changed or before != after:
+            logging.info(
+                f"[subscriptions] Изменено подписок: {changed}, отслеживаемых рынков: {len(after)}"
+            )
+        return before != after
+
+    def _subscribe(self, chat: str, f: Optional[Dict[str, Any]]) -> None:
+        old = self._markets_of.pop(chat, frozenset())
+        new = filter_markets(f, self.universe) if f is not None else frozenset()
+        for market in old - new:
+            self._subscribers[market].discard(chat)
+        for market in new - old:
+            self._subscribers[market].add(chat)
+        # The filter itself changed, so every index it is part of is stale.
+        for market in old | new:
+            self._indexes.pop(market, None)
+        if f is None:
+            self._filters.pop(chat, None)
+        else:
+            self._filters[chat] = f
+            if new:
+                self._markets_of[chat] = new
+
+    def index(self, market: Market):
+        """Matching index over the filters subscribed to ``market``."""
+        index = self._indexes.get(market)
+        if index is None:
+            index = self._indexes[market] = build_index(
+                {chat: self._filters[chat] for chat in self._subscribers.get(market, ())}
+            )
+        return index
+
+    def apply(self, tickers: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """Match every ticker against the filters subscribed to its market.
+
+        Returns:
+            Matches in ``apply_filters`` format, grouped by market.
+        """
+        by_market: Dict[Market, List[Dict[str, Any]]] = {}
+        for ticker in tickers:
+            market = Market(ticker["exchange"], ticker["symbol"], ticker["fiat"])
+            if self._subscribers.get(market):
+                by_market.setdefault(market, []).append(ticker)
+        orders: List[Dict[str, Any]] = []
+        for market, batch in by_market.items():
+            orders.extend(self.index(market).apply(batch))
+        return orders
+
+    def stats(self) -> Dict[str, Any]:
+        """Return subscriber counts per watched market."""
+        return {str(m): len(self._subscribers[m]) for m in self.markets}
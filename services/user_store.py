@@ -0,0 +1,367 @@
+"""
+SQLite‑backed store of user filters.
+
+Replaces the per‑user ``filters_{user_id}.json`` files written by the bot
+handlers and the monolithic ``filters.json`` read by the aggregator with a
+single embedded database in WAL mode, so edits made through the bot reach
+the aggregator and thousands of users do not turn into thousands of files.
+
+Numeric thresholds are stored in their own (indexed) columns, the market
+fields (``exchange``, ``fiat``, ``asset``) as text and list fields
+(``banks``, ``exchanges``, ``fiats``, ``assets``) as JSON text.  Any other
+key is kept in a JSON ``extra`` column, so every filter round‑trips
+unchanged.  ``load_all_active`` returns every active filter in the
+``filters.json`` shape for the aggregator.
+
+All database work runs on one dedicated thread; the ``a*`` coroutine
+variants hand it off there so handlers never block the event loop.
+``migrate_json`` performs a one‑shot import of the legacy JSON files; on a
+database created before the market columns existed it instead fills them
+in from those files.
+"""
+
+import asyncio
+import glob
+import json
+import logging
+import os
+import re
+import sqlite3
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List, Optional, Tuple
+
+NUMERIC_FIELDS = (
+    "buy_price_min",
+    "buy_price_max",
+    "sell_price_min",
+    "sell_price_max",
+    "volume_min",
+    "volume_max",
+)
+TEXT_FIELDS = ("exchange", "fiat", "asset")
+LIST_FIELDS = ("banks", "exchanges", "fiats", "assets")
+
+# Defaults of a user who has not configured anything yet; ``None`` means
+# "no limit".
+EMPTY_FILTER: Dict[str, Any] = {
+    "buy_price_max": None,
+    "sell_price_min": None,
+    "sell_price_max": None,
+    "volume_min": None,
+    "banks": [],
+    "exchanges": [],
+}
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS filters (
+    chat_id        TEXT PRIMARY KEY,
+    buy_price_min  REAL,
+    buy_price_max  REAL,
+    sell_price_min REAL,
+    sell_price_max REAL,
+    volume_min     REAL,
+    volume_max     REAL,
+    exchange       TEXT,
+    fiat           TEXT,
+    asset          TEXT,
+    banks          TEXT NOT NULL DEFAULT '[]',
+    exchanges      TEXT NOT NULL DEFAULT '[]',
+    fiats          TEXT NOT NULL DEFAULT '[]',
+    assets         TEXT NOT NULL DEFAULT '[]',
+    extra          TEXT NOT NULL DEFAULT '{}',
+    active         INTEGER NOT NULL DEFAULT 1,
+    updated_at     REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_filters_buy ON filters(active, buy_price_min, buy_price_max);
+CREATE INDEX IF NOT EXISTS idx_filters_sell ON filters(active, sell_price_min, sell_price_max);
+CREATE INDEX IF NOT EXISTS idx_filters_volume ON filters(active, volume_min, volume_max);
+CREATE TABLE IF NOT EXISTS meta (
+    key   TEXT PRIMARY KEY,
+    value TEXT NOT NULL
+);
+"""
+
+# Columns added after the first release, with their definitions, for
+# upgrading existing databases.
+_ADDED_COLUMNS = {
+    "fiat": "TEXT",
+    "asset": "TEXT",
+    "fiats": "TEXT NOT NULL DEFAULT '[]'",
+    "assets": "TEXT NOT NULL DEFAULT '[]'",
+    "extra": "TEXT NOT NULL DEFAULT '{}'",
+}
+
+_COLUMNS = ("chat_id",) + NUMERIC_FIELDS + TEXT_FIELDS + LIST_FIELDS + ("extra",)
+_KNOWN_FIELDS = frozenset(_COLUMNS)
+
+
+def _row_to_filter(row: Tuple) -> Dict[str, Any]:
+    """Convert a ``filters`` row (``_COLUMNS`` order) to a filter dict.
+
+    Unset numeric limits and market fields are omitted, matching the
+    ``filters.json`` shape where a missing field means "no limit".
+    """
+    data: Dict[str, Any] = {}
+    for name, value in zip(_COLUMNS[1:], row[1:]):
+        if name == "extra":
+            for key, item in json.loads(value).items():
+                data.setdefault(key, item)
+        elif name in LIST_FIELDS:
+            data[name] = json.loads(value)
+        elif value is not None:
+            data[name] = value
+    return data
+
+
+def _filter_to_row(chat_id: str, data: Dict[str, Any], now: float) -> Tuple:
+    """Convert a filter dict to a ``filters`` row plus ``updated_at``."""
+    extra = {k: v for k, v in data.items() if k not in _KNOWN_FIELDS}
+    return (
+        (chat_id,)
+        + tuple(_to_float(data.get(name)) for name in NUMERIC_FIELDS)
+        + tuple(data.get(name) for name in TEXT_FIELDS)
+        + tuple(json.dumps(list(data.get(name) or []), ensure_ascii=False) for name in LIST_FIELDS)
+        + (json.dumps(extra, ensure_ascii=False), now)
+    )
+
+
+def _read_legacy_json(path: str) -> Any:
+    """Read a legacy JSON file; older files were saved in cp1251."""
+    with open(path, "rb") as f:
+        raw = f.read()
+    try:
+        text = raw.decode("utf-8")
+    except UnicodeDecodeError:
+        text = raw.decode("cp1251")
+    return json.loads(text)
+
+
+def _to_float(value: Any) -> Optional[float]:
+    return None if value is None else float(value)
+
+
+class UserStore:
+    """Filters of all users in one SQLite database.
+
+    Args:
+        path: Database file; created on first use.
+    """
+
+    def __init__(self, path: str) -> None:
+        self.path = path
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="user-store")
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(_SCHEMA)
+        self._add_columns()
+        # Incremented on every write through this instance; combined with
+        # ``PRAGMA data_version`` (which only reflects other connections) it
+        # tells readers whether anything changed.
+        self._writes = 0
+
+    def _add_columns(self) -> None:
+        """Add the columns missing from a database of an older version."""
+        present = {row[1] for row in self._conn.execute("PRAGMA table_info(filters)")}
+        missing = [name for name in _ADDED_COLUMNS if name not in present]
+        for name in missing:
+            self._conn.execute(f"ALTER TABLE filters ADD COLUMN {name} {_ADDED_COLUMNS[name]}")
+        if missing:
+            logging.info(f"[user_store] Добавлены столбцы: {', '.join(missing)}")
+
+    def close(self) -> None:
+        self._executor.shutdown(wait=True)
+        with self._lock:
+            self._conn.close()
+
+    # -- synchronous API -------------------------------------------------
+
+    def change_token(self) -> Tuple[int, int]:
+        """Return a value that changes whenever the stored filters change."""
+        with self._lock:
+            (data_version,) = self._conn.execute("PRAGMA data_version").fetchone()
+            return self._writes, data_version
+
+    def get_filter(self, chat_id: Any) -> Dict[str, Any]:
+        """Return the filter of ``chat_id`` or ``EMPTY_FILTER`` defaults."""
+        with self._lock:
+            row = self._conn.execute(
+                f"SELECT {', '.join(_COLUMNS)} FROM filters WHERE chat_id = ?", (str(chat_id),)
+            ).fetchone()
+        if row is None:
+            return {**EMPTY_FILTER, "banks": [], "exchanges": []}
+        return {**EMPTY_FILTER, **_row_to_filter(row)}
+
+    def load_all_active(self) -> Dict[str, Dict[str, Any]]:
+        """Return every active filter keyed by chat id."""
+        with self._lock:
+            rows = self._conn.execute(
+                f"SELECT {', '.join(_COLUMNS)} FROM filters WHERE active = 1"
+            ).fetchall()
+        return {row[0]: _row_to_filter(row) for row in rows}
+
+    def save_filter(self, chat_id: Any, data: Dict[str, Any]) -> None:
+        """Insert or replace the whole filter of ``chat_id``."""
+        self.save_many({str(chat_id): data})
+
+    def save_many(self, filters: Dict[str, Dict[str, Any]]) -> None:
+        """Insert or replace several filters in one transaction."""
+        now = time.time()
+        rows: List[Tuple] = [
+            _filter_to_row(str(chat_id), data, now) for chat_id, data in filters.items()
+        ]
+        placeholders = ", ".join("?" * (len(_COLUMNS) + 1))
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                self._conn.executemany(
+                    f"INSERT OR REPLACE INTO filters ({', '.join(_COLUMNS)}, updated_at) "
+                    f"VALUES ({placeholders})",
+                    rows,
+                )
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+            self._conn.execute("COMMIT")
+            self._writes += 1
+
+    def update_filter(self, chat_id: Any, **fields: Any) -> Dict[str, Any]:
+        """Merge ``fields`` into the filter of ``chat_id`` and return it."""
+        data = self.get_filter(chat_id)
+        data.update(fields)
+        self.save_filter(chat_id, data)
+        return data
+
+    def toggle_list_item(self, chat_id: Any, key: str, item: str) -> Dict[str, Any]:
+        """Add ``item`` to the list field ``key`` or remove it if present."""
+        data = self.get_filter(chat_id)
+        items = list(data.get(key) or [])
+        if item in items:
+            items.remove(item)
+        else:
+            items.append(item)
+        data[key] = items
+        self.save_filter(chat_id, data)
+        return data
+
+    def migrate_json(self, filters_file: str, per_user_dir: str) -> int:
+        """Import ``filters_file`` and ``filters_{user_id}.json`` files once.
+
+        Per‑user files win over entries of the monolithic file for the same
+        chat.  The source files are left untouched.  Subsequent calls are
+        no‑ops, except once on a database imported before the market columns
+        existed: that call copies fields the stored filters lack (``fiat``,
+        ``asset``, …) from the legacy files, without touching edits made
+        since the first import.
+
+        Returns:
+            The number of imported (or completed) filters.
+        """
+        with self._lock:
+            markers = {
+                key for (key,) in self._conn.execute(
+                    "SELECT key FROM meta WHERE key IN ('json_migrated', 'json_markets')"
+                )
+            }
+        done = "json_migrated" in markers
+        if done and "json_markets" in markers:
+            return 0
+
+        valid = self._read_legacy(filters_file, per_user_dir)
+        if done:
+            stored = self.load_all_active()
+            completed: Dict[str, Dict[str, Any]] = {}
+            for chat_id, data in valid.items():
+                current = stored.get(chat_id)
+                if current is None:
+                    continue
+                missing = {
+                    k: v for k, v in data.items()
+                    if current.get(k) in (None, []) and v not in (None, [])
+                }
+                if missing:
+                    completed[chat_id] = {**current, **missing}
+            if completed:
+                self.save_many(completed)
+            self._mark("json_markets")
+            logging.info(f"[user_store] Дополнено фильтров из JSON: {len(completed)}")
+            return len(completed)
+
+        if valid:
+            self.save_many(valid)
+        # A full import already carries the market fields.
+        self._mark("json_migrated")
+        self._mark("json_markets")
+        logging.info(f"[user_store] Импортировано фильтров из JSON: {len(valid)}")
+        return len(valid)
+
+    def _mark(self, key: str) -> None:
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)", (key, str(time.time()))
+            )
+
+    def _read_legacy(self, filters_file: str, per_user_dir: str) -> Dict[str, Dict[str, Any]]:
+        """Read the legacy JSON filters, skipping malformed ones."""
+        imported: Dict[str, Dict[str, Any]] = {}
+        try:
+            imported.update(_read_legacy_json(filters_file))
+        except (OSError, ValueError):
+            pass
+        for path in glob.glob(os.path.join(per_user_dir, "filters_*.json")):
+            match = re.fullmatch(r"filters_(\d+)\.json", os.path.basename(path))
+            if not match:
+                continue
+            try:
+                imported[match.group(1)] = _read_legacy_json(path)
+            except (OSError, ValueError) as e:
+                logging.warning(f"[user_store] Пропущен {path}: {e}")
+
+        valid: Dict[str, Dict[str, Any]] = {}
+        for chat_id, data in imported.items():
+            try:
+                for name in NUMERIC_FIELDS:
+                    _to_float(data.get(name))
+            except (TypeError, ValueError, AttributeError):
+                logging.warning(f"[user_store] Некорректный фильтр {chat_id} пропущен")
+                continue
+            valid[str(chat_id)] = data
+        return valid
+
+    # -- asynchronous API ------------------------------------------------
+
+    async def _run(self, func, *args, **kwargs):
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, lambda: func(*args, **kwargs))
+
+    async def achange_token(self) -> Tuple[int, int]:
+        return await self._run(self.change_token)
+
+    async def aget_filter(self, chat_id: Any) -> Dict[str, Any]:
+        return await self._run(self.get_filter, chat_id)
+
+    async def aload_all_active(self) -> Dict[str, Dict[str, Any]]:
+        return await self._run(self.load_all_active)
+
+    async def asave_filter(self, chat_id: Any, data: Dict[str, Any]) -> None:
+        await self._run(self.save_filter, chat_id, data)
+
+    async def aupdate_filter(self, chat_id: Any, **fields: Any) -> Dict[str, Any]:
+        return await self._run(self.update_filter, chat_id, **fields)
+
+    async def atoggle_list_item(self, chat_id: Any, key: str, item: str) -> Dict[str, Any]:
+        return await self._run(self.toggle_list_item, chat_id, key, item)
+
+
+_stores: Dict[str, UserStore] = {}
+
+
+def get_user_store(path: str) -> UserStore:
+    """Return the shared store for the database at ``path``."""
+    store = _stores.get(path)
+    if store is None:
+        store = _stores[path] = UserStore(path)
+    return store
@@ -0,0 +1,192 @@
+"""
+Webhook runtime for the ArbitPro bot.
+
+With ``WEBHOOK_URL`` configured the bot receives updates through an aiohttp
+server on ``WEBAPP_PORT`` instead of long polling.  A request is answered as
+soon as its update is queued; a fixed pool of ``WEBHOOK_WORKERS`` tasks feeds
+queued updates to the dispatcher concurrently.  When the queue
+(``WEBHOOK_QUEUE_SIZE``) is full the server answers ``503`` and Telegram
+redelivers the update later, so a burst of button presses cannot spawn an
+unbounded number of handler tasks.
+
+The same application serves ``/metrics`` (``services.metrics``) and
+``/healthz``.  The dispatcher's startup and shutdown hooks run inside the
+server's event loop, so the aggregator registered by
+``services.aggregator.setup_aggregator`` shares the loop (it polls the
+exchanges over its own tuned HTTP session).  On SIGINT/SIGTERM the server stops accepting requests, drains the
+queued updates, then runs the shutdown hooks (which drain pending alert
+sends) and finally closes the bot session.
+"""
+
+import asyncio
+import logging
+import secrets
+from typing import Any, Dict, List, Optional
+from urllib.parse import urlsplit
+
+from aiogram import Bot, Dispatcher
+from aiogram.methods import TelegramMethod
+from aiohttp import web
+
+from config import (
+    SHUTDOWN_TIMEOUT,
+    WEBAPP_PORT,
+    WEBHOOK_QUEUE_SIZE,
+    WEBHOOK_SECRET,
+    WEBHOOK_URL,
+    WEBHOOK_WORKERS,
+)
+from services import metrics
+
+SECRET_HEADER = "X-Telegram-Bot-Api-Secret-Token"
+
+
+class UpdatePool:
+    """Bounded queue of raw updates drained by a fixed number of workers.
+
+    Args:
+        dispatcher: The aiogram dispatcher processing updates.
+        bot: Bot the updates belong to.
+        workers: Number of concurrent handler tasks.
+        queue_size: Maximum number of queued updates.
+    """
+
+    def __init__(
+        self,
+        dispatcher: Dispatcher,
+        bot: Bot,
+        workers: int = WEBHOOK_WORKERS,
+        queue_size: int = WEBHOOK_QUEUE_SIZE,
+    ) -> None:
+        self.dispatcher = dispatcher
+        self.bot = bot
+        self.workers = workers
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=queue_size)
+        self._tasks: List[asyncio.Task] = []
+        self.handled = 0
+        self.rejected = 0
+
+    def start(self) -> None:
+        if not self._tasks:
+            self._tasks = [
+                asyncio.create_task(self._worker(), name=f"webhook-worker-{i}")
+                for i in range(self.workers)
+            ]
+
+    def submit(self, update: Dict[str, Any]) -> bool:
+        """Queue an update; ``False`` if the queue is full."""
+        try:
+            self.queue.put_nowait(update)
+        except asyncio.QueueFull:
+            self.rejected += 1
+            return False
+        return True
+
+    async def close(self, timeout: Optional[float] = SHUTDOWN_TIMEOUT) -> None:
+        """Wait up to ``timeout`` seconds for queued updates, then stop."""
+        try:
+            await asyncio.wait_for(self.queue.join(), timeout)
+        except asyncio.TimeoutError:
+            logging.warning(f"[webhook] Остановка с {self.queue.qsize()} необработанными обновлениями")
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    async def _worker(self) -> None:
+        while True:
+            update = await self.queue.get()
+            try:
+                result = await self.dispatcher.feed_raw_update(self.bot, update)
+                if isinstance(result, TelegramMethod):
+                    await self.dispatcher.silent_call_request(self.bot, result)
+                self.handled += 1
+            except Exception as e:
+                logging.error("[webhook] Ошибка обработки обновления", exc_info=e)
+            finally:
+                self.queue.task_done()
+
+
+class WebhookHandler:
+    """aiohttp handler queueing Telegram updates into an ``UpdatePool``."""
+
+    def __init__(self, pool: UpdatePool, secret_token: Optional[str] = WEBHOOK_SECRET) -> None:
+        self.pool = pool
+        self.secret_token = secret_token
+
+    async def __call__(self, request: web.Request) -> web.Response:
+        if self.secret_token and not secrets.compare_digest(
+            request.headers.get(SECRET_HEADER, ""), self.secret_token
+        ):
+            return web.Response(status=401, text="Unauthorized")
+        try:
+            update = await request.json(loads=self.pool.bot.session.json_loads)
+        except ValueError:
+            return web.Response(status=400, text="Bad Request")
+        if not self.pool.submit(update):
+            logging.warning("[webhook] Очередь обновлений переполнена, Telegram повторит доставку")
+            return web.Response(status=503, text="Busy")
+        return web.json_response({})
+
+
+def webhook_path(url: Optional[str] = WEBHOOK_URL) -> str:
+    """Path part of the webhook URL (``/webhook`` if it has none)."""
+    path = urlsplit(url or "").path
+    return path if path and path != "/" else "/webhook"
+
+
+def build_app(
+    dispatcher: Dispatcher,
+    bot: Bot,
+    url: Optional[str] = WEBHOOK_URL,
+    pool: Optional[UpdatePool] = None,
+) -> web.Application:
+    """Create the aiohttp application serving the webhook, ``/metrics`` and
+    ``/healthz``."""
+    pool = pool or UpdatePool(dispatcher, bot)
+    app = web.Application()
+    app["update_pool"] = pool
+    app.router.add_post(webhook_path(url), WebhookHandler(pool))
+    metrics.setup_routes(app)
+
+    async def healthz(request: web.Request) -> web.Response:
+        return web.json_response({
+            "queued": pool.queue.qsize(),
+            "handled": pool.handled,
+            "rejected": pool.rejected,
+        })
+
+    app.router.add_get("/healthz", healthz)
+
+    async def on_startup(app: web.Application) -> None:
+        pool.start()
+        await dispatcher.emit_startup(bot=bot, dispatcher=dispatcher)
+        if url:
+            await bot.set_webhook(
+                url,
+                secret_token=WEBHOOK_SECRET or None,
+                allowed_updates=dispatcher.resolve_used_update_types(),
+            )
+            logging.info(f"🟢 Веб‑хук установлен: {url}")
+
+    async def on_shutdown(app: web.Application) -> None:
+        # The webhook stays registered: another instance behind the load
+        # balancer (or this one after a restart) keeps receiving updates.
+        await pool.close()
+        await dispatcher.emit_shutdown(bot=bot, dispatcher=dispatcher)
+        await bot.session.close()
+
+    app.on_startup.append(on_startup)
+    app.on_shutdown.append(on_shutdown)
+    return app
+
+
+def run_webhook(dispatcher: Dispatcher, bot: Bot, port: int = WEBAPP_PORT) -> None:
+    """Serve the webhook on ``port`` until SIGINT/SIGTERM."""
+    web.run_app(
+        build_app(dispatcher, bot),
+        host="0.0.0.0",
+        port=port,
+        shutdown_timeout=SHUTDOWN_TIMEOUT,
+        access_log=None,
+    )
@@ -0,0 +1,86 @@
+"""Parity of the compiled and vectorised filter engines with the linear
+reference matcher."""
+
+import pytest
+
+from services import filter_vector
+from services.filter_engine import match_linear
+from services.filter_index import FilterIndex
+from services.filter_vector import VectorFilterIndex
+
+ENGINES = [pytest.param(FilterIndex, id="index")]
+ENGINES.append(
+    pytest.param(
+        VectorFilterIndex,
+        id="numpy",
+        marks=pytest.mark.skipif(not filter_vector.available(), reason="numpy not installed"),
+    )
+)
+
+FILTERS = {
+    "empty": {},
+    "missing_keys": {"buy_price_max": 41.0, "volume_min": 100},
+    "nones": {
+        "buy_price_min": None, "buy_price_max": None,
+        "sell_price_min": None, "sell_price_max": None,
+        "volume_min": None, "volume_max": None,
+    },
+    "empty_lists": {"banks": [], "exchanges": [], "sell_price_min": 42.0},
+    "none_lists": {"banks": None, "exchanges": None},
+    "min_eq_max": {"buy_price_min": 41.0, "buy_price_max": 41.0, "volume_min": 500, "volume_max": 500},
+    "string_numbers": {"buy_price_max": "41.5", "volume_max": "5000"},
+    "one_bank": {"banks": ["Monobank"], "exchange": "bybit"},
+}
+
+TICKERS = [
+    {"price": 41.0, "sell_price": 42.5, "volume": 500, "exchange": "binance", "url": "a"},
+    {"price": 41.0, "sell_price": 41.0, "volume": 500, "exchange": "bybit", "bank": "Monobank", "url": "b"},
+    {"price": 40.0, "sell_price": 43.0, "volume": 20000, "bank": "PrivatBank", "url": "c"},
+    # No ``exchange``: the filter's exchange is reported.
+    {"price": 41.0, "sell_price": 42.0, "volume": 150, "url": "d"},
+    # No ``volume``: treated as 0.
+    {"price": 41.0, "sell_price": 42.0, "exchange": "binance", "url": "e"},
+    # No ``sell_price``: the buy price is used.
+    {"price": 42.0, "volume": 300, "url": "f"},
+    # No ``price``: skipped by every engine.
+    {"sell_price": 42.0, "volume": 300, "url": "g"},
+]
+
+
+@pytest.mark.parametrize("engine", ENGINES)
+def test_engine_matches_linear_reference(engine):
+    expected = match_linear(TICKERS, FILTERS)
+    assert expected  # the data must exercise matching at all
+    assert engine(FILTERS).apply(TICKERS) == expected
+
+
+@pytest.mark.parametrize("engine", ENGINES)
+@pytest.mark.parametrize("chat_id", sorted(FILTERS))
+def test_engine_matches_linear_per_filter(engine, chat_id):
+    filters = {chat_id: FILTERS[chat_id]}
+    assert engine(filters).apply(TICKERS) == match_linear(TICKERS, filters)
+
+
+def test_missing_and_none_limits_mean_no_limit():
+    matched = {t["url"] for t in match_linear(TICKERS, {"x": FILTERS["nones"]})}
+    assert matched == {"a", "b", "c", "d", "e", "f"}
+    assert {t["url"] for t in match_linear(TICKERS, {"x": {}})} == matched
+
+
+def test_min_equal_to_max_is_inclusive():
+    matched = {t["url"] for t in match_linear(TICKERS, {"x": FILTERS["min_eq_max"]})}
+    assert matched == {"a", "b"}
+
+
+def test_missing_exchange_falls_back_to_filter_exchange():
+    matched = {t["url"]: t for t in match_linear(TICKERS, {"x": {"exchange": "bybit"}})}
+    assert matched["d"]["exchange"] == "bybit"
+    assert matched["a"]["exchange"] == "binance"
+
+
+@pytest.mark.parametrize("engine", ENGINES)
+def test_inverted_range_is_skipped(engine):
+    filters = {"bad": {"sell_price_min": 45, "sell_price_max": 43}, "ok": {}}
+    result = engine(filters).apply(TICKERS)
+    assert result == match_linear(TICKERS, filters)
+    assert {t["chat_id"] for t in result} == {"ok"}